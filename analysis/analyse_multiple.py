@@ -1,62 +1,18 @@
 import json
+import os
+import sys
 import numpy as np
 import requests
 from collections import Counter
 
+sys.path.append('../src')
+from EventLog import read_event_log
+from metrics import gini_coefficient, EI_index, correlations
+
 to_analyze = "on_repost_bio_other_partisan_info"
 
 output_data = {}
 
-def gini_coefficient(data):
-
-    n = len(data)
-
-    if n == 0:
-        return 0
-    
-    sum_distances = 0
-    for i in range(n):
-        for j in range(n):
-            sum_distances += abs(data[i] - data[j])
-
-    gini = sum_distances / (2 * n * np.sum(data))
-
-    return gini
-
-def EI_index(data):
-
-    IL = 0
-    EL = 0
-
-    for user_link in data['user_links']:
-        user_from = [user for user in data['users'] if user['identifier'] == user_link[0]][0]
-        user_to = [user for user in data['users'] if user['identifier'] == user_link[1]][0]
-
-        if user_from['persona']['party'] == user_to['persona']['party']:
-            IL += 1
-        else:
-            EL += 1
-
-    EI_index = (EL - IL) / (EL + IL)
-
-    return EI_index
-
-def correlations(data):
-
-    partisans = [abs(user['persona']['partisan']) for user in data['users']]
-    followers = [user['followers'] for user in data['users']]
-    total_retweets_user = [sum([post['reposts'] for post in data['raw_posts'] if post['author'] == user['identifier']]) for user in data['users']]
-
-    # Calculate the correlation between partisanship and followers
-    correlation_followers = np.corrcoef(partisans, followers)[0, 1]
-    # Calculate the correlation between partisanship and total retweets
-    correlation_retweets = np.corrcoef(partisans, total_retweets_user)[0, 1]
-
-    return {
-        "correlation_followers": correlation_followers,
-        "correlation_retweets": correlation_retweets
-    }
-
 def inequality(data):
     
     # sort users by followers
@@ -120,8 +76,13 @@ for file_to_analyze in all_files:
 
     for i in range(1, 6):
 
-        f = open(f"../results/{file_to_analyze}_{i}.json", "r")
-        data = json.load(f)
+        # Runs are logged as JSON Lines events, older runs as a single JSON file
+        if os.path.exists(f"../results/{file_to_analyze}_{i}.jsonl"):
+            data = read_event_log(f"../results/{file_to_analyze}_{i}.jsonl")
+        else:
+            f = open(f"../results/{file_to_analyze}_{i}.json", "r")
+            data = json.load(f)
+            f.close()
 
         follower_distribution = [user['followers'] for user in data['users']]
         repost_distribution = [post['reposts'] for post in data['raw_posts']]
@@ -136,8 +97,6 @@ for file_to_analyze in all_files:
             "inequality": inequality(data),
         }
 
-        f.close()
-
         print(output_data[f"simulation_{i}"])
 
     with open(f"../results/{file_to_analyze}_summary.json", "w") as f:
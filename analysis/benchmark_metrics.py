@@ -0,0 +1,117 @@
+import random
+import sys
+import time
+
+import numpy as np
+
+import metrics
+
+# Compares the metrics of metrics.py with the original loop implementations on generated data:
+# the results have to be identical, and the time of both is printed.
+# python benchmark_metrics.py [number of users]
+
+
+def gini_coefficient_loops(data):
+
+    n = len(data)
+
+    if n == 0:
+        return 0
+
+    sum_distances = 0
+    for i in range(n):
+        for j in range(n):
+            sum_distances += abs(data[i] - data[j])
+
+    gini = sum_distances / (2 * n * np.sum(data))
+
+    return gini
+
+
+def EI_index_loops(data):
+
+    IL = 0
+    EL = 0
+
+    for user_link in data['user_links']:
+        user_from = [user for user in data['users'] if user['identifier'] == user_link[0]][0]
+        user_to = [user for user in data['users'] if user['identifier'] == user_link[1]][0]
+
+        if user_from['persona']['party'] == user_to['persona']['party']:
+            IL += 1
+        else:
+            EL += 1
+
+    EI_index = (EL - IL) / (EL + IL)
+
+    return EI_index
+
+
+def correlations_loops(data):
+
+    partisans = [abs(user['persona']['partisan']) for user in data['users']]
+    followers = [user['followers'] for user in data['users']]
+    total_retweets_user = [sum([post['reposts'] for post in data['raw_posts'] if post['author'] == user['identifier']]) for user in data['users']]
+
+    correlation_followers = np.corrcoef(partisans, followers)[0, 1]
+    correlation_retweets = np.corrcoef(partisans, total_retweets_user)[0, 1]
+
+    return {
+        "correlation_followers": correlation_followers,
+        "correlation_retweets": correlation_retweets
+    }
+
+
+def generate_data(n_users: int, seed: int = 0) -> dict:
+    """
+    Data in the format of read_event_log, with skewed follower and repost counts like in a simulation.
+    """
+
+    rng = random.Random(seed)
+
+    users = [{"identifier": i + 1,
+              "persona": {"party": rng.choice(["Democrat", "Republican", "Independent"]), "partisan": rng.randint(-3, 3)},
+              "followers": int(rng.paretovariate(1.5)) - 1}
+             for i in range(n_users)]
+
+    user_links = [(rng.randint(1, n_users), rng.randint(1, n_users)) for _ in range(n_users * 5)]
+
+    raw_posts = [{"author": rng.randint(1, n_users), "reposts": int(rng.paretovariate(1.2)) - 1} for _ in range(n_users * 4)]
+
+    return {"users": users, "user_links": user_links, "raw_posts": raw_posts}
+
+
+def measure(function, *args):
+
+    start_time = time.perf_counter()
+    result = function(*args)
+
+    return result, time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    data = generate_data(n_users)
+
+    follower_distribution = [user['followers'] for user in data['users']]
+    repost_distribution = [post['reposts'] for post in data['raw_posts']]
+
+    benchmarks = [
+        ("gini_coefficient_followers", gini_coefficient_loops, metrics.gini_coefficient, (follower_distribution,)),
+        ("gini_coefficient_reposts", gini_coefficient_loops, metrics.gini_coefficient, (repost_distribution,)),
+        ("EI_index", EI_index_loops, metrics.EI_index, (data,)),
+        ("correlations", correlations_loops, metrics.correlations, (data,)),
+    ]
+
+    print(f"{n_users} users, {len(data['user_links'])} links, {len(data['raw_posts'])} posts")
+
+    for name, loops, vectorized, args in benchmarks:
+
+        expected, loops_time = measure(loops, *args)
+        result, vectorized_time = measure(vectorized, *args)
+
+        if result != expected:
+            raise Exception(f"{name}: {result} != {expected}")
+
+        print(f"{name}: loops {loops_time:.3f}s, numpy {vectorized_time:.4f}s ({loops_time / vectorized_time:.0f}x), identical")
@@ -0,0 +1,87 @@
+import numpy as np
+
+
+def gini_coefficient(data):
+    """
+    Gini coefficient of a distribution (e.g. followers per user).
+    The sum of all pairwise distances is computed from the sorted values in O(n log n):
+    the i-th smallest value (0-based) is larger than i values and smaller than n - 1 - i values.
+    """
+
+    n = len(data)
+
+    if n == 0:
+        return 0
+
+    sorted_data = np.sort(np.asarray(data))
+    ranks = 2 * np.arange(n) - n + 1
+
+    # Exact for integer data, like the sum over all pairs
+    sum_distances = 2 * (ranks * sorted_data).sum()
+    if np.issubdtype(sorted_data.dtype, np.integer):
+        sum_distances = int(sum_distances)
+
+    gini = sum_distances / (2 * n * np.sum(data))
+
+    return gini
+
+
+def _party_lookup(users):
+    """
+    Returns an array with the party code of every user, indexed by user identifier.
+    """
+
+    parties = {}
+    identifiers = np.array([user['identifier'] for user in users])
+    codes = np.array([parties.setdefault(user['persona']['party'], len(parties)) for user in users])
+
+    lookup = np.full(identifiers.max() + 1, -1)
+    lookup[identifiers] = codes
+
+    return lookup
+
+
+def EI_index(data):
+    """
+    EI index of the links: (external links - internal links) / all links, where internal links
+    are links between users of the same party.
+    """
+
+    party = _party_lookup(data['users'])
+    links = np.asarray(data['user_links']).reshape(-1, 2)
+
+    same_party = party[links[:, 0]] == party[links[:, 1]]
+
+    IL = int(same_party.sum())
+    EL = len(links) - IL
+
+    EI_index = (EL - IL) / (EL + IL)
+
+    return EI_index
+
+
+def correlations(data):
+    """
+    Correlations of partisanship with the number of followers and the number of reposts of a user's posts.
+    """
+
+    identifiers = np.array([user['identifier'] for user in data['users']])
+    partisans = np.abs([user['persona']['partisan'] for user in data['users']])
+    followers = np.array([user['followers'] for user in data['users']])
+
+    # Reposts of all posts per author, indexed by user identifier
+    authors = np.array([post['author'] for post in data['raw_posts']], dtype=int)
+    reposts = np.array([post['reposts'] for post in data['raw_posts']])
+    reposts_per_author = np.bincount(authors, weights=reposts, minlength=identifiers.max() + 1)
+
+    total_retweets_user = reposts_per_author[identifiers]
+
+    # Calculate the correlation between partisanship and followers
+    correlation_followers = np.corrcoef(partisans, followers)[0, 1]
+    # Calculate the correlation between partisanship and total retweets
+    correlation_retweets = np.corrcoef(partisans, total_retweets_user)[0, 1]
+
+    return {
+        "correlation_followers": correlation_followers,
+        "correlation_retweets": correlation_retweets
+    }
@@ -0,0 +1,193 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from Agent import Agent
+from Platform import Platform, Post
+from LLMBackend import SyntheticBackend
+import Instrumentation
+
+# Benchmarks of the platform with rule-based agents (SyntheticBackend), without LLM calls or network.
+# Every benchmark runs in its own process, so the peak RSS is the one of that run.
+#
+# python platform_benchmarks.py --suite small                 run and compare with baselines/small.json
+# python platform_benchmarks.py --suite small --save          run and store the results as the new baseline
+# python platform_benchmarks.py --suite medium --filter random_weighted/on_repost/
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PERSONA_PATH = os.path.join(BENCHMARKS_DIR, '..', 'src', 'personas.json')
+
+# (users, steps) per suite
+SUITES = {
+    "small": [(500, 10000)],
+    "medium": [(5000, 100000)],
+    "large": [(50000, 1000000)],
+}
+
+TIMELINE_STRATEGIES = ['random', 'random_weighted', 'random_weighted_reversed', 'bridging_attributes', 'chronological', 'other_partisan']
+LINK_STRATEGIES = ['on_repost', 'on_repost_bio', 'on_repost_posts']
+
+NEWS_CATEGORIES = ['POLITICS', 'WELLNESS', 'ENTERTAINMENT', 'TRAVEL', 'BUSINESS', 'SPORTS', 'SCIENCE', 'WORLD NEWS']
+
+
+class LocalBridgingScorer():
+    """
+    Stand-in for the BridgingScorer that scores posts right away from a hash of their content.
+    """
+
+    fallback_score = 0.0
+
+    def submit(self, post, step):
+        post.bridging_score = int(hashlib.sha256(post.content.encode('utf-8')).hexdigest()[:8], 16) / 2 ** 32
+
+    def apply(self, step, on_score=None) -> int:
+        return 0
+
+
+def generate_news(n: int = 2000) -> list[dict]:
+    """
+    News items in the format of the news dataset.
+    """
+    return [{"headline": f"Headline {i} about {NEWS_CATEGORIES[i % len(NEWS_CATEGORIES)].lower()}",
+             "category": NEWS_CATEGORIES[i % len(NEWS_CATEGORIES)],
+             "short_description": f"Short description of news item {i}."}
+            for i in range(n)]
+
+
+def benchmark_name(benchmark: dict) -> str:
+    return f"{benchmark['timeline_select_strategy']}/{benchmark['user_link_strategy']}/{benchmark['users']}u_{benchmark['steps']}s"
+
+
+def run_benchmark(benchmark: dict) -> dict:
+    """
+    Run the steps of a simulation with synthetic agents and return steps/s, peak RSS and the time per platform method.
+    """
+
+    random.seed(benchmark['seed'])
+    news_rng = random.Random(benchmark['seed'])
+    news = generate_news()
+
+    personas = json.load(open(PERSONA_PATH, 'r'))
+
+    platform = Platform(user_link_strategy=benchmark['user_link_strategy'],
+                        timeline_select_strategy=benchmark['timeline_select_strategy'], show_info=True)
+
+    if benchmark['timeline_select_strategy'] == 'bridging_attributes':
+        platform.set_bridging_scorer(LocalBridgingScorer())
+
+    for i in range(benchmark['users']):
+        platform.register_user(Agent("synthetic", dict(personas[i % len(personas)])))
+    platform.set_client(SyntheticBackend(seed=benchmark['seed']))
+
+    profiler = Instrumentation.start_profiler()
+
+    # Time the methods called inside the steps as well
+    for method in ("pick_posts", "repost"):
+        def timed(*args, method=method, function=getattr(platform, method), **kwargs):
+            with profiler.span(method):
+                return function(*args, **kwargs)
+        setattr(platform, method, timed)
+
+    start_time = time.perf_counter()
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(benchmark['steps']):
+
+            user = platform.sample_user()
+
+            with profiler.span("get_timeline"):
+                timeline = platform.get_timeline(user.identifier, 10)
+
+            action, prompt = user.perform_action(news_rng.sample(news, 10), timeline)
+
+            with profiler.span("parse_and_do_action"):
+                platform.parse_and_do_action(user.identifier, action, prompt)
+
+            with profiler.span("add_snapshot"):
+                platform.add_snapshot()
+
+    seconds = time.perf_counter() - start_time
+    summary = Instrumentation.stop_profiler().summary()
+
+    return {
+        "name": benchmark_name(benchmark),
+        **benchmark,
+        "seconds": seconds,
+        "steps_per_second": benchmark['steps'] / seconds,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "posts": len(platform.posts),
+        "links": len(platform.user_links),
+        "post_render_cache": Post.render_stats(),
+        "methods": {name: {key: span[key] for key in ("count", "total", "mean", "p50", "p95", "p99")}
+                    for name, span in summary["spans"].items()}
+    }
+
+
+def compare(result: dict, baseline: dict | None, tolerance: float) -> str:
+    """
+    Describe the result relative to its baseline, marking slowdowns beyond the tolerance.
+    """
+
+    if baseline is None:
+        return "no baseline"
+
+    speed = result['steps_per_second'] / baseline['steps_per_second']
+    memory = result['peak_rss_mb'] / baseline['peak_rss_mb']
+    status = "REGRESSION" if speed < 1 - tolerance else "ok"
+
+    return f"{speed:.2f}x steps/s, {memory:.2f}x peak RSS vs baseline ({status})"
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the platform with synthetic agents.")
+    parser.add_argument("--suite", choices=SUITES, default="small")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--steps", type=int, help="Override the number of steps (quick runs, not comparable to the baseline)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", action="store_true", help="Store the results as the baseline of the suite")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Slowdown reported as regression")
+    args = parser.parse_args()
+
+    benchmarks = [{"users": users, "steps": args.steps or steps, "timeline_select_strategy": timeline_select_strategy,
+                   "user_link_strategy": user_link_strategy, "seed": args.seed}
+                  for users, steps in SUITES[args.suite]
+                  for timeline_select_strategy in TIMELINE_STRATEGIES
+                  for user_link_strategy in LINK_STRATEGIES]
+    benchmarks = [benchmark for benchmark in benchmarks if args.filter in benchmark_name(benchmark)]
+
+    baseline_path = os.path.join(BENCHMARKS_DIR, 'baselines', f'{args.suite}.json')
+    baselines = json.load(open(baseline_path, 'r'))['results'] if os.path.exists(baseline_path) else {}
+
+    results = {}
+
+    # One process per benchmark, for its own peak RSS
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(run_benchmark, benchmarks):
+
+            results[result['name']] = result
+            methods = ", ".join(f"{name} {method['mean'] * 1000:.2f}ms" for name, method in result['methods'].items())
+
+            print(f"{result['name']}: {result['steps_per_second']:.0f} steps/s, peak RSS {result['peak_rss_mb']:.0f} MB, "
+                  f"{compare(result, baselines.get(result['name']), args.tolerance)}")
+            print(f"    {methods}")
+
+    # Keep every run to follow the scaling over time
+    os.makedirs(os.path.join(BENCHMARKS_DIR, 'results'), exist_ok=True)
+    output = {"suite": args.suite, "date": datetime.now().isoformat(), "python": sys.version.split()[0], "results": results}
+    json.dump(output, open(os.path.join(BENCHMARKS_DIR, 'results', f"{args.suite}_{datetime.now():%Y%m%d_%H%M%S}.json"), 'w'), indent=4)
+
+    if args.save:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        json.dump({**output, "results": {**baselines, **results}}, open(baseline_path, 'w'), indent=4)
+        print(f"Saved baseline {baseline_path}")
@@ -3,8 +3,9 @@ import random
 
 from pydantic import BaseModel
 
-from openai import OpenAI
-from openai.types.chat import ParsedChoice
+from LLMBackend import LLMBackend, LLMResponse, ReplayMissError, as_backend
+import Prompts
+from Instrumentation import span
 
 class Action(BaseModel):
     option: int
@@ -17,11 +18,14 @@ class BooleanAction(BaseModel):
 
 class Agent():
 
+    __slots__ = ("persona", "llm", "model", "identifier", "followers", "used_tokens_input", "used_tokens_output",
+                 "used_tokens_cached")
+
     def __init__(self, model: str, persona: dict = None):
         
         self.persona = persona
 
-        self.llm = None
+        self.llm: LLMBackend | None = None
         self.model = model
 
         self.identifier = 0
@@ -31,6 +35,13 @@ class Agent():
         self.used_tokens_output = 0
         self.used_tokens_cached = 0
 
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in Agent.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def __repr__(self):
         return f"User {self.identifier} with {self.followers} followers"
     
@@ -46,48 +57,23 @@ class Agent():
         persona_list = json.load(open(persona_path, 'r'))
         return random.choice(persona_list)
     
-    def _generate_sys_msg(self) -> str:
-        """
-        Generate a system message to introduce the agent to the system and its persona.
-        """
-
-        sys_msg = f"""You are a user of the X social media platform. 
-                    This is a platform where users share opinions and thoughts on topics of interest in the form of posts.
-                    Your main goal is to repost others' posts and you are also able to share your own posts.
-
-                    Here is a description of your persona:
-                    {self.persona['persona']}
-        """
-
-        return sys_msg
-    
     def _add_bio(self):
 
-        prompt = f"""Write a very short (max. 140 characters), very informal social media biography for the following persona:
-        
-        {self.persona['persona']}
-
-        You may add things that are not in the persona. Do not use emoji. Write as if you are the person described."""
-
-        response = self.llm.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": prompt},
-            ]
-        )
+        response = self.llm.complete(self.model, Prompts.bio_messages(self.persona['persona']))
 
-        self.persona['biography'] = response.choices[0].message.content
+        self.persona['biography'] = response.content
 
         # print(self.persona['biography'])
     
-    def set_client(self, client: OpenAI):
+    def set_client(self, client):
         """
-        Set the client for the agent to use for the simulation.
+        Set the LLM backend for the agent to use for the simulation.
+        OpenAI clients are wrapped in an OpenAIBackend.
         """
 
-        self.llm = client
+        self.llm = as_backend(client)
 
-    def refresh_client(self, new_client: OpenAI):
+    def refresh_client(self, new_client):
         """
         Refresh the client for the agent to use for the simulation.
         """
@@ -119,27 +105,43 @@ class Agent():
         """
         self.followers += 1
     
-    def get_response(self, message: str, response_format = None) -> ParsedChoice:
+    def get_response(self, messages: list[dict], response_format = None) -> LLMResponse:
         """
-        Get the response from the agent to the given message.
+        Get the response from the agent to the given messages (see Prompts).
         """
 
-        response = self.llm.beta.chat.completions.parse(
-            model=self.model,
-            messages = [
-                {"role": "system", "content": self._generate_sys_msg()},
-                {"role": "user", "content": message}
-            ],
-            response_format=response_format
+        response = self.llm.parse(self.model, messages, response_format)
 
-        )
-
-        # Keep track of the tokens used for cost analysis
-        self.used_tokens_input += response.usage.prompt_tokens
-        self.used_tokens_output += response.usage.completion_tokens
-        self.used_tokens_cached += response.usage.prompt_tokens_details.cached_tokens
+        self.count_tokens(response)
         
-        return response.choices[0]
+        return response
+
+    async def aget_response(self, messages: list[dict], response_format = None) -> LLMResponse:
+        """
+        Get the response from the agent to the given messages, without blocking other steps.
+        The tokens are not counted here, as responses arrive in any order: the caller counts them
+        (count_tokens) when the step is applied.
+        """
+
+        return await self.llm.aparse(self.model, messages, response_format)
+
+    def count_tokens(self, response: LLMResponse):
+        """
+        Keep track of the tokens used for cost analysis.
+        """
+
+        self.used_tokens_input += response.prompt_tokens
+        self.used_tokens_output += response.completion_tokens
+        self.used_tokens_cached += response.cached_tokens
+
+    def _link_messages(self, other_agent: 'Agent', post_content: str, other_agent_posts: list, use_bio: bool = False,
+                       use_follower_count: bool = True) -> list[dict]:
+        """
+        Create the messages showing the profile of another agent, used to ask the user to follow them.
+        """
+
+        return Prompts.link_messages(self.persona['persona'], other_agent, post_content, other_agent_posts,
+                                     use_bio=use_bio, use_follower_count=use_follower_count)
     
     def link_with_user(self, other_agent: 'Agent', post_content: str, other_agent_posts: list, use_bio: bool = False,
                        use_follower_count: bool = True) -> str:
@@ -147,34 +149,29 @@ class Agent():
         Supply the bio of another agent and let the user decide if they want to follow them.
         """
 
-        msg = f"""You reposted this post:
-{post_content}
+        messages = self._link_messages(other_agent, post_content, other_agent_posts, use_bio=use_bio, use_follower_count=use_follower_count)
+        response = self.get_response(messages, BooleanAction).parsed
 
-You view the profile of the poster.
-User ID: {other_agent.identifier}
-"""
-        
-        if use_follower_count:
-            msg += f"Followers: {other_agent.followers}\n"
+        return True if response.choice.lower() == 'yes' else False, response.explanation
 
-        if use_bio:
-            msg += f"""Bio: {other_agent.persona['biography']}
-"""
-        
-        msg += """\nYou also see that the user has recently posted or reposted the following messages:\n\n"""
-        
-        for post in other_agent_posts[:5]:
+    async def alink_with_user(self, other_agent: 'Agent', post_content: str, other_agent_posts: list, use_bio: bool = False,
+                              use_follower_count: bool = True) -> tuple[bool, str, LLMResponse]:
+        """
+        Async version of link_with_user, also returns the response so its tokens can be counted in order.
+        """
 
-            msg += str(post['post_content'])
-            msg += "\n\n"
-        
-        msg += """Based on your beliefs, interests and personality, would you like to follow this user?
-Reply with 'yes' or 'no'. Also provide a short explanation for your choice."""
+        messages = self._link_messages(other_agent, post_content, other_agent_posts, use_bio=use_bio, use_follower_count=use_follower_count)
+        response = await self.aget_response(messages, BooleanAction)
 
-        response = self.get_response(msg, BooleanAction).message.parsed
+        return True if response.parsed.choice.lower() == 'yes' else False, response.parsed.explanation, response
+
+    def _action_messages(self, news_data: list, timeline: list) -> list[dict]:
+        """
+        Create the messages presenting the options, the timeline and the news headlines to the user.
+        """
+
+        return Prompts.action_messages(self.persona['persona'], news_data, timeline)
 
-        return True if response.choice.lower() == 'yes' else False, response.explanation
-    
     def perform_action(self, news_data: list, timeline: list) -> Action:
         """
         The user is presented with a set of options to choose from based on their persona.
@@ -183,32 +180,52 @@ Reply with 'yes' or 'no'. Also provide a short explanation for your choice."""
         - Do nothing
         """
 
-        msg = """You are presented with the following options. You have to choose exactly one option based on your persona.
-1. Choose exactly one of the posts from the timeline to repost on your social media feed that relates to your persona. [You can't repost if there are no posts on the timeline. Only write down the message ID as content!]
-2. Choose exactly one of the headlines to share on your social media feed based on your persona, and write a comment of 10-50 words about that one headline in the style of your personality. [Write only the message you want to share as content. Don't repeat the title of the headline, but introduce the topic briefly. You may choose news you agree or do not agree with and share this vision. Do not use quotation marks. Do not introduce yourself. Use informal language. You may write a positive message, but you may also use sarcasm or irony, swear, criticize, threat, lie, and engage in personal attacks. You can also bring up a related topic that the post made you think of. Do not start your message by describing your persona. Don't use hashtags.]
-3. Do nothing. [You can choose this option if you don't feel like sharing anything at the moment, or if you want to observe the platform for a while.]
-Also provide an explanation of one sentence about your choice.
-Reply in JSON format.\n\n"""
+        with span("prompt"):
+            messages = self._action_messages(news_data, timeline)
 
-        msg += """Here are the messages on the timeline for option 1:\n"""
+        # The volatile part of the prompt is logged with the action
+        msg = messages[-1]["content"]
 
-        for post in timeline:
+        # Get response and handle the action
 
-            msg += str(post['post_content'])
-            msg += "\n\n"
+        try:
+            response = self.get_response(messages, response_format=Action)
+        # A replay that no longer follows its recording stops the run instead of doing nothing
+        except ReplayMissError:
+            raise
+        except Exception as e:
+            print(f"Error: {e}")
+            return Action(option=-1, content="", explanation=str(e)), msg
 
-        msg += """Here are the news headlines for option 2:\n"""
+        return response.parsed, msg
 
-        for i, news_item in enumerate(news_data, start=1):
+    def aperform_action(self, news_data: list, timeline: list):
+        """
+        Async version of perform_action.
+        The prompt is created when this method is called, so it shows the platform as it is at that moment,
+        not when the returned coroutine starts running.
+        """
 
-            msg += f"""ID: {i}\nTitle: {news_item['headline']}\nCategory: {news_item['category']}\nDescription: {news_item['short_description']}\n\n"""
+        with span("prompt"):
+            messages = self._action_messages(news_data, timeline)
 
-        # Get response and handle the action
+        return self._aperform_action(messages)
+
+    async def _aperform_action(self, messages: list[dict]) -> tuple[Action, str, LLMResponse | None]:
+        """
+        Get the response to the action messages without blocking other steps.
+        Returns the action, the logged prompt and the response (None on errors), whose tokens are counted
+        when the action is applied.
+        """
+
+        msg = messages[-1]["content"]
 
         try:
-            response = self.get_response(msg, response_format=Action)
+            response = await self.aget_response(messages, response_format=Action)
+        except ReplayMissError:
+            raise
         except Exception as e:
             print(f"Error: {e}")
-            return Action(option=-1, content="", explanation=str(e)), msg
+            return Action(option=-1, content="", explanation=str(e)), msg, None
 
-        return response.message.parsed, msg
+        return response.parsed, msg, response
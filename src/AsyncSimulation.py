@@ -0,0 +1,111 @@
+import asyncio
+import time
+from collections import deque
+
+from Platform import Platform
+from NewsFeed import NewsFeed
+from Instrumentation import span, start_step
+
+
+class AsyncSimulation():
+    """
+    Runs simulation steps with up to `concurrency` agent actions waiting for the LLM at the same time.
+
+    Steps are started in order: a user is sampled, their timeline and news are selected and the prompt is created.
+    The actions are applied to the platform (Platform.aparse_and_do_action) in the same order. Step i is started
+    right after step i - concurrency has been applied, so it always sees the platform after exactly the steps
+    before i - concurrency + 1. The sequence of random draws, and therefore the event log for the same LLM answers,
+    does not depend on how fast the LLM answers.
+    """
+
+    def __init__(self, platform: Platform, news_feed: NewsFeed, concurrency: int = 8, on_step=None):
+
+        if concurrency < 1:
+            raise Exception("Concurrency should be at least 1")
+
+        self.platform = platform
+        self.news_feed = news_feed
+        self.concurrency = concurrency
+
+        # Called with (step, user, action) after a step is applied, e.g. to print the action
+        self.on_step = on_step
+
+        self.steps_done = 0
+
+    def _start_step(self, step: int):
+        """
+        Sample a user and start their action, returns (step, user, task).
+        """
+
+        print(f"Simulation step {step + 1}")
+        start_step(step)
+
+        user = self.platform.sample_user()
+
+        with span("news"):
+            news = self.news_feed.get_random_news(10)
+        with span("timeline"):
+            timeline = self.platform.get_timeline(user.identifier, 10)
+
+        task = asyncio.ensure_future(user.aperform_action(news, timeline))
+
+        return step, user, task
+
+    async def _apply_step(self, step: int, user, task):
+        """
+        Wait for the action of a started step and apply it to the platform.
+        """
+
+        action, prompt, response = await task
+
+        # Count the tokens in the order the steps are applied, not in the order the responses arrive
+        if response is not None:
+            user.count_tokens(response)
+
+        with span("apply_action"):
+            await self.platform.aparse_and_do_action(user.identifier, action, prompt)
+
+        # Add snapshot of the platform for analysis
+        with span("snapshot"):
+            self.platform.add_snapshot()
+
+        self.steps_done += 1
+
+        if self.on_step is not None:
+            self.on_step(step, user, action)
+
+    async def run(self, simulation_steps: int, first_step: int = 0) -> dict:
+        """
+        Run the simulation steps and return a throughput report.
+        """
+
+        start_time = time.perf_counter()
+        in_flight = deque()
+
+        try:
+            for step in range(first_step, first_step + simulation_steps):
+
+                if len(in_flight) == self.concurrency:
+                    await self._apply_step(*in_flight.popleft())
+
+                in_flight.append(self._start_step(step))
+
+            while in_flight:
+                await self._apply_step(*in_flight.popleft())
+        finally:
+            # Don't leave actions running if a step fails
+            for _, _, task in in_flight:
+                task.cancel()
+
+        elapsed = time.perf_counter() - start_time
+
+        report = {
+            "steps": self.steps_done,
+            "concurrency": self.concurrency,
+            "seconds": elapsed,
+            "steps_per_second": self.steps_done / elapsed if elapsed > 0 else 0.0
+        }
+
+        print(f"Ran {report['steps']} steps in {report['seconds']:.1f}s ({report['steps_per_second']:.2f} steps/s, concurrency {self.concurrency})")
+
+        return report
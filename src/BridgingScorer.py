@@ -0,0 +1,243 @@
+import collections
+import hashlib
+import math
+import os
+import queue
+import random
+import threading
+import time
+
+import requests
+
+PERSPECTIVE_URL = "https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze"
+
+BRIDGING_ATTRIBUTES = ['AFFINITY_EXPERIMENTAL', 'COMPASSION_EXPERIMENTAL', 'CURIOSITY_EXPERIMENTAL', 'NUANCE_EXPERIMENTAL',
+                       'PERSONAL_STORY_EXPERIMENTAL', 'REASONING_EXPERIMENTAL', 'RESPECT_EXPERIMENTAL']
+
+
+class BridgingScorer():
+    """
+    Scores posts with the Perspective API in background threads, so posting does not wait for the API.
+
+    - submit(post, step) queues the content of a post (bounded queue, posting blocks only when it is full)
+    - posts with the same content share one request, and scores are cached by content hash
+    - failed requests are retried with exponential backoff, after `max_retries` the fallback score is used
+    - apply(step) sets the scores of the posts submitted `delay_steps` steps before, on the thread of the simulation
+
+    Scores are applied at a fixed step after the post was submitted and in the order of submission, waiting for
+    the API if a score is not finished yet. So the timelines do not depend on when the responses arrive,
+    and a resumed simulation applies the scores at the same steps.
+    Until it is scored, a post has bridging_score None and is ranked with `fallback_score`.
+    """
+
+    def __init__(self, url: str | None = None, api_key: str | None = None, workers: int = 4, queue_size: int = 1000,
+                 max_retries: int = 3, backoff: float = 0.5, timeout: float = 10.0, fallback_score: float = 0.0,
+                 delay_steps: int = 5):
+
+        self.url = url or os.environ.get("PERSPECTIVE_API_URL", PERSPECTIVE_URL)
+        self.api_key = api_key or os.environ.get("PERSPECTIVE_API_KEY")
+
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.fallback_score = fallback_score
+        self.delay_steps = delay_steps
+
+        # content hash -> score, only updated when scores are applied
+        self.cache: dict[str, float] = {}
+
+        # (step, content hash, post, requested) in the order the posts were submitted
+        self.scheduled = collections.deque()
+
+        # content hash -> number of scheduled posts waiting for its request
+        self.waiting: dict[str, int] = {}
+
+        # content hash -> (score, success) of requests finished by the workers and not applied to all posts yet
+        self.finished: dict[str, tuple] = {}
+
+        # (content hash, content) to score, and (content hash, score, success) scored by the workers
+        self.requests = queue.Queue(maxsize=queue_size)
+        self.results = queue.SimpleQueue()
+
+        # Jitter of the backoff, separate from the random state of the simulation
+        self.jitter = random.Random()
+
+        # Counted by the workers
+        self.counter_lock = threading.Lock()
+        self.scored = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, post, step: int):
+        """
+        Queue a post submitted in the given step for scoring. Posts with cached content are not requested again.
+        """
+
+        key = hashlib.sha256(post.content.encode('utf-8')).hexdigest()
+
+        if key in self.cache:
+            self.scheduled.append((step, key, post, False))
+            self.cache_hits += 1
+            return
+
+        if key in self.waiting:
+            self.waiting[key] += 1
+            self.coalesced += 1
+        else:
+            self.waiting[key] = 1
+            self.requests.put((key, post.content))
+
+        self.scheduled.append((step, key, post, True))
+
+    def apply(self, step: float, on_score=None, timeout: float | None = None) -> int:
+        """
+        Set the scores of the posts submitted at least `delay_steps` before the given step on the posts, in the order
+        they were submitted, and call on_score(post) for each post. Waits for scores that are not finished
+        (up to timeout seconds, or without limit). Returns the number of scored posts.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        n_posts = 0
+
+        while self.scheduled and self.scheduled[0][0] + self.delay_steps <= step:
+
+            submitted, key, post, requested = self.scheduled[0]
+
+            if requested:
+                if not self._wait(key, deadline):
+                    break
+
+                score, success = self.finished[key]
+
+                self.waiting[key] -= 1
+                if self.waiting[key] == 0:
+                    del self.waiting[key]
+                    del self.finished[key]
+
+                if success:
+                    self.cache[key] = score
+            else:
+                score = self.cache[key]
+
+            self.scheduled.popleft()
+            post.bridging_score = score
+            n_posts += 1
+
+            if on_score is not None:
+                on_score(post)
+
+        return n_posts
+
+    def flush(self, on_score=None, timeout: float = 60.0):
+        """
+        Wait until all submitted posts are scored (or the timeout passes) and apply the scores.
+        """
+
+        self.apply(math.inf, on_score, timeout=timeout)
+
+    def close(self):
+        """
+        Stop the workers. Requests still in the queue are not sent.
+        """
+
+        while True:
+            try:
+                self.requests.get_nowait()
+            except queue.Empty:
+                break
+
+        for _ in self.workers:
+            self.requests.put(None)
+
+        for worker in self.workers:
+            worker.join()
+
+    def stats(self) -> dict:
+        """
+        Counters for logging purposes.
+        """
+        return {
+            "scored": self.scored,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "pending": len(self.scheduled)
+        }
+
+    def _work(self):
+
+        while True:
+            request = self.requests.get()
+
+            if request is None:
+                return
+
+            key, content = request
+
+            try:
+                score = self._score(content)
+            except Exception as e:
+                print(f"Error in perspective API call: {e}")
+                with self.counter_lock:
+                    self.failed += 1
+                self.results.put((key, self.fallback_score, False))
+                continue
+
+            with self.counter_lock:
+                self.scored += 1
+            self.results.put((key, score, True))
+
+    def _wait(self, key: str, deadline: float | None) -> bool:
+        """
+        Collect the results of the workers until the request of the content hash is finished.
+        Returns False if the deadline passed first.
+        """
+
+        while key not in self.finished:
+
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+
+            try:
+                finished_key, score, success = self.results.get(timeout=remaining)
+            except queue.Empty:
+                return False
+
+            self.finished[finished_key] = (score, success)
+
+        return True
+
+    def _score(self, content: str) -> float:
+        """
+        Returns the mean of the bridging attributes of the content, retrying with exponential backoff.
+        """
+
+        body_json = {'comment': {'text': content},
+                     'languages': ["en"],
+                     'requestedAttributes': {attribute: {} for attribute in BRIDGING_ATTRIBUTES}}
+
+        for attempt in range(self.max_retries + 1):
+
+            try:
+                r = requests.post(self.url, params={'key': self.api_key}, json=body_json, timeout=self.timeout)
+
+                # Only rate limits and server errors are worth retrying
+                if r.status_code != 429 and r.status_code < 500:
+                    r.raise_for_status()
+                    perspective_response = r.json()
+
+                    scores = [perspective_response['attributeScores'][attribute]['summaryScore']['value'] for attribute in BRIDGING_ATTRIBUTES]
+                    return sum(scores) / len(scores)
+
+                error = Exception(f"Perspective API returned {r.status_code}")
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * 2 ** attempt * self.jitter.uniform(0.5, 1.5))
+
+        raise error
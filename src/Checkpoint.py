@@ -0,0 +1,108 @@
+import json
+import os
+import random
+
+from Platform import Platform
+from NewsFeed import NewsFeed
+
+
+def write_checkpoint(platform: Platform, news_feed: NewsFeed, step: int):
+    """
+    Write a checkpoint to the event log of the platform after `step` simulation steps.
+    The platform itself is already in the log, so a checkpoint only adds the random states and the step counter.
+    """
+
+    if platform.event_log is None:
+        raise Exception("Checkpoints need an event log")
+
+    total_tokens = {
+        "used_tokens_input": sum([user.used_tokens_input for user in platform.users]),
+        "used_tokens_output": sum([user.used_tokens_output for user in platform.users]),
+        "used_tokens_cached": sum([user.used_tokens_cached for user in platform.users])
+    }
+
+    platform.log_event("checkpoint", step=step, random_state=random.getstate(),
+                       news_feed_state=news_feed.rng.bit_generator.state, **total_tokens)
+
+    # The checkpoint is only useful if it survives a crash
+    platform.event_log.sync()
+
+
+def _is_checkpoint(line: bytes) -> bool:
+    return line.startswith(b'{"event": "checkpoint"')
+
+
+def find_last_checkpoint(path: str) -> tuple[dict | None, int]:
+    """
+    Returns the last checkpoint in an event log and the position in the file right after it.
+    """
+
+    checkpoint = None
+    checkpoint_end = 0
+    position = 0
+
+    with open(path, 'rb') as f:
+        for line in f:
+
+            # Incomplete last line
+            if not line.endswith(b"\n"):
+                break
+
+            position += len(line)
+
+            if _is_checkpoint(line):
+                checkpoint = json.loads(line)
+                checkpoint_end = position
+
+    return checkpoint, checkpoint_end
+
+
+def restore_checkpoint(path: str, model: str, news_feed: NewsFeed) -> tuple[Platform, dict]:
+    """
+    Rebuild the platform from the event log up to its last checkpoint, and restore the random states.
+    Events after the checkpoint (from steps that did not finish before the checkpoint interval) are removed
+    from the log, as these steps will be run again. Returns the platform and the checkpoint.
+    """
+
+    checkpoint, checkpoint_end = find_last_checkpoint(path)
+
+    if checkpoint is None:
+        raise Exception(f"No checkpoint found in {path}")
+
+    platform = None
+    position = 0
+
+    with open(path, 'rb') as f:
+        for line in f:
+
+            position += len(line)
+            if position > checkpoint_end:
+                break
+
+            event = json.loads(line)
+
+            # Logs from before metrics_interval was logged have metrics after every step
+            if event["event"] == "platform":
+                platform = Platform(user_link_strategy=event["user_link_strategy"],
+                                    timeline_select_strategy=event["timeline_select_strategy"],
+                                    show_info=event["show_info"],
+                                    snapshot_keyframe_interval=event["snapshot_keyframe_interval"],
+                                    metrics_interval=event.get("metrics_interval", 1),
+                                    database=event.get("database"), rebuild_database=True)
+            elif event["event"] != "checkpoint":
+                platform.replay_event(event, model)
+
+    for key in ("used_tokens_input", "used_tokens_output", "used_tokens_cached"):
+        if sum([getattr(user, key) for user in platform.users]) != checkpoint[key]:
+            raise Exception(f"Restored {key} does not match the checkpoint")
+
+    # Drop the events of the unfinished steps
+    if os.path.getsize(path) > checkpoint_end:
+        with open(path, 'r+b') as f:
+            f.truncate(checkpoint_end)
+
+    version, state, gauss_next = checkpoint["random_state"]
+    random.setstate((version, tuple(state), gauss_next))
+    news_feed.rng.bit_generator.state = checkpoint["news_feed_state"]
+
+    return platform, checkpoint
@@ -0,0 +1,116 @@
+from httpx import Limits
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APITimeoutError
+from openai import DefaultHttpxClient, DefaultAsyncHttpxClient, DEFAULT_MAX_RETRIES
+
+
+class ClientProvider():
+    """
+    Shares one OpenAI client (and one async client) between all agents, with a keep-alive connection pool
+    of a fixed size. Clients are created when first used, with the default timeouts of the SDK.
+
+    Instead of recreating the clients at fixed intervals, they are recycled when they look unhealthy:
+    after `max_consecutive_errors` connection errors or timeouts in a row.
+
+    The clients retry failed requests `max_retries` times themselves, set it to 0 when the requests
+    are already retried by a RateLimitedBackend.
+    """
+
+    def __init__(self, max_connections: int = 16, max_keepalive_connections: int | None = None,
+                 keepalive_expiry: float = 30.0, max_consecutive_errors: int = 5, max_retries: int = DEFAULT_MAX_RETRIES):
+
+        self.limits = Limits(max_connections=max_connections,
+                             max_keepalive_connections=max_keepalive_connections or max_connections,
+                             keepalive_expiry=keepalive_expiry)
+        self.max_consecutive_errors = max_consecutive_errors
+        self.max_retries = max_retries
+
+        self._client: OpenAI | None = None
+        self._async_client: AsyncOpenAI | None = None
+
+        # Recycled async clients can still have requests in flight, they are closed in aclose
+        self.retired_async_clients: list[AsyncOpenAI] = []
+
+        self.consecutive_errors = 0
+        self.recycled = 0
+
+    @property
+    def client(self) -> OpenAI:
+        """
+        The shared client, created on first use.
+        """
+
+        if self._client is None:
+            self._client = OpenAI(http_client=DefaultHttpxClient(limits=self.limits), max_retries=self.max_retries)
+
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """
+        The shared async client, created on first use.
+        """
+
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(http_client=DefaultAsyncHttpxClient(limits=self.limits),
+                                             max_retries=self.max_retries)
+
+        return self._async_client
+
+    def report_success(self):
+        """
+        Report a successful request.
+        """
+        self.consecutive_errors = 0
+
+    def report_error(self, error: Exception):
+        """
+        Report a failed request, recycling the clients if the connection looks broken.
+        """
+
+        if not isinstance(error, (APIConnectionError, APITimeoutError)):
+            return
+
+        self.consecutive_errors += 1
+
+        if self.consecutive_errors >= self.max_consecutive_errors:
+            print(f"{self.consecutive_errors} connection errors in a row, recycling the LLM clients")
+            self.recycle()
+
+    def recycle(self):
+        """
+        Replace the clients (and their connections) by new ones on the next request.
+        """
+
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+        if self._async_client is not None:
+            self.retired_async_clients.append(self._async_client)
+            self._async_client = None
+
+        self.consecutive_errors = 0
+        self.recycled += 1
+
+    def close(self):
+        """
+        Close the client.
+        """
+
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self):
+        """
+        Close the async clients, from the event loop that used them.
+        """
+
+        if self._async_client is not None:
+            self.retired_async_clients.append(self._async_client)
+            self._async_client = None
+
+        for async_client in self.retired_async_clients:
+            await async_client.close()
+
+        self.retired_async_clients = []
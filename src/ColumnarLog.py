@@ -0,0 +1,109 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+from EventLog import read_event_log
+
+
+def _column(values, dtype) -> np.ndarray:
+    return np.array(values, dtype=dtype) if len(values) > 0 else np.zeros(0, dtype=dtype)
+
+
+def log_to_columns(log: dict) -> dict[str, np.ndarray]:
+    """
+    Convert a log (Platform.generate_log or read_event_log) to typed arrays, one per field:
+    - user_*: identifier, party (index into parties), partisan, followers and used tokens, one entry per user
+    - post_*: post_id, author, timestamp and reposts, one entry per raw post
+    - reposters / reposters_offsets: the reposters of raw post i are reposters[reposters_offsets[i]:reposters_offsets[i + 1]]
+    - link_from / link_to: the user links
+    - action_*: user, action (1 repost, 2 post, 3 nothing) and success, one entry per action
+    - metrics_*: the metrics time series (see OnlineMetrics), missing values are NaN
+    """
+
+    users = log['users']
+    raw_posts = log['raw_posts']
+    actions = log['actions']
+
+    parties = sorted({user['persona']['party'] for user in users if 'persona' in user})
+    party_index = {party: i for i, party in enumerate(parties)}
+
+    columns = {
+        "parties": _column(parties, str),
+        "user_id": _column([user['identifier'] for user in users], np.int32),
+        "user_party": _column([party_index[user['persona']['party']] if 'persona' in user else -1 for user in users], np.int8),
+        "user_partisan": _column([user['persona']['partisan'] if 'persona' in user else np.nan for user in users], np.float64),
+        "user_followers": _column([user['followers'] for user in users], np.int64),
+        "user_tokens_input": _column([user['used_tokens_input'] for user in users], np.int64),
+        "user_tokens_output": _column([user['used_tokens_output'] for user in users], np.int64),
+        "user_tokens_cached": _column([user['used_tokens_cached'] for user in users], np.int64),
+
+        "post_id": _column([post['post_id'] for post in raw_posts], np.int64),
+        "post_author": _column([post['author'] for post in raw_posts], np.int32),
+        "post_timestamp": _column([post['timestamp'] for post in raw_posts], 'datetime64[us]'),
+        "post_reposts": _column([post['reposts'] for post in raw_posts], np.int32),
+
+        "reposters": _column([reposter for post in raw_posts for reposter in post['reposters']], np.int32),
+        "reposters_offsets": np.concatenate(([0], np.cumsum([len(post['reposters']) for post in raw_posts], dtype=np.int64))),
+
+        "link_from": _column([link[0] for link in log['user_links']], np.int32),
+        "link_to": _column([link[1] for link in log['user_links']], np.int32),
+
+        "action_user": _column([action['user_id'] for action in actions], np.int32),
+        "action_option": _column([action['action'] for action in actions], np.int8),
+        "action_success": _column([action['success'] for action in actions], np.bool_),
+    }
+
+    metrics = log.get('metrics', [])
+    if metrics:
+        for key in metrics[0]:
+            columns[f"metrics_{key}"] = _column([np.nan if entry[key] is None else entry[key] for entry in metrics],
+                                                np.int64 if key in ("step", "users", "posts", "links") else np.float64)
+
+    return columns
+
+
+def save_columns(log: dict, path: str):
+    """
+    Write the columns of a log to a single .npz file, or to a directory of .npy files (one per column)
+    that can be memory-mapped by load_columns.
+    """
+
+    columns = log_to_columns(log)
+
+    if path.endswith('.npz'):
+        np.savez(path, **columns)
+        return
+
+    os.makedirs(path, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(path, name + '.npy'), values)
+
+
+def load_columns(path: str, mmap: bool = True) -> dict[str, np.ndarray]:
+    """
+    Load the columns written by save_columns. The .npy files of a directory are memory-mapped unless mmap is False.
+    """
+
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    return {os.path.splitext(name)[0]: np.load(os.path.join(path, name), mmap_mode='r' if mmap else None)
+            for name in sorted(os.listdir(path)) if name.endswith('.npy')}
+
+
+if __name__ == "__main__":
+
+    # Convert an event log (or a JSON log) to columns
+    # python ColumnarLog.py ../results/run.jsonl [../results/run.npz | ../results/run_columns]
+    log_path = sys.argv[1]
+    columns_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(log_path)[0] + '.npz'
+
+    if log_path.endswith('.jsonl'):
+        log = read_event_log(log_path)
+    else:
+        log = json.load(open(log_path, 'r'))
+
+    save_columns(log, columns_path)
@@ -0,0 +1,200 @@
+import json
+import os
+import sys
+
+from SnapshotJournal import SnapshotJournal
+
+
+class EventLog():
+    """
+    Append-only log of everything that happens on the platform, written as JSON Lines while the simulation runs.
+    Each line is one event of the form {"event": type, ...}. Lines are flushed as they are written and the file
+    is synced to disk every `fsync_interval` events, so a crash loses at most the events since the last sync.
+
+    Event types:
+    - platform: settings of the platform
+    - user: a registered user (Agent.json(include_persona=True))
+    - post / repost: a new post or repost
+    - bridging_score: the bridging score of a post and the step it was set in, scored in the background (see BridgingScorer)
+    - link_decision: the answer of a user asked to follow the author of a reposted post
+    - link: a new link between two users
+    - action: an action taken by a user (as stored in Platform.actions), its prompt is only the user message
+      of the call (timeline and news), the system message is Prompts.ACTION_INSTRUCTIONS with the persona of the user
+    - usage: the total tokens used by a user after an action
+    - step: end of a simulation step, with the changes to the network (see SnapshotJournal)
+    - metrics: network metrics after a step, every metrics_interval steps (see OnlineMetrics)
+    - checkpoint: random states and step counter to resume the simulation from (see Checkpoint)
+    - llm_cache: hits and misses of the response cache at the end of a run (see ResponseCache)
+    """
+
+    def __init__(self, path: str, fsync_interval: int = 100, append: bool = False):
+
+        self.path = path
+        self.fsync_interval = fsync_interval
+
+        # A new run starts a new log, a resumed run continues the log it was resumed from.
+        # Line buffered, every event reaches the OS as soon as it is written
+        self.file = open(path, 'a' if append else 'w', buffering=1, encoding='utf-8')
+        self.unsynced_events = 0
+
+    def write(self, event: str, **data):
+        """
+        Append an event to the log.
+        """
+
+        self.file.write(json.dumps({"event": event, **data}, default=str) + "\n")
+        self.unsynced_events += 1
+
+        if self.unsynced_events >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """
+        Make sure all written events are stored on disk.
+        """
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced_events = 0
+
+    def close(self):
+        """
+        Sync and close the log.
+        """
+
+        if self.file.closed:
+            return
+
+        self.sync()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_events(path: str):
+    """
+    Yield the events of a log in order. An incomplete last line (e.g. after a crash) is skipped.
+    """
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+
+            if not line.endswith("\n"):
+                break
+
+            yield json.loads(line)
+
+
+def read_event_log(path: str) -> dict:
+    """
+    Rebuild the log of Platform.generate_log from an event log.
+    """
+
+    users = {}
+    posts = []
+    raw_posts = {}
+    user_links = []
+    actions = []
+    journal = None
+    cache_stats = None
+    metrics = []
+
+    for event in read_events(path):
+
+        event_type = event["event"]
+
+        if event_type == "platform":
+            journal = SnapshotJournal(keyframe_interval=event["snapshot_keyframe_interval"])
+
+        elif event_type == "user":
+            users[event["user"]["identifier"]] = event["user"]
+
+        elif event_type == "post":
+            raw_posts[event["post_id"]] = {
+                "post_id": event["post_id"],
+                "author": event["user_id"],
+                "timestamp": event["time"],
+                "content": event["content"],
+                "reposts": 0,
+                "reposters": []
+            }
+            posts.append({
+                "post_id": event["post_id"],
+                "user_id": event["user_id"],
+                "time": event["time"],
+                "post_content": raw_posts[event["post_id"]]
+            })
+
+        elif event_type == "repost":
+            post = raw_posts[event["original_post_id"]]
+            post["reposts"] += 1
+            post["reposters"].append(event["user_id"])
+
+            posts.append({
+                "post_id": event["post_id"],
+                "user_id": event["user_id"],
+                "time": event["time"],
+                "post_content": post
+            })
+
+        elif event_type == "link":
+            user_links.append((event["user_id_from"], event["user_id_to"]))
+            users[event["user_id_to"]]["followers"] += 1
+
+        elif event_type == "usage":
+            users[event["user_id"]].update({key: event[key] for key in ("used_tokens_input", "used_tokens_output", "used_tokens_cached")})
+
+        elif event_type == "action":
+            actions.append({key: value for key, value in event.items() if key != "event"})
+
+        elif event_type == "step":
+            if journal is None:
+                journal = SnapshotJournal()
+            journal.add_delta(event["delta"])
+
+        elif event_type == "metrics":
+            metrics.append({key: value for key, value in event.items() if key != "event"})
+
+        elif event_type == "llm_cache":
+            cache_stats = {key: value for key, value in event.items() if key != "event"}
+
+    total_input_tokens = sum([user["used_tokens_input"] for user in users.values()])
+    total_output_tokens = sum([user["used_tokens_output"] for user in users.values()])
+    total_cached_tokens = sum([user["used_tokens_cached"] for user in users.values()])
+
+    predicted_cost = ((0.6 / 1000000) * total_output_tokens) + \
+                        ((0.15 / 1000000) * (total_input_tokens - total_cached_tokens) + \
+                        ((0.075 / 1000000) * total_cached_tokens))
+
+    log = {
+        "total_tokens_input": total_input_tokens,
+        "total_tokens_output": total_output_tokens,
+        "total_tokens_cached": total_cached_tokens,
+        "predicted_cost": predicted_cost,
+        "users": list(users.values()),
+        "posts": posts,
+        "raw_posts": list(raw_posts.values()),
+        "user_links": user_links,
+        "actions": actions,
+        "snapshot_journal": (journal or SnapshotJournal()).json(),
+        "metrics": metrics
+    }
+
+    if cache_stats is not None:
+        log["llm_cache"] = cache_stats
+
+    return log
+
+
+if __name__ == "__main__":
+
+    # Convert an event log to the JSON log of Platform.generate_log
+    # python EventLog.py ../results/run.jsonl [../results/run.json]
+    events_path = sys.argv[1]
+    json_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(events_path)[0] + '.json'
+
+    json.dump(read_event_log(events_path), open(json_path, 'w'), indent=4, default=str)
@@ -0,0 +1,272 @@
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+
+import numpy as np
+
+from LLMBackend import LLMBackend, LLMResponse
+
+# Profiler of the running simulation (see start_profiler), nothing is measured when it is None
+profiler = None
+
+
+class Histogram():
+    """
+    Keeps all recorded values, summarized as count, total, mean, p50, p95, p99 and max.
+    """
+
+    def __init__(self):
+        self.values: list[float] = []
+
+    def add(self, value: float):
+        self.values.append(value)
+
+    def summary(self) -> dict:
+
+        if not self.values:
+            return {"count": 0}
+
+        values = np.array(self.values)
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+
+        return {
+            "count": len(values),
+            "total": float(values.sum()),
+            "mean": float(values.mean()),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(values.max())
+        }
+
+
+class Profiler():
+    """
+    Times named spans of the simulation steps (e.g. timeline, prompt, snapshot) and keeps histograms of the
+    latency and tokens of LLM calls per call type.
+
+    With profile_steps=(first, last), the steps first..last (inclusive) are profiled with cProfile, and with
+    profile_memory also the allocations made in these steps are traced with tracemalloc.
+    """
+
+    def __init__(self, profile_steps: tuple[int, int] | None = None, profile_memory: bool = False):
+
+        self.spans: dict[str, Histogram] = {}
+
+        # call type -> {"latency": Histogram, "prompt_tokens": Histogram, ...}
+        self.llm_calls: dict[str, dict[str, Histogram]] = {}
+
+        self.profile_steps = profile_steps
+        self.profile_memory = profile_memory
+        self.cprofile = None
+        self.cprofile_stats = None
+        self.memory_stats = None
+
+        self.start_time = time.perf_counter()
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.setdefault(name, Histogram()).add(time.perf_counter() - start_time)
+
+    def record_llm_call(self, call_type: str, seconds: float, response: LLMResponse):
+
+        histograms = self.llm_calls.setdefault(call_type, {key: Histogram() for key in
+                                                           ("latency", "prompt_tokens", "completion_tokens", "cached_tokens")})
+
+        histograms["latency"].add(seconds)
+        histograms["prompt_tokens"].add(response.prompt_tokens)
+        histograms["completion_tokens"].add(response.completion_tokens)
+        histograms["cached_tokens"].add(response.cached_tokens)
+
+    def cached_token_ratio(self, call_type: str) -> float:
+        """
+        Fraction of the prompt tokens of a call type that were served from the prefix cache of the provider.
+        """
+
+        histograms = self.llm_calls[call_type]
+        prompt_tokens = sum(histograms["prompt_tokens"].values)
+
+        return sum(histograms["cached_tokens"].values) / prompt_tokens if prompt_tokens > 0 else 0.0
+
+    def step(self, step: int):
+        """
+        Called at the start of every step (0-based), starts and stops the profiling window.
+        """
+
+        if self.profile_steps is None:
+            return
+
+        first, last = self.profile_steps
+
+        if step == first:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+            if self.profile_memory:
+                tracemalloc.start()
+
+        elif step == last + 1:
+            self.stop_window()
+
+    def stop_window(self):
+        """
+        Stop profiling and keep the top functions and allocations.
+        """
+
+        if self.cprofile is None:
+            return
+
+        self.cprofile.disable()
+
+        output = io.StringIO()
+        pstats.Stats(self.cprofile, stream=output).sort_stats("cumulative").print_stats(30)
+        self.cprofile_stats = output.getvalue().splitlines()
+        self.cprofile = None
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.memory_stats = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_allocations": [str(stat) for stat in snapshot.statistics("lineno")[:20]]
+            }
+
+    def summary(self) -> dict:
+
+        self.stop_window()
+
+        summary = {
+            "seconds": time.perf_counter() - self.start_time,
+            "spans": {name: histogram.summary() for name, histogram in self.spans.items()},
+            "llm_calls": {call_type: {**{key: histogram.summary() for key, histogram in histograms.items()},
+                                      "cached_token_ratio": self.cached_token_ratio(call_type)}
+                          for call_type, histograms in self.llm_calls.items()}
+        }
+
+        if self.profile_steps is not None:
+            summary["profile_steps"] = list(self.profile_steps)
+            summary["cprofile"] = self.cprofile_stats
+
+        if self.memory_stats is not None:
+            summary["memory"] = self.memory_stats
+
+        return summary
+
+    def write(self, path: str):
+        """
+        Write the summary to a JSON file and print the time per span.
+        """
+
+        summary = self.summary()
+
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=4)
+
+        for name, span in sorted(summary["spans"].items(), key=lambda item: -item[1].get("total", 0)):
+            print(f"{name}: {span['count']}x, {span['total']:.2f}s total, p50 {span['p50'] * 1000:.1f}ms, p99 {span['p99'] * 1000:.1f}ms")
+
+        for call_type, calls in summary["llm_calls"].items():
+            print(f"LLM {call_type}: {calls['latency']['count']} calls, p50 {calls['latency']['p50']:.2f}s, "
+                  f"p99 {calls['latency']['p99']:.2f}s, cached tokens {calls['cached_token_ratio']:.1%}")
+
+
+def start_profiler(profile_steps: tuple[int, int] | None = None, profile_memory: bool = False) -> Profiler:
+    """
+    Start measuring, returns the new profiler.
+    """
+
+    global profiler
+    profiler = Profiler(profile_steps=profile_steps, profile_memory=profile_memory)
+
+    return profiler
+
+
+def stop_profiler() -> Profiler | None:
+    """
+    Stop measuring, returns the profiler that was running.
+    """
+
+    global profiler
+    stopped, profiler = profiler, None
+
+    return stopped
+
+
+def span(name: str):
+    """
+    Time a phase of a step: with span("timeline"): ...
+    """
+
+    if profiler is None:
+        return contextlib.nullcontext()
+
+    return profiler.span(name)
+
+
+def start_step(step: int):
+    """
+    Mark the start of a simulation step (0-based).
+    """
+
+    if profiler is not None:
+        profiler.step(step)
+
+
+class InstrumentedBackend(LLMBackend):
+    """
+    Records the latency and tokens of every call to another backend in the running profiler.
+    The call type is the name of the response format (e.g. Action, BooleanAction), or "complete".
+    """
+
+    def __init__(self, backend: LLMBackend):
+        self.backend = backend
+
+    def _record(self, call_type: str, start_time: float, response: LLMResponse):
+
+        if profiler is not None:
+            profiler.record_llm_call(call_type, time.perf_counter() - start_time, response)
+
+    def parse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        start_time = time.perf_counter()
+        response = self.backend.parse(model, messages, response_format)
+        self._record(response_format.__name__, start_time, response)
+
+        return response
+
+    async def aparse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        start_time = time.perf_counter()
+        response = await self.backend.aparse(model, messages, response_format)
+        self._record(response_format.__name__, start_time, response)
+
+        return response
+
+    def complete(self, model: str, messages: list[dict]) -> LLMResponse:
+
+        start_time = time.perf_counter()
+        response = self.backend.complete(model, messages)
+        self._record("complete", start_time, response)
+
+        return response
+
+    def cache_stats(self) -> dict | None:
+        return self.backend.cache_stats()
+
+    def close(self):
+        self.backend.close()
+
+    async def aclose(self):
+        await self.backend.aclose()
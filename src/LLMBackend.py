@@ -0,0 +1,430 @@
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import random
+import re
+
+from pydantic import BaseModel
+
+from openai import OpenAI, AsyncOpenAI
+
+
+class LLMResponse():
+    """
+    The answer of a backend to a request: the parsed response (for structured output) or the text content,
+    and the number of tokens used.
+    """
+
+    def __init__(self, parsed: BaseModel | None = None, content: str | None = None, prompt_tokens: int = 0,
+                 completion_tokens: int = 0, cached_tokens: int = 0):
+
+        self.parsed = parsed
+        self.content = content
+
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cached_tokens = cached_tokens
+
+    def json(self):
+        """
+        Return the response as a JSON object for storing.
+        """
+        return {
+            "parsed": self.parsed.model_dump() if self.parsed is not None else None,
+            "content": self.content,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens
+        }
+
+    @classmethod
+    def from_json(cls, data: dict, response_format=None) -> 'LLMResponse':
+        """
+        Load a stored response, validating the parsed part with the response format.
+        """
+
+        parsed = response_format.model_validate(data["parsed"]) if response_format is not None and data["parsed"] is not None else None
+
+        return cls(parsed=parsed, content=data["content"], prompt_tokens=data["prompt_tokens"],
+                   completion_tokens=data["completion_tokens"], cached_tokens=data["cached_tokens"])
+
+
+@functools.lru_cache(maxsize=None)
+def _response_schema(response_format) -> dict | None:
+    return response_format.model_json_schema() if response_format is not None else None
+
+
+def request_key(model: str, messages: list[dict], response_format=None) -> str:
+    """
+    Content-addressed key of a request: a hash of the model, the messages and the response schema.
+    """
+
+    request = json.dumps({"model": model, "messages": messages, "schema": _response_schema(response_format)}, sort_keys=True)
+
+    return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+
+class LLMBackend():
+    """
+    Interface used by agents to talk to a language model.
+    - parse: structured output, parsed into response_format (a pydantic model)
+    - complete: plain text output
+    """
+
+    def parse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+        raise NotImplementedError
+
+    async def aparse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+        return self.parse(model, messages, response_format)
+
+    def complete(self, model: str, messages: list[dict]) -> LLMResponse:
+        raise NotImplementedError
+
+    def cache_stats(self) -> dict | None:
+        """
+        Hit and miss counts of the response cache, if the backend uses one.
+        """
+        return None
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        """
+        Close the async connections, from the event loop that used them.
+        """
+        pass
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Backend using the OpenAI API. The async client is only needed when steps are run concurrently.
+    With a ClientProvider, its shared clients are used and the outcome of every request is reported to it,
+    so it can recycle unhealthy connections.
+    """
+
+    def __init__(self, client: OpenAI | None = None, async_client: AsyncOpenAI | None = None, provider=None):
+
+        self.provider = provider
+
+        self._client = client
+        self._async_client = async_client
+
+    @property
+    def client(self) -> OpenAI:
+        return self.provider.client if self.provider is not None else self._client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        return self.provider.async_client if self.provider is not None else self._async_client
+
+    def _report(self, error: Exception | None = None):
+        """
+        Report the outcome of a request to the provider.
+        """
+
+        if self.provider is None:
+            return
+
+        if error is None:
+            self.provider.report_success()
+        else:
+            self.provider.report_error(error)
+
+    def _response(self, response, parsed: bool = True) -> LLMResponse:
+        """
+        Convert an OpenAI response to an LLMResponse.
+        """
+
+        message = response.choices[0].message
+        details = response.usage.prompt_tokens_details
+
+        return LLMResponse(parsed=message.parsed if parsed else None, content=message.content,
+                           prompt_tokens=response.usage.prompt_tokens,
+                           completion_tokens=response.usage.completion_tokens,
+                           cached_tokens=details.cached_tokens if details else 0)
+
+    def parse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        try:
+            response = self.client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=response_format
+            )
+        except Exception as e:
+            self._report(e)
+            raise
+
+        self._report()
+        return self._response(response)
+
+    async def aparse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        try:
+            response = await self.async_client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                response_format=response_format
+            )
+        except Exception as e:
+            self._report(e)
+            raise
+
+        self._report()
+        return self._response(response)
+
+    def complete(self, model: str, messages: list[dict]) -> LLMResponse:
+
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages
+            )
+        except Exception as e:
+            self._report(e)
+            raise
+
+        self._report()
+        return self._response(response, parsed=False)
+
+    def close(self):
+
+        if self.provider is not None:
+            self.provider.close()
+        elif self._client is not None:
+            self._client.close()
+
+    async def aclose(self):
+
+        if self.provider is not None:
+            await self.provider.aclose()
+        elif self._async_client is not None:
+            await self._async_client.close()
+
+
+class BoundedBackend(LLMBackend):
+    """
+    Limits the number of requests waiting for another backend at the same time with a semaphore,
+    e.g. a multiprocessing.Semaphore shared by all simulations of a sweep.
+    """
+
+    def __init__(self, backend: LLMBackend, semaphore):
+
+        self.backend = backend
+        self.semaphore = semaphore
+
+    def parse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        with self.semaphore:
+            return self.backend.parse(model, messages, response_format)
+
+    async def aparse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        # Wait for the semaphore without blocking the other steps
+        await asyncio.to_thread(self.semaphore.acquire)
+
+        try:
+            return await self.backend.aparse(model, messages, response_format)
+        finally:
+            self.semaphore.release()
+
+    def complete(self, model: str, messages: list[dict]) -> LLMResponse:
+
+        with self.semaphore:
+            return self.backend.complete(model, messages)
+
+    def cache_stats(self) -> dict | None:
+        return self.backend.cache_stats()
+
+    def close(self):
+        self.backend.close()
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+
+class RecordingBackend(LLMBackend):
+    """
+    Passes requests to another backend and stores every response on disk (JSON Lines, one line per response),
+    keyed by request_key, so a run can be replayed with ReplayBackend.
+    The first line holds the seed of the run, as a replay only asks the same requests with the same seed.
+    A new recording replaces an existing file, with append the recording of a resumed run is continued.
+    """
+
+    def __init__(self, backend: LLMBackend, path: str, seed: int | None = None, append: bool = False):
+
+        self.backend = backend
+        self.path = path
+
+        new_recording = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+
+        self.file = open(path, 'w' if new_recording else 'a', buffering=1, encoding='utf-8')
+        if new_recording:
+            self.file.write(json.dumps({"seed": seed}) + "\n")
+
+    def _record(self, key: str, response: LLMResponse):
+        self.file.write(json.dumps({"key": key, "response": response.json()}) + "\n")
+
+    def parse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        response = self.backend.parse(model, messages, response_format)
+        self._record(request_key(model, messages, response_format), response)
+
+        return response
+
+    async def aparse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        response = await self.backend.aparse(model, messages, response_format)
+        self._record(request_key(model, messages, response_format), response)
+
+        return response
+
+    def complete(self, model: str, messages: list[dict]) -> LLMResponse:
+
+        response = self.backend.complete(model, messages)
+        self._record(request_key(model, messages), response)
+
+        return response
+
+    def cache_stats(self) -> dict | None:
+        return self.backend.cache_stats()
+
+    def close(self):
+        self.file.close()
+        self.backend.close()
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+
+class ReplayMissError(Exception):
+    """
+    A request that was not recorded was replayed: the run no longer follows the recording.
+    Unlike other failed requests, this stops the simulation.
+    """
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Serves the responses stored by RecordingBackend from memory, without network.
+    If the same request was recorded several times, the responses are served in the recorded order
+    (the last one is repeated when they run out). Unknown requests raise ReplayMissError.
+    The run has to use the seed of the recorded run, recordings without a seed can't be replayed.
+    """
+
+    def __init__(self, path: str, seed: int | None = None):
+
+        # key -> stored responses
+        self.responses: dict[str, list[dict]] = {}
+
+        # key -> number of times the request was served
+        self.served: dict[str, int] = {}
+
+        recorded_seed = None
+
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+
+                if "key" not in record:
+                    recorded_seed = record["seed"]
+                    continue
+
+                self.responses.setdefault(record["key"], []).append(record["response"])
+
+        if recorded_seed is None:
+            raise Exception(f"Recording {path} has no seed, only runs with a seed can be replayed")
+
+        if recorded_seed != seed:
+            raise Exception(f"Recording {path} was made with seed {recorded_seed}, not {seed}")
+
+    def _replay(self, key: str, response_format=None) -> LLMResponse:
+
+        if key not in self.responses:
+            raise ReplayMissError(f"No recorded response for request {key}")
+
+        i = self.served.get(key, 0)
+        self.served[key] = i + 1
+
+        responses = self.responses[key]
+        return LLMResponse.from_json(responses[min(i, len(responses) - 1)], response_format)
+
+    def parse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+        return self._replay(request_key(model, messages, response_format), response_format)
+
+    def complete(self, model: str, messages: list[dict]) -> LLMResponse:
+        return self._replay(request_key(model, messages))
+
+
+class SyntheticBackend(LLMBackend):
+    """
+    Rule-based stand-in for the language model, for offline runs and profiling.
+    Answers are deterministic for a seed and depend on the persona in the system message:
+    strong partisans post more, users who never talk about politics mostly do nothing.
+    Token counts are estimated as 1 token per 4 characters.
+    """
+
+    def __init__(self, seed: int = 0):
+
+        self.seed = seed
+
+    def _profile(self, persona: str) -> dict:
+        """
+        Chances to repost, post and follow for a persona.
+        """
+
+        if "never talk about politics" in persona:
+            return {"repost": 0.3, "post": 0.1, "follow": 0.3}
+        if re.search(r"You are a strong (Democrat|Republican)", persona):
+            return {"repost": 0.5, "post": 0.4, "follow": 0.7}
+
+        return {"repost": 0.5, "post": 0.25, "follow": 0.5}
+
+    def _usage(self, messages: list[dict]) -> dict:
+        return {"prompt_tokens": sum(len(message["content"]) for message in messages) // 4, "completion_tokens": 20}
+
+    def parse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        persona = messages[0]["content"]
+        message = messages[-1]["content"]
+        profile = self._profile(persona)
+
+        rng = random.Random(f"{self.seed}:{request_key(model, messages, response_format)}")
+        fields = set(response_format.model_fields)
+
+        if fields == {"choice", "explanation"}:
+            choice = "yes" if rng.random() < profile["follow"] else "no"
+            parsed = response_format(choice=choice, explanation="Synthetic decision.")
+
+        else:
+            post_ids = re.findall(r"^Post ID: (\d+)$", message, flags=re.MULTILINE)
+            headlines = re.findall(r"^Title: (.*)$", message, flags=re.MULTILINE)
+            draw = rng.random()
+
+            if post_ids and draw < profile["repost"]:
+                parsed = response_format(option=1, content=rng.choice(post_ids), explanation="Synthetic repost.")
+            elif headlines and draw < profile["repost"] + profile["post"]:
+                parsed = response_format(option=2, content=f"Thoughts on this: {rng.choice(headlines)}", explanation="Synthetic post.")
+            else:
+                parsed = response_format(option=3, content="", explanation="Synthetic pass.")
+
+        return LLMResponse(parsed=parsed, **self._usage(messages))
+
+    def complete(self, model: str, messages: list[dict]) -> LLMResponse:
+        return LLMResponse(content="Just a regular person online.", **self._usage(messages))
+
+
+def as_backend(client) -> LLMBackend | None:
+    """
+    Returns the client as a backend: OpenAI clients are wrapped in an OpenAIBackend.
+    """
+
+    if client is None or isinstance(client, LLMBackend):
+        return client
+    if isinstance(client, AsyncOpenAI):
+        return OpenAIBackend(async_client=client)
+
+    return OpenAIBackend(client=client)
@@ -1,35 +1,135 @@
 import json
-import random
+
+import numpy as np
+
+
+class _TextColumn():
+    """
+    Strings of all news items in one UTF-8 buffer with their offsets, None for missing values.
+    """
+
+    def __init__(self, values: list):
+        encoded = [value.encode('utf-8') if value is not None else b'' for value in values]
+
+        self.buffer = b''.join(encoded)
+        self.offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=self.offsets[1:])
+        self.missing = np.array([value is None for value in values], dtype=bool)
+
+    def __getitem__(self, index: int) -> str | None:
+
+        if self.missing[index]:
+            return None
+
+        return self.buffer[self.offsets[index]:self.offsets[index + 1]].decode('utf-8')
+
+
+class _CategoryColumn():
+    """
+    Categorical values: the distinct values (sorted) and the code of the value of every news item.
+    """
+
+    def __init__(self, values: list):
+        self.categories, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+        self.codes = codes.astype(np.min_scalar_type(max(len(self.categories) - 1, 0)))
+
+    def __getitem__(self, index: int) -> str:
+        return str(self.categories[self.codes[index]])
+
 
 class NewsFeed():
+    """
+    News headlines shown to the users. The dataset is loaded once and stored per field in NumPy arrays
+    (the strings of a field in one UTF-8 buffer, the category as categorical codes), news items are sampled
+    by index with NumPy.
+    """
 
-    def __init__(self, news_dataset_path: str):
+    def __init__(self, news_dataset_path: str, seed: int | None = None):
         self.path = news_dataset_path
+        self.rng = np.random.default_rng(seed)
+
+        news_items = json.load(open(self.path, 'r'))
+        self.size = len(news_items)
+
+        # Field -> values of all news items, in the order the fields first appear
+        keys = list(dict.fromkeys(key for news_item in news_items for key in news_item))
+        self.columns: dict[str, _TextColumn | _CategoryColumn | np.ndarray] = {}
+        for key in keys:
+            values = [news_item.get(key) for news_item in news_items]
+
+            if key == 'category':
+                self.columns[key] = _CategoryColumn(['' if value is None else value for value in values])
+            elif all(value is None or isinstance(value, str) for value in values):
+                self.columns[key] = _TextColumn(values)
+            else:
+                self.columns[key] = np.array(values, dtype=object)
 
-    def get_random_news(self, nr_of_items: int) -> list[dict]:
+        # Prompt fragment of each news item, rendered when the item is first sampled
+        self.prompt_fragments: list[str | None] = [None] * self.size
+
+        # Category -> indices of the news items in that category
+        category = self.columns.get('category') or _CategoryColumn([''] * self.size)
+        order = np.argsort(category.codes, kind='stable')
+        bounds = np.searchsorted(category.codes[order], np.arange(len(category.categories) + 1))
+        self.category_index: dict[str, np.ndarray] = {str(name): order[bounds[i]:bounds[i + 1]] for i, name in enumerate(category.categories)}
+
+    def __len__(self):
+        return self.size
+
+    def _prompt_fragment(self, index: int) -> str:
         """
-        Get a list of news items from the dataset.
+        Returns the part of the action prompt showing the news item (without its ID).
         """
-        
-        news_items = json.load(open(self.path, 'r'))
-        return random.sample(news_items, nr_of_items)
-    
-    def get_random_news_str(self, nr_of_items: int) -> str:
+
+        fragment = self.prompt_fragments[index]
+
+        if fragment is None:
+            fragment = f"""Title: {self.columns['headline'][index]}\nCategory: {self.columns['category'][index]}\nDescription: {self.columns['short_description'][index]}\n\n"""
+            self.prompt_fragments[index] = fragment
+
+        return fragment
+
+    def _news_item(self, index: int) -> dict:
+        """
+        Returns the news item at the given index, with its prompt fragment.
+        """
+
+        news_item = {key: values[index] for key, values in self.columns.items()}
+        news_item['prompt_fragment'] = self._prompt_fragment(index)
+
+        return news_item
+
+    def sample_indices(self, nr_of_items: int, categories: list[str] | None = None) -> np.ndarray:
+        """
+        Sample indices of distinct news items, optionally only from the given categories.
+        """
+
+        if categories is None:
+            return self.rng.choice(self.size, size=nr_of_items, replace=False)
+
+        candidates = np.concatenate([self.category_index.get(category, np.empty(0, dtype=np.int64)) for category in categories])
+
+        if len(candidates) < nr_of_items:
+            raise Exception(f"Only {len(candidates)} news items in categories {categories}")
+
+        return self.rng.choice(candidates, size=nr_of_items, replace=False)
+
+    def get_random_news(self, nr_of_items: int, categories: list[str] | None = None) -> list[dict]:
         """
-        Get a string representation of a list of news items.
+        Get a list of news items from the dataset, optionally only from the given categories.
         """
-        
-        news_items = self.get_random_news(nr_of_items)
+
+        return [self._news_item(index) for index in self.sample_indices(nr_of_items, categories)]
+
+    def get_random_news_str(self, nr_of_items: int, categories: list[str] | None = None) -> str:
+        """
+        Get a string representation of a list of news items, as shown in the action prompt.
+        """
+
         msg = ""
 
-        for i, news_item in enumerate(news_items, start=1):
+        for i, index in enumerate(self.sample_indices(nr_of_items, categories), start=1):
 
-            msg += f"""
-                ID: {i}
-                Title: {news_item['headline']}
-                Category: {news_item['category']}
-                Description: {news_item['short_description']}\n\n
-            """
-        return msg
+            msg += f"ID: {i}\n{self._prompt_fragment(index)}"
 
-    
\ No newline at end of file
+        return msg
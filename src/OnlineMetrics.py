@@ -0,0 +1,240 @@
+import math
+
+from Sampling import FenwickTree
+
+
+class OnlineDistribution():
+    """
+    Distribution of non-negative integer values (e.g. followers per user) that grow by one at a time.
+    Keeps the Gini coefficient and the share of the top values up to date in O(log max value) per change,
+    with Fenwick trees over the number of items (and their sum) per value.
+
+    With the values sorted ascending (0-based rank i), the sum of all pairwise distances is
+    2 * W with W = sum((2i - n + 1) * value_i), so Gini = W / (n * total).
+    """
+
+    def __init__(self):
+
+        # Slot v: number of items with value v, and their sum
+        self.counts = FenwickTree()
+        self.sums = FenwickTree()
+
+        self.n = 0
+        self.total = 0
+        self.weighted = 0
+
+    def _grow(self, value: int):
+
+        while len(self.counts) <= value:
+            self.counts.append(0)
+            self.sums.append(0)
+
+    def add(self, value: int = 0):
+        """
+        Add an item with the given value.
+        """
+
+        self._grow(value)
+
+        # The new item is placed before the items with the same value, the items below move down one
+        # coefficient and the items above move up one
+        rank = self.counts.prefix_sum(value)
+        sum_below = self.sums.prefix_sum(value)
+
+        self.weighted += (self.total - sum_below) - sum_below + (2 * rank - self.n) * value
+
+        self.counts.update(value, self.counts.weights[value] + 1)
+        self.sums.update(value, self.sums.weights[value] + value)
+        self.n += 1
+        self.total += value
+
+    def increment(self, value: int):
+        """
+        Increase the value of an item with the given value by one.
+        """
+
+        self._grow(value + 1)
+
+        # The last item with this value keeps its rank, so the order stays sorted
+        rank = self.counts.prefix_sum(value + 1) - 1
+        self.weighted += 2 * rank - self.n + 1
+
+        self.counts.update(value, self.counts.weights[value] - 1)
+        self.sums.update(value, self.sums.weights[value] - value)
+        self.counts.update(value + 1, self.counts.weights[value + 1] + 1)
+        self.sums.update(value + 1, self.sums.weights[value + 1] + value + 1)
+        self.total += 1
+
+    def gini(self) -> float:
+        """
+        Gini coefficient of the values, 0 if there are no items or all values are 0.
+        """
+
+        if self.n == 0 or self.total == 0:
+            return 0.0
+
+        return self.weighted / (self.n * self.total)
+
+    def top_share(self, fraction: float = 0.1) -> float:
+        """
+        Share of the total held by the top `fraction` of the items (int(n * fraction) items).
+        """
+
+        if self.total == 0:
+            return 0.0
+
+        # The n - k smallest items: all items below slot `value` and the rest at `value`
+        bottom = self.n - int(self.n * fraction)
+        value = self.counts.find(bottom)
+        bottom_sum = self.sums.prefix_sum(value) + (bottom - self.counts.prefix_sum(value)) * value
+
+        return (self.total - bottom_sum) / self.total
+
+
+class OnlineCorrelation():
+    """
+    Pearson correlation of a fixed value per user (x) with a count that grows by one at a time (y),
+    from running sums in O(1) per change.
+    """
+
+    def __init__(self):
+
+        self.n = 0
+        self.sum_x = 0.0
+        self.sum_xx = 0.0
+        self.sum_y = 0
+        self.sum_yy = 0
+        self.sum_xy = 0.0
+
+    def add(self, x: float, y: int = 0):
+
+        self.n += 1
+        self.sum_x += x
+        self.sum_xx += x * x
+        self.sum_y += y
+        self.sum_yy += y * y
+        self.sum_xy += x * y
+
+    def increment(self, x: float, y: int):
+        """
+        Increase the count y of a user with value x by one.
+        """
+
+        self.sum_y += 1
+        self.sum_yy += 2 * y + 1
+        self.sum_xy += x
+
+    def correlation(self) -> float | None:
+        """
+        Returns None if one of the two has no variance.
+        """
+
+        variance_x = self.n * self.sum_xx - self.sum_x ** 2
+        variance_y = self.n * self.sum_yy - self.sum_y ** 2
+
+        if variance_x <= 0 or variance_y <= 0:
+            return None
+
+        return (self.n * self.sum_xy - self.sum_x * self.sum_y) / math.sqrt(variance_x * variance_y)
+
+
+class OnlineMetrics():
+    """
+    Network metrics of the platform, updated on every user, post, repost and link instead of
+    computed from the final state (see analysis/metrics.py for the same metrics after a run):
+    - Gini coefficient and top 10% share of the followers per user and the reposts per post
+    - EI index of the links between users of different parties
+    - correlation of partisanship with followers and with reposts of a user's posts
+    """
+
+    def __init__(self):
+
+        self.followers = OnlineDistribution()
+        self.reposts = OnlineDistribution()
+
+        self.partisan_followers = OnlineCorrelation()
+        self.partisan_reposts = OnlineCorrelation()
+
+        # user_id -> party, absolute partisanship, followers and reposts of all their posts
+        self.party: dict[int, str] = {}
+        self.partisan: dict[int, float] = {}
+        self.user_followers: dict[int, int] = {}
+        self.user_reposts: dict[int, int] = {}
+
+        # post_id -> author and reposts of a raw post
+        self.post_author: dict[int, int] = {}
+        self.post_reposts: dict[int, int] = {}
+
+        self.internal_links = 0
+        self.external_links = 0
+
+    def add_user(self, user_id: int, persona: dict, followers: int = 0):
+
+        self.party[user_id] = persona['party']
+        self.partisan[user_id] = abs(persona['partisan'])
+        self.user_followers[user_id] = followers
+        self.user_reposts[user_id] = 0
+
+        self.followers.add(followers)
+        self.partisan_followers.add(self.partisan[user_id], followers)
+        self.partisan_reposts.add(self.partisan[user_id])
+
+    def add_post(self, post_id: int, author_id: int):
+
+        self.post_author[post_id] = author_id
+        self.post_reposts[post_id] = 0
+
+        self.reposts.add()
+
+    def add_repost(self, post_id: int):
+        """
+        Count a repost of a raw post.
+        """
+
+        author_id = self.post_author[post_id]
+
+        self.reposts.increment(self.post_reposts[post_id])
+        self.post_reposts[post_id] += 1
+
+        self.partisan_reposts.increment(self.partisan[author_id], self.user_reposts[author_id])
+        self.user_reposts[author_id] += 1
+
+    def add_link(self, user_id_from: int, user_id_to: int):
+
+        if self.party[user_id_from] == self.party[user_id_to]:
+            self.internal_links += 1
+        else:
+            self.external_links += 1
+
+        self.followers.increment(self.user_followers[user_id_to])
+        self.partisan_followers.increment(self.partisan[user_id_to], self.user_followers[user_id_to])
+        self.user_followers[user_id_to] += 1
+
+    def EI_index(self) -> float | None:
+        """
+        (external links - internal links) / all links, None without links.
+        """
+
+        links = self.internal_links + self.external_links
+
+        if links == 0:
+            return None
+
+        return (self.external_links - self.internal_links) / links
+
+    def json(self) -> dict:
+        """
+        The current metrics, for logging purposes.
+        """
+        return {
+            "users": self.followers.n,
+            "posts": self.reposts.n,
+            "links": self.internal_links + self.external_links,
+            "gini_coefficient_followers": self.followers.gini(),
+            "gini_coefficient_reposts": self.reposts.gini(),
+            "top_10_percent_followers_percentage": self.followers.top_share(0.1),
+            "top_10_percent_reposts_percentage": self.reposts.top_share(0.1),
+            "EI_index": self.EI_index(),
+            "correlation_followers": self.partisan_followers.correlation(),
+            "correlation_retweets": self.partisan_reposts.correlation()
+        }
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from BridgingScorer import BRIDGING_ATTRIBUTES
+
+
+class PerspectiveStub():
+    """
+    Local stand-in for the Perspective API, to run the bridging_attributes strategy without network.
+    Scores are derived from a hash of the text, so the same text always gets the same scores.
+    Optionally adds latency and fails a fraction of the requests (HTTP 503) to exercise retries.
+
+    Use BridgingScorer(url=stub.url) or set PERSPECTIVE_API_URL to the url of the stub.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0, failure_rate: float = 0.0):
+
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+        # Separate from the random state of a simulation running in the same process
+        self.rng = random.Random()
+
+        self.lock = threading.Lock()
+        self.requests = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests += 1
+                    fail = stub.rng.random() < stub.failure_rate
+
+                if stub.latency > 0:
+                    time.sleep(stub.latency)
+
+                if fail:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+
+                response = json.dumps(stub.analyze(body['comment']['text'])).encode('utf-8')
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1alpha1/comments:analyze"
+
+    def analyze(self, text: str) -> dict:
+        """
+        Returns a response in the format of the Perspective API for the text.
+        """
+
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+
+        return {
+            "attributeScores": {
+                attribute: {"summaryScore": {"value": digest[i] / 255, "type": "PROBABILITY"}}
+                for i, attribute in enumerate(BRIDGING_ATTRIBUTES)
+            },
+            "languages": ["en"]
+        }
+
+    def start(self) -> 'PerspectiveStub':
+        """
+        Serve requests in a background thread.
+        """
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+
+    # python PerspectiveStub.py [port]
+    stub = PerspectiveStub(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    print(f"Perspective stub listening on {stub.url}")
+    stub.server.serve_forever()
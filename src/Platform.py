@@ -1,31 +1,63 @@
+import functools
+from array import array
 from datetime import datetime
 
 from Agent import Agent, Action
+from Store import Entry, MemoryStore, SQLiteStore
+from Timeline import TimelineEngine
+from Sampling import WeightedSampler
+from SnapshotJournal import SnapshotJournal
+from EventLog import EventLog
+from BridgingScorer import BridgingScorer
+from OnlineMetrics import OnlineMetrics
+from RepostIndex import RepostIndex
 import random
-import requests
-import os 
 import numpy as np
 
-from openai import OpenAI
+from LLMBackend import ReplayMissError, as_backend
+from Instrumentation import span
 
 
 class Post():
-    def __init__(self, post_id: int, author: Agent, timestamp: datetime, content: str, show_info: bool = True, calculate_bridging: bool = False):
+
+    __slots__ = ("post_id", "author", "timestamp", "content", "reposts", "reposters", "show_info", "bridging_score",
+                 "rendered", "rendered_version", "__weakref__")
+
+    # Renders and cache hits of __str__ over all posts, see render_stats
+    renders = 0
+    render_hits = 0
+
+    def __init__(self, post_id: int, author: Agent, timestamp: datetime, content: str, show_info: bool = True):
         self.post_id = post_id
         self.author = author
         self.timestamp = timestamp
         self.content = content
         
         self.reposts = 0
-        self.reposters = []
+
+        # Ids of the users who reposted the post, in order
+        # Use Platform.reposts (RepostIndex) to check whether a user reposted the post
+        self.reposters = array('i')
 
         self.show_info = show_info
 
-        if calculate_bridging:
-            self.bridging_score = self._calculate_bridging_score()
+        # Set by the BridgingScorer of the platform (bridging_attributes strategy), None until scored
+        self.bridging_score = None
+
+        # Rendered text, and the repost count and follower count of the author it shows
+        self.rendered = None
+        self.rendered_version = None
 
     def __str__(self):
 
+        # Only rendered again when the numbers it shows have changed
+        version = (self.reposts, self.author.followers) if self.show_info else None
+        if self.rendered is not None and self.rendered_version == version:
+            Post.render_hits += 1
+            return self.rendered
+
+        Post.renders += 1
+
         post_string = f"""Post ID: {self.post_id}"""
 
         if self.show_info:
@@ -36,48 +68,48 @@ Reposts: {self.reposts}"""
         post_string += f"""
 Content: {self.content}"""
 
+        self.rendered = post_string
+        self.rendered_version = version
+
         return post_string
-    
-    def __repr__(self):
-        return f"User {self.author} posted: {self.content}"
-    
-    def _calculate_bridging_score(self, retries: int = 3) -> float:
-
-        if retries > 3:
-            print("Retries exceeded")
-            return 0.0
-
-        body_json = {'comment': {'text': self.content},
-                        'languages': ["en"],
-                        'requestedAttributes': {
-                            'AFFINITY_EXPERIMENTAL':{},
-                    'COMPASSION_EXPERIMENTAL': {},
-                    'CURIOSITY_EXPERIMENTAL': {},
-                    'NUANCE_EXPERIMENTAL': {},
-                    'PERSONAL_STORY_EXPERIMENTAL': {},
-                    'REASONING_EXPERIMENTAL': {},
-                    'RESPECT_EXPERIMENTAL': {}
-                    } }
-        
 
-        try:
-            r = requests.post(f'https://commentanalyzer.googleapis.com/v1alpha1/comments:analyze?key={os.environ.get("PERSPECTIVE_API_KEY")}', json=body_json)
-            perspective_response = r.json()
+    def __getstate__(self):
 
-            attributes = ['AFFINITY_EXPERIMENTAL', 'COMPASSION_EXPERIMENTAL', 'CURIOSITY_EXPERIMENTAL', 'NUANCE_EXPERIMENTAL',
-                        'PERSONAL_STORY_EXPERIMENTAL', 'REASONING_EXPERIMENTAL', 'RESPECT_EXPERIMENTAL']
-            
-            scores = []
-            for attribute in attributes:
-                
-                attribute_score = perspective_response['attributeScores'][attribute]['summaryScore']['value']
-                scores.append(attribute_score)
-        except:
-            print("Error in perspective API call")
-            return self._calculate_bridging_score(retries=retries+1)
+        # The rendered text is not stored with the platform
+        state = {name: getattr(self, name) for name in Post.__slots__ if name != "__weakref__"}
+        state["rendered"] = None
+        state["rendered_version"] = None
+
+        return state
 
-        return sum(scores) / len(scores)
+    def __setstate__(self, state):
 
+        for name, value in state.items():
+            setattr(self, name, value)
+
+        # Posts stored before the reposters were an array
+        if isinstance(self.reposters, list):
+            self.reposters = array('i', self.reposters)
+
+    @classmethod
+    def render_stats(cls) -> dict:
+        """
+        Renders and cache hits of the post texts shown in prompts, for logging purposes.
+        """
+        return {
+            "renders": cls.renders,
+            "hits": cls.render_hits,
+            "hit_rate": cls.render_hits / (cls.renders + cls.render_hits) if cls.renders + cls.render_hits > 0 else 0.0
+        }
+
+    @classmethod
+    def reset_render_stats(cls):
+        cls.renders = 0
+        cls.render_hits = 0
+    
+    def __repr__(self):
+        return f"User {self.author} posted: {self.content}"
+    
     def json(self):
         """
         Return the post as a JSON object for logging purposes.
@@ -88,7 +120,7 @@ Content: {self.content}"""
             "timestamp": self.timestamp,
             "content": self.content,
             "reposts": self.reposts,
-            "reposters": self.reposters
+            "reposters": self.reposters.tolist()
         }
     
     def count_repost(self, reposter_id: int):
@@ -98,35 +130,37 @@ Content: {self.content}"""
         self.reposters.append(reposter_id)
         self.reposts += 1
 
-    def reposted_by(self, reposter_id: int):
-        """
-        Returns True if the post has been reposted by the user, else False.
-        """
-        return reposter_id in self.reposters
-
 class Platform():
 
     def __init__(self, user_link_strategy: str = "on_repost", timeline_select_strategy: str = "random",
-                 show_info: bool = True):
+                 show_info: bool = True, snapshot_keyframe_interval: int = 1000, metrics_interval: int = 100,
+                 database: str | None = None, rebuild_database: bool = False):
         
-        # All users on the platform
-        self.users: list[Agent] = []
-
-        # Of the form {"user_id": int, "post_id": int, "post_content": Post}
-        # All posts, including reposts
-        self.posts: list[dict] = []
-
-        # Only posts written by users
-        self.raw_posts: list[Post] = []
+        # Indexed storage for users, posts (including reposts), raw posts, user links and actions
+        # In memory, or in a SQLite database at the given path to keep posts, links and prompts out of memory
+        # (the database has to be empty, unless rebuild_database is set when the platform is rebuilt from a log)
+        if database:
+            self.store = SQLiteStore(database, rebuild=rebuild_database, new_post=functools.partial(Post, show_info=show_info))
+        else:
+            self.store = MemoryStore()
+        self.database = database
 
-        # Of the form (user_id_link_from, user_id_link_to)
-        self.user_links: list[(int, int)] = []
+        # Candidate pools for timelines, updated on every post, repost and link
+        # (the excluded entries are only needed to sample from all candidates, with the random strategy)
+        self.timeline = TimelineEngine(self.store, track_excluded=timeline_select_strategy == 'random')
 
-        # Register all actions on the platform
-        self.actions: list[dict] = []
+        # Which users reposted which posts
+        self.reposts = RepostIndex()
 
         # Keep track of network after each iteration for analysis
-        self.network_snapshots = []
+        # Only changes are stored, with a full keyframe every snapshot_keyframe_interval steps
+        self.snapshots = SnapshotJournal(keyframe_interval=snapshot_keyframe_interval, deltas=self.store.snapshot_deltas,
+                                         keyframes=self.store.snapshot_keyframes)
+
+        # Network metrics updated on every event, logged every metrics_interval steps (0 to not log them)
+        self.metrics = OnlineMetrics()
+        self.metrics_interval = metrics_interval
+        self.metrics_series: list[dict] = self.store.metrics_series
 
         # User link strategy: when to link users
         # on_repost: link users when one user reposts another user's post
@@ -144,13 +178,151 @@ class Platform():
 
         self.show_info = show_info
 
-    def set_client(self, client: OpenAI | None):
+        # Optional log to which all events are streamed while the simulation runs
+        self.event_log: EventLog | None = None
+
+        # LLM backend used by all users
+        self.llm_backend = None
+
+        # Scores posts in the background for the bridging_attributes strategy
+        self.bridging_scorer: BridgingScorer | None = None
+
+    @property
+    def users(self) -> list[Agent]:
+        """
+        All users on the platform.
+        """
+        return self.store.users
+
+    @property
+    def posts(self) -> list[Entry]:
+        """
+        All posts, including reposts.
+        Entries with the keys of {"user_id": int, "post_id": int, "time": datetime, "post_content": Post}
+        """
+        return self.store.posts
+
+    @property
+    def raw_posts(self) -> list[Post]:
+        """
+        Only posts written by users.
+        """
+        return self.store.raw_posts
+
+    @property
+    def user_links(self) -> list[tuple[int, int]]:
+        """
+        All links of the form (user_id_link_from, user_id_link_to).
         """
-        Set the client for the platform.
+        return self.store.user_links
+
+    @property
+    def actions(self) -> list[dict]:
+        """
+        All actions on the platform.
+        """
+        return self.store.actions
+
+    @property
+    def network_snapshots(self) -> list[dict]:
+        """
+        Snapshots of the network after each iteration, reconstructed from the snapshot journal.
+        Use self.snapshots.snapshot_at(step) to get a single step.
+        """
+        return list(self.snapshots.export())
+
+    def set_client(self, client):
+        """
+        Set the LLM backend (or OpenAI client) for all users.
         Default will be OpenAI's GPT-4o-mini for this project.
         """
+        backend = as_backend(client)
+        self.llm_backend = backend
+
         for user in self.users:
-            user.llm = client
+            user.set_client(backend)
+
+    def set_bridging_scorer(self, scorer: BridgingScorer | None):
+        """
+        Set the scorer for the bridging scores of new posts (or stop scoring with None).
+        Posts that are not scored yet (e.g. after a resume) are submitted to the new scorer with the step they were posted in.
+        """
+
+        self.bridging_scorer = scorer
+
+        if scorer is None:
+            return
+
+        unscored = [post for post in self.raw_posts if post.bridging_score is None]
+        if not unscored:
+            return
+
+        # Posts after the last recorded step are from the current step
+        # The unscored posts are recent, so the deltas are searched from the last step
+        post_steps = {}
+        unscored_ids = {post.post_id for post in unscored}
+        for step, delta in zip(range(len(self.snapshots) - 1, -1, -1), reversed(self.snapshots.deltas)):
+            if unscored_ids.issubset(post_steps):
+                break
+            for post_id, _ in delta.get('posts', []):
+                post_steps[post_id] = step
+
+        for post in unscored:
+            scorer.submit(post, post_steps.get(post.post_id, len(self.snapshots)))
+
+    def apply_bridging_scores(self):
+        """
+        Set the bridging scores that are due in the current step on their posts.
+        """
+
+        if self.bridging_scorer is not None:
+            self.bridging_scorer.apply(len(self.snapshots), on_score=self._log_bridging_score)
+
+    def close_bridging_scorer(self, timeout: float = 60.0):
+        """
+        Wait for the scores of all posts (up to timeout seconds) and stop the scorer.
+        """
+
+        if self.bridging_scorer is None:
+            return
+
+        self.bridging_scorer.flush(on_score=self._log_bridging_score, timeout=timeout)
+        self.bridging_scorer.close()
+        print(f"Bridging scores: {self.bridging_scorer.stats()}")
+
+        self.bridging_scorer = None
+
+    def _log_bridging_score(self, post: Post):
+        self.store.update_post(post)
+        self.log_event("bridging_score", post_id=post.post_id, score=post.bridging_score, step=len(self.snapshots))
+
+    def set_event_log(self, event_log: EventLog | None, write_header: bool = True):
+        """
+        Stream all events on the platform to the given log (or stop streaming with None).
+        The settings of the platform and the users registered so far are written first,
+        unless write_header is False (when continuing a log after a resume).
+        """
+
+        self.event_log = event_log
+
+        if event_log is None or not write_header:
+            return
+
+        self.log_event("platform", user_link_strategy=self.user_link_strategy,
+                       timeline_select_strategy=self.timeline_select_strategy, show_info=self.show_info,
+                       snapshot_keyframe_interval=self.snapshots.keyframe_interval, metrics_interval=self.metrics_interval,
+                       database=self.database)
+
+        for user in self.users:
+            self.log_event("user", user=user.json(include_persona=True))
+
+    def log_event(self, event: str, **data):
+        """
+        Write an event to the event log, if there is one.
+        """
+
+        if self.event_log is not None:
+            self.event_log.write(event, **data)
 
     def sample_user(self) -> Agent:
         """
@@ -162,10 +334,23 @@ class Platform():
     def add_snapshot(self):
         """
         Create a snapshot of the network after each simulation step for analysis.
+        Only the changes since the previous step are recorded in the snapshot journal.
         """
-        self.network_snapshots.append({'users': [user.json(include_persona=False) for user in self.users], 
-                                       'connections': [link for link in self.user_links],
-                                       'posts_reposts': {post.post_id: post.reposts for post in self.raw_posts}})
+        delta = self.snapshots.record(self.users, self.user_links, self.raw_posts)
+        step = len(self.snapshots) - 1
+        self.log_event("step", step=step, delta=delta)
+
+        if self.metrics_interval and step % self.metrics_interval == 0:
+            self.add_metrics(step)
+
+    def add_metrics(self, step: int):
+        """
+        Add the current network metrics to the metrics time series.
+        """
+
+        metrics = {"step": step, **self.metrics.json()}
+        self.metrics_series.append(metrics)
+        self.log_event("metrics", **metrics)
     
     def generate_posts_json(self):
         """
@@ -192,9 +377,11 @@ class Platform():
 
         return [user.json(include_persona=True) for user in self.users]
     
-    def generate_log(self):
+    def generate_log(self, include_network_snapshots: bool = False):
         """
         Generate a log (JSON) of the platform for analysis.
+        The network snapshots are stored as a compact journal, set include_network_snapshots to also
+        add the full snapshot of every step (or use SnapshotJournal.expand_network_snapshots on the log).
         """
 
         total_input_tokens = sum([user.used_tokens_input for user in self.users])
@@ -205,7 +392,7 @@ class Platform():
                             ((0.15 / 1000000) * (total_input_tokens - total_cached_tokens) + \
                             ((0.075 / 1000000) * total_cached_tokens))
 
-        return {
+        log = {
             "total_tokens_input": total_input_tokens,
             "total_tokens_output": total_output_tokens,
             "total_tokens_cached": total_cached_tokens,
@@ -213,41 +400,48 @@ class Platform():
             "users": self.generate_users_json(),
             "posts": self.generate_posts_json(),
             "raw_posts": [post.json() for post in self.raw_posts],
-            "user_links": self.user_links,
-            "actions": self.actions,
-            "network_snapshots": self.network_snapshots
+            "user_links": list(self.user_links),
+            "actions": list(self.actions),
+            "snapshot_journal": self.snapshots.json(),
+            "metrics": list(self.metrics_series)
         }
 
+        # Hits and misses of the response cache, if one is used
+        cache_stats = self.llm_backend.cache_stats() if self.llm_backend is not None else None
+        if cache_stats is not None:
+            log["llm_cache"] = cache_stats
+
+        if include_network_snapshots:
+            log["network_snapshots"] = self.network_snapshots
+
+        return log
+
     def register_user(self, agent: Agent):
         """
         Add a user to the platform.
         """
 
         agent.identifier = len(self.users)+1
-        self.users.append(agent)
-
-        agent.llm = OpenAI()
+        self.store.add_user(agent)
+        self.timeline.add_user(agent.identifier)
+        self.snapshots.touch_user(agent)
+        self.metrics.add_user(agent.identifier, agent.persona, agent.followers)
+        self.log_event("user", user=agent.json(include_persona=True))
 
     def get_user(self, user_id: int) -> Agent:
         """
         Returns the user with the given user_id.
         Returns None if the user is not found.
         """
-        for user in self.users:
-            if user.identifier == user_id:
-                return user
-        return None
+        return self.store.get_user(user_id)
     
     def get_post(self, post_id: int) -> Post:
         """
         Returns the post with the given post_id.
         Returns None if the post is not found.
         """
-        for post in self.posts:
-            if post["post_id"] == post_id:
-                return post["post_content"]
-
-        return None
+        post = self.store.get_post(post_id)
+        return post["post_content"] if post else None
 
     def link_users(self, user_link_from: Agent, user_link_to: Agent):
         """
@@ -263,14 +457,18 @@ class Platform():
             return
 
         # Register link and increase follower count
-        self.user_links.append((user_link_from.identifier, user_link_to.identifier))
+        self.store.add_link(user_link_from.identifier, user_link_to.identifier)
+        self.timeline.add_link(user_link_from.identifier, user_link_to.identifier)
         user_link_to.increase_followers()
+        self.snapshots.touch_user(user_link_to)
+        self.metrics.add_link(user_link_from.identifier, user_link_to.identifier)
+        self.log_event("link", user_id_from=user_link_from.identifier, user_id_to=user_link_to.identifier)
 
     def has_link(self, user_id_1: int, user_id_2: int) -> bool:
         """
         Returns True if the users are linked on the platform (user_id_1 follows user_id_2), else False.
         """
-        return (user_id_1, user_id_2) in self.user_links
+        return self.store.has_link(user_id_1, user_id_2)
 
     def get_follower_count(self, user_id: int) -> int:
         """
@@ -285,33 +483,35 @@ class Platform():
         Return a list of all posts by the user.
         """
 
-        return [post for post in self.posts if post["user_id"] == user_id]
+        return self.store.get_posts_of_user(user_id)
     
     def pick_posts(self, posts, weights, size):
         """
-        Pick posts based on weights.
+        Pick posts based on weights, without replacement.
+        Every draw takes O(log n) on a Fenwick tree instead of rebuilding the list of remaining posts.
         """
 
+        sampler = WeightedSampler(weights)
+
+        # Indices of all items showing the same post
+        same_post = {}
+        for i, post in enumerate(posts):
+            same_post.setdefault(post['post_content'].post_id, []).append(i)
+
         picked_posts = []
-        posts_left = posts
 
         for _ in range(size):
 
-            if len(posts_left) == 0:
+            if sampler.total() == 0:
                 break
 
-            post = random.choices(posts_left, weights=weights)[0]
+            post = posts[sampler.sample()]
             picked_posts.append(post)
-            
-            # Remove posts if already picked
-            for i in range(len(posts_left)-1, -1, -1):
-                if posts_left[i]['post_content'].post_id == post['post_content'].post_id:
-                    
-                    del weights[i]
 
-            posts_left = [p for p in posts_left if p['post_content'].post_id != post['post_content'].post_id]
+            # Remove posts if already picked
+            for i in same_post[post['post_content'].post_id]:
+                sampler.update(i, 0)
 
-            
         return picked_posts
 
 
@@ -324,40 +524,22 @@ class Platform():
         - random_weighted: randomly select posts with weights based on reposts and followers
         """
 
-        # Get the id's of the users linked to the user
-        linked_users = [link[1] for link in self.user_links if link[0] == user_id]
-
-        # Get all posts of linked users
-        posts_following = [post['post_content'].post_id for post in self.posts if post["user_id"] in linked_users and not post["post_content"].reposted_by(user_id)
-                    and not post['post_content'].author.identifier == user_id]
-        
-        random_part = [post for post in self.posts if post['post_content'].post_id not in posts_following
-                        and not post['post_content'].author.identifier == user_id and not post['post_content'].reposted_by(user_id)]
+        # Candidates are posts not written or reposted by the user, and not shared by the users they follow
+        # The timeline engine keeps these pools up to date, so only the needed part is collected
+        if self.timeline_select_strategy == 'random':
+            return self.timeline.sample_candidates(user_id, size)
+        elif self.timeline_select_strategy == 'chronological':
+            random_part = self.timeline.latest_candidate_posts(user_id, 5)
+        else:
+            # Distinct posts among the recent 50 posts
+            random_part = self.timeline.recent_distinct_candidates(user_id, 50)
 
         # TODO: use raw_posts or posts????
-        if self.timeline_select_strategy == 'random':
-            
-            
-            random_part = self.pick_posts(random_part, [1 for _ in random_part], min(size, len(random_part)))
-            # random_part = random.sample(random_part, min(size, len(random_part)))
-            return random_part
-        elif self.timeline_select_strategy == 'random_weighted':
-            
-            # Recent 50 posts
-            random_part = random_part[-50:]
+        if self.timeline_select_strategy == 'random_weighted':
             
             if len(random_part) == 0:
                 return []
             
-            # Only keep distinct posts based on post['post_content'].post_id
-            seen = set()
-            result = []
-            for post in random_part:
-                if post['post_content'].post_id not in seen:
-                    seen.add(post['post_content'].post_id)
-                    result.append(post)
-            random_part = result
-            
             # Posts with more reposts are more likely to be recommended
             total_score = sum([post['post_content'].reposts + 1 for post in random_part])
             if total_score == 0:
@@ -372,21 +554,9 @@ class Platform():
             return random_part
         elif self.timeline_select_strategy == 'random_weighted_reversed':
             
-            # Recent 50 posts
-            random_part = random_part[-50:]
-            
             if len(random_part) == 0:
                 return []
             
-            # Only keep distinct posts based on post['post_content'].post_id
-            seen = set()
-            result = []
-            for post in random_part:
-                if post['post_content'].post_id not in seen:
-                    seen.add(post['post_content'].post_id)
-                    result.append(post)
-            random_part = result
-            
             # Posts with less reposts are more likely to be recommended
             total_score = sum([post['post_content'].reposts for post in random_part])
             if total_score == 0:
@@ -399,23 +569,12 @@ class Platform():
         
         elif self.timeline_select_strategy == 'bridging_attributes':
             
-            # Recent 50 posts
-            # random_part.sort(key=lambda x: x["time"], reverse=True)
-            random_part = random_part[-50:]
-            
             if len(random_part) == 0:
                 return []
-            
-            # Only keep distinct posts based on post['post_content'].post_id
-            seen = set()
-            result = []
-            for post in random_part:
-                if post['post_content'].post_id not in seen:
-                    seen.add(post['post_content'].post_id)
-                    result.append(post)
-            random_part = result
 
-            random_part.sort(key=lambda post: post['post_content'].bridging_score, reverse=True)
+            # Posts that are not scored yet are ranked with the fallback score
+            fallback_score = self.bridging_scorer.fallback_score if self.bridging_scorer is not None else 0.0
+            random_part.sort(key=lambda post: post['post_content'].bridging_score if post['post_content'].bridging_score is not None else fallback_score, reverse=True)
             return random_part[:5]
         elif self.timeline_select_strategy == 'chronological':
             
@@ -437,20 +596,8 @@ class Platform():
         
         elif self.timeline_select_strategy == 'other_partisan':
             
-            # Recent 50 posts
-            random_part = random_part[-50:]
-            
             if len(random_part) == 0:
                 return []
-            
-            # Only keep distinct posts based on post['post_content'].post_id
-            seen = set()
-            result = []
-            for post in random_part:
-                if post['post_content'].post_id not in seen:
-                    seen.add(post['post_content'].post_id)
-                    result.append(post)
-            random_part = result
 
             k = 3
 
@@ -474,13 +621,12 @@ class Platform():
         - 5 posts from the platform recommended by the platform (with a strategy set in self.timeline_select_strategy)
         """
 
-        # Get the id's of the users linked to the user
-        linked_users = [link[1] for link in self.user_links if link[0] == user_id]
+        # Scores of the bridging_attributes strategy are set at the start of a step, before any timeline is built
+        self.apply_bridging_scores()
 
         # Only show posts and reposts by linked users
         # Exclude posts that are already reposted by the user
-        following_part = [post for post in self.posts if post["user_id"] in linked_users and not post["post_content"].reposted_by(user_id)
-                    and not post['post_content'].author.identifier == user_id]
+        following_part = self.timeline.following_part(user_id, 5)
 
         # Sort timelime by time
         # following_part.sort(key=lambda x: x["time"], reverse=True)
@@ -497,78 +643,160 @@ class Platform():
         """
 
         timestamp = datetime.now()
-        post = Post(len(self.posts)+1, user, timestamp, content, show_info=self.show_info, calculate_bridging=self.timeline_select_strategy=='bridging_attributes')
+        post = Post(len(self.posts)+1, user, timestamp, content, show_info=self.show_info)
 
-        self.raw_posts.append(post)
+        # Scored in the background, the score is set a fixed number of steps later
+        if self.bridging_scorer is not None:
+            self.bridging_scorer.submit(post, len(self.snapshots))
 
-        self.posts.append({
-            "post_id": post.post_id,
-            "user_id": user.identifier,
-            "time": timestamp,
-            "post_content": post
-        })
+        self._add_post(user, post)
+
+    def _add_post(self, user: Agent, post: Post):
+        """
+        Add a new post to the platform.
+        """
+
+        self.store.add_raw_post(post)
+        self.timeline.hide_post(user.identifier, post.post_id)
+        self.metrics.add_post(post.post_id, user.identifier)
+
+        entry = Entry(post.post_id, user.identifier, post.timestamp, post)
+
+        self.store.add_post(entry)
+        self.timeline.add_entry(entry)
+
+        self.log_event("post", post_id=post.post_id, user_id=user.identifier, time=post.timestamp, content=post.content,
+                       bridging_score=getattr(post, 'bridging_score', None))
 
     def repost(self, user: Agent, post_id: int):
         """
         User reposts a message.
         """
 
+        timestamp, post = self._register_repost(user, post_id)
+
+        if self.user_link_strategy == "on_repost":
+            self.link_users(user, post.author)
+        else:
+            with span("link_with_user"):
+                should_link, explanation = user.link_with_user(**self._link_request(post))
+            self._handle_link_decision(user, post, should_link, explanation)
+
+        self._add_repost(user, post, timestamp)
+
+    async def arepost(self, user: Agent, post_id: int):
+        """
+        Async version of repost: the decision to follow the author is awaited without blocking other steps.
+        """
+
+        timestamp, post = self._register_repost(user, post_id)
+
+        if self.user_link_strategy == "on_repost":
+            self.link_users(user, post.author)
+        else:
+            with span("link_with_user"):
+                should_link, explanation, response = await user.alink_with_user(**self._link_request(post))
+            user.count_tokens(response)
+            self._handle_link_decision(user, post, should_link, explanation)
+
+        self._add_repost(user, post, timestamp)
+
+    def _register_repost(self, user: Agent, post_id: int) -> tuple[datetime, Post]:
+        """
+        Check if the user can repost the post and count the repost.
+        """
+
         timestamp = datetime.now()
         post = self.get_post(post_id)
 
         if post.author.identifier == user.identifier:
             raise Exception(f"User {user.identifier} tries to repost its own post {post_id}!")
 
-        if post.reposted_by(user.identifier):
+        if self.reposts.reposted_by(user.identifier, post.post_id):
             raise Exception(f"User {user.identifier} has already reposted post {post_id}!")
 
+        self._count_repost(user, post)
+
+        return timestamp, post
+
+    def _count_repost(self, user: Agent, post: Post):
+        """
+        Count the repost of the post by the user and hide the post from their timeline.
+        """
+
         post.count_repost(user.identifier)
+        self.store.update_post(post)
+        self.reposts.add(user.identifier, post.post_id)
+        self.timeline.hide_post(user.identifier, post.post_id)
+        self.snapshots.touch_post(post)
+        self.metrics.add_repost(post.post_id)
 
-        if self.user_link_strategy == "on_repost":
-            self.link_users(user, post.author)
-        elif self.user_link_strategy == "on_repost_bio":
+    def _link_request(self, post: Post) -> dict:
+        """
+        Arguments for Agent.link_with_user to ask a user who reposted the post to follow its author.
+        on_repost_bio: show the bio (and follower count if show_info), on_repost_posts: only show the posts.
+        """
+
+        if self.user_link_strategy == "on_repost_bio":
             print("Getting user's last posts")
             user_last_posts = self.get_posts_of_user(post.author.identifier)
             print("Asking user to link based on bio")
-            should_link, explanation = user.link_with_user(post.author, post.content, user_last_posts, use_bio=True, use_follower_count=self.show_info)
-            if should_link:
-                self.link_users(user, post.author)
-                print(f"User {user.identifier} linked to user {post.author.identifier}")
-                print(f"Explanation: {explanation}")
-            else:
-                print(f"User {user.identifier} chose not to link to user {post.author.identifier}")
-                print(f"Explanation: {explanation}")
-        elif self.user_link_strategy == "on_repost_posts":
+            return {"other_agent": post.author, "post_content": post.content, "other_agent_posts": user_last_posts,
+                    "use_bio": True, "use_follower_count": self.show_info}
 
-            user_last_posts = self.get_posts_of_user(post.author.identifier)
-            should_link, explanation = user.link_with_user(post.author, post.content, user_last_posts, use_bio=False)
-            if should_link:
-                self.link_users(user, post.author)
-                print(f"User {user.identifier} linked to user {post.author.identifier}")
-                print(f"Explanation: {explanation}")
-            else:
-                print(f"User {user.identifier} chose not to link to user {post.author.identifier}")
-                print(f"Explanation: {explanation}")
+        user_last_posts = self.get_posts_of_user(post.author.identifier)
+        return {"other_agent": post.author, "post_content": post.content, "other_agent_posts": user_last_posts,
+                "use_bio": False}
 
-        self.posts.append({
-            "post_id": len(self.posts)+1,
-            "user_id": user.identifier,
-            "time": timestamp,
-            "post_content": post
-        })
+    def _handle_link_decision(self, user: Agent, post: Post, should_link: bool, explanation: str):
+        """
+        Link the user to the author of the reposted post if they decided to follow them.
+        """
+
+        self.log_event("link_decision", user_id_from=user.identifier, user_id_to=post.author.identifier, choice=should_link, explanation=explanation)
+
+        if should_link:
+            self.link_users(user, post.author)
+            print(f"User {user.identifier} linked to user {post.author.identifier}")
+            print(f"Explanation: {explanation}")
+        else:
+            print(f"User {user.identifier} chose not to link to user {post.author.identifier}")
+            print(f"Explanation: {explanation}")
+
+    def _add_repost(self, user: Agent, post: Post, timestamp: datetime):
+        """
+        Add the repost to the platform.
+        """
+
+        entry = Entry(len(self.posts)+1, user.identifier, timestamp, post)
+
+        self.store.add_post(entry)
+        self.timeline.add_entry(entry)
+
+        self.log_event("repost", post_id=entry["post_id"], user_id=user.identifier, time=timestamp, original_post_id=post.post_id)
 
     def add_action(self, user_id: int, action: Action, success: bool, prompt: str):
         """
         Adds action to the platform for logging purposes.
+        The prompt is the user message of the call (see Agent.perform_action), without the system message.
         """
-        self.actions.append({
+        action_json = {
             "user_id": user_id,
             "action": action.option,
             "content": action.content,
             'success': success,
             # 'explanation': action.explanation,
             "prompt": prompt
-        })
+        }
+
+        self.store.add_action(action_json)
+        self.log_event("action", **action_json)
+
+        # Tokens used by the user so far, including the ones for this action
+        user = self.get_user(user_id)
+        if user is not None:
+            self.log_event("usage", user_id=user_id, used_tokens_input=user.used_tokens_input,
+                           used_tokens_output=user.used_tokens_output, used_tokens_cached=user.used_tokens_cached)
 
     def parse_and_do_action(self, user_id: int, action: Action, prompt: str) -> None:
         """
@@ -581,6 +809,9 @@ class Platform():
             print("User not found")
             self.add_action(user_id, action, False, prompt)
             return
+
+        # Tokens used by the user for this action
+        self.snapshots.touch_user(agent)
         
         if action.option == 2:
             self.post(agent, action.content)
@@ -588,6 +819,8 @@ class Platform():
 
             try:
                 self.repost(agent, int(action.content))
+            except ReplayMissError:
+                raise
             except Exception as e:
                 print("Invalid post ID: ", e)
                 self.add_action(user_id, action, False, prompt)
@@ -600,3 +833,83 @@ class Platform():
 
         self.add_action(user_id, action, True, prompt)
 
+    async def aparse_and_do_action(self, user_id: int, action: Action, prompt: str) -> None:
+        """
+        Async version of parse_and_do_action: a repost awaits the decision to follow the author.
+        """
+
+        agent = self.get_user(user_id)
+
+        if not agent or action.option != 1:
+            self.parse_and_do_action(user_id, action, prompt)
+            return
+
+        # Tokens used by the user for this action
+        self.snapshots.touch_user(agent)
+
+        try:
+            await self.arepost(agent, int(action.content))
+        except ReplayMissError:
+            raise
+        except Exception as e:
+            print("Invalid post ID: ", e)
+            self.add_action(user_id, action, False, prompt)
+            return
+
+        self.add_action(user_id, action, True, prompt)
+
+    def replay_event(self, event: dict, model: str):
+        """
+        Apply an event read from an event log (see EventLog) to the platform, without asking the LLM.
+        Used to restore the platform when a simulation is resumed from a checkpoint.
+        """
+
+        event_type = event["event"]
+
+        if event_type == "user":
+            agent = Agent(model, event["user"]["persona"])
+            self.register_user(agent)
+
+            agent.followers = event["user"]["followers"]
+            agent.used_tokens_input = event["user"]["used_tokens_input"]
+            agent.used_tokens_output = event["user"]["used_tokens_output"]
+            agent.used_tokens_cached = event["user"]["used_tokens_cached"]
+
+        elif event_type == "post":
+            user = self.get_user(event["user_id"])
+            post = Post(event["post_id"], user, datetime.fromisoformat(event["time"]), event["content"], show_info=self.show_info)
+
+            if event["bridging_score"] is not None:
+                post.bridging_score = event["bridging_score"]
+
+            self._add_post(user, post)
+
+        elif event_type == "repost":
+            user = self.get_user(event["user_id"])
+            post = self.get_post(event["original_post_id"])
+
+            self._count_repost(user, post)
+            self._add_repost(user, post, datetime.fromisoformat(event["time"]))
+
+        elif event_type == "link":
+            self.link_users(self.get_user(event["user_id_from"]), self.get_user(event["user_id_to"]))
+
+        elif event_type == "action":
+            self.store.add_action({key: value for key, value in event.items() if key != "event"})
+
+        elif event_type == "usage":
+            user = self.get_user(event["user_id"])
+            user.used_tokens_input = event["used_tokens_input"]
+            user.used_tokens_output = event["used_tokens_output"]
+            user.used_tokens_cached = event["used_tokens_cached"]
+
+        elif event_type == "bridging_score":
+            post = self.get_post(event["post_id"])
+            post.bridging_score = event["score"]
+            self.store.update_post(post)
+
+        elif event_type == "step":
+            self.snapshots.restore_step(event["delta"], self.user_links, self.raw_posts)
+
+        elif event_type == "metrics":
+            self.metrics_series.append({key: value for key, value in event.items() if key != "event"})
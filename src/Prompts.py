@@ -0,0 +1,102 @@
+from functools import lru_cache
+
+# Prompts are laid out for prefix caching by the provider: the system message starts with the instructions
+# of the call type (the same for all users), followed by the persona (the same for every call of a user).
+# Only the user message changes between calls (timeline, news, profile of another user).
+
+INTRODUCTION = """You are a user of the X social media platform.
+This is a platform where users share opinions and thoughts on topics of interest in the form of posts.
+Your main goal is to repost others' posts and you are also able to share your own posts."""
+
+ACTION_INSTRUCTIONS = """You are presented with the following options. You have to choose exactly one option based on your persona.
+1. Choose exactly one of the posts from the timeline to repost on your social media feed that relates to your persona. [You can't repost if there are no posts on the timeline. Only write down the message ID as content!]
+2. Choose exactly one of the headlines to share on your social media feed based on your persona, and write a comment of 10-50 words about that one headline in the style of your personality. [Write only the message you want to share as content. Don't repeat the title of the headline, but introduce the topic briefly. You may choose news you agree or do not agree with and share this vision. Do not use quotation marks. Do not introduce yourself. Use informal language. You may write a positive message, but you may also use sarcasm or irony, swear, criticize, threat, lie, and engage in personal attacks. You can also bring up a related topic that the post made you think of. Do not start your message by describing your persona. Don't use hashtags.]
+3. Do nothing. [You can choose this option if you don't feel like sharing anything at the moment, or if you want to observe the platform for a while.]
+Also provide an explanation of one sentence about your choice.
+Reply in JSON format."""
+
+LINK_INSTRUCTIONS = """Based on your beliefs, interests and personality, would you like to follow this user?
+Reply with 'yes' or 'no'. Also provide a short explanation for your choice."""
+
+# The bio prompt shows the persona between its instructions and its guidelines
+BIO_INSTRUCTIONS = "Write a very short (max. 140 characters), very informal social media biography for the following persona:"
+BIO_GUIDELINES = "You may add things that are not in the persona. Do not use emoji. Write as if you are the person described."
+
+PERSONA_HEADER = "Here is a description of your persona:"
+
+
+@lru_cache(maxsize=4096)
+def system_message(instructions: str, persona: str) -> str:
+    """
+    The system message for a call type (its instructions) and a persona, built once per user and call type.
+    """
+    return f"{INTRODUCTION}\n\n{instructions}\n\n{PERSONA_HEADER}\n{persona}"
+
+
+def action_message(news_data: list, timeline: list) -> str:
+    """
+    The volatile part of the action prompt: the timeline and the news headlines.
+    """
+
+    parts = ["Here are the messages on the timeline for option 1:\n"]
+
+    for post in timeline:
+        parts.append(str(post['post_content']))
+        parts.append("\n\n")
+
+    parts.append("Here are the news headlines for option 2:\n")
+
+    for i, news_item in enumerate(news_data, start=1):
+
+        # News items from NewsFeed come with the rest of their text already rendered
+        if 'prompt_fragment' in news_item:
+            parts.append(f"ID: {i}\n{news_item['prompt_fragment']}")
+        else:
+            parts.append(f"ID: {i}\nTitle: {news_item['headline']}\nCategory: {news_item['category']}\nDescription: {news_item['short_description']}\n\n")
+
+    return "".join(parts)
+
+
+def link_message(other_agent, post_content: str, other_agent_posts: list, use_bio: bool = False,
+                 use_follower_count: bool = True) -> str:
+    """
+    The volatile part of the prompt asking a user to follow another user: the reposted post and the profile.
+    """
+
+    parts = [f"You reposted this post:\n{post_content}\n\nYou view the profile of the poster.\nUser ID: {other_agent.identifier}\n"]
+
+    if use_follower_count:
+        parts.append(f"Followers: {other_agent.followers}\n")
+
+    if use_bio:
+        parts.append(f"Bio: {other_agent.persona['biography']}\n")
+
+    parts.append("\nYou also see that the user has recently posted or reposted the following messages:\n\n")
+
+    for post in other_agent_posts[:5]:
+        parts.append(str(post['post_content']))
+        parts.append("\n\n")
+
+    return "".join(parts)
+
+
+def action_messages(persona: str, news_data: list, timeline: list) -> list[dict]:
+    return [
+        {"role": "system", "content": system_message(ACTION_INSTRUCTIONS, persona)},
+        {"role": "user", "content": action_message(news_data, timeline)}
+    ]
+
+
+def link_messages(persona: str, other_agent, post_content: str, other_agent_posts: list, use_bio: bool = False,
+                  use_follower_count: bool = True) -> list[dict]:
+    return [
+        {"role": "system", "content": system_message(LINK_INSTRUCTIONS, persona)},
+        {"role": "user", "content": link_message(other_agent, post_content, other_agent_posts, use_bio=use_bio,
+                                                 use_follower_count=use_follower_count)}
+    ]
+
+
+def bio_messages(persona: str) -> list[dict]:
+    return [
+        {"role": "system", "content": f"{BIO_INSTRUCTIONS}\n\n{persona}\n\n{BIO_GUIDELINES}"}
+    ]
@@ -0,0 +1,253 @@
+import asyncio
+import random
+import time
+
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from LLMBackend import LLMBackend, LLMResponse
+
+
+class TokenBucket():
+    """
+    Allows `per_minute` units per minute, refilled continuously, with bursts up to one minute of units.
+    The level can go below zero when more units were used than reserved.
+    """
+
+    def __init__(self, per_minute: float):
+
+        self.per_minute = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+
+        now = time.monotonic()
+        self.level = min(self.per_minute, self.level + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` units are available.
+        """
+
+        self._refill()
+        missing = min(amount, self.per_minute) - self.level
+
+        return max(0.0, missing * 60 / self.per_minute)
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def give_back(self, amount: float):
+        self.level = min(self.per_minute, self.level + amount)
+
+
+class RateLimiter():
+    """
+    Keeps LLM traffic under requests-per-minute and tokens-per-minute limits, and adapts the number of
+    requests in flight to the provider (AIMD): +1 per `limit` successful requests, halved when throttled.
+
+    Token use is not known before a request, so an estimate is reserved and corrected with the usage
+    of the response.
+    """
+
+    def __init__(self, requests_per_minute: float | None = None, tokens_per_minute: float | None = None,
+                 max_concurrency: int = 64, min_concurrency: int = 1):
+
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+
+        self.throttled = 0
+        self.retries = 0
+
+    def _wait_time(self, estimated_tokens: int) -> float:
+        """
+        Seconds to wait before a request can start, 0 if it can start now.
+        """
+
+        if self.in_flight >= max(self.min_concurrency, int(self.limit)):
+            return 0.05
+
+        wait_time = 0.0
+        if self.requests is not None:
+            wait_time = max(wait_time, self.requests.wait_time(1))
+        if self.tokens is not None:
+            wait_time = max(wait_time, self.tokens.wait_time(estimated_tokens))
+
+        return wait_time
+
+    def _start(self, estimated_tokens: int):
+
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(estimated_tokens)
+
+        self.in_flight += 1
+
+    def acquire(self, estimated_tokens: int):
+        """
+        Wait until a request can start and reserve it.
+        """
+
+        while (wait_time := self._wait_time(estimated_tokens)) > 0:
+            time.sleep(wait_time)
+
+        self._start(estimated_tokens)
+
+    async def aacquire(self, estimated_tokens: int):
+        """
+        Wait until a request can start and reserve it, without blocking other steps.
+        """
+
+        while (wait_time := self._wait_time(estimated_tokens)) > 0:
+            await asyncio.sleep(wait_time)
+
+        self._start(estimated_tokens)
+
+    def release(self, estimated_tokens: int, used_tokens: int | None = None, throttled: bool = False):
+        """
+        Finish a request: correct the token reservation and adapt the concurrency limit.
+        """
+
+        self.in_flight -= 1
+
+        if self.tokens is not None and used_tokens is not None:
+            self.tokens.give_back(estimated_tokens - used_tokens)
+
+        if throttled:
+            self.throttled += 1
+            self.limit = max(self.min_concurrency, self.limit / 2)
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def stats(self) -> dict:
+        return {
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "concurrency_limit": int(self.limit)
+        }
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Returns True for errors that go away when trying again later: rate limits, server errors and connection errors.
+    """
+    return isinstance(error, (RateLimitError, InternalServerError, APIConnectionError, APITimeoutError))
+
+
+class RateLimitedBackend(LLMBackend):
+    """
+    Passes requests to another backend within the limits of a RateLimiter.
+    Throttled and failed requests are retried with jittered exponential backoff (or after the retry-after
+    time given by the provider), so they don't end up as failed actions.
+    """
+
+    def __init__(self, backend: LLMBackend, limiter: RateLimiter, max_retries: int = 8, backoff: float = 1.0,
+                 max_backoff: float = 60.0, completion_tokens: int = 200):
+
+        self.backend = backend
+        self.limiter = limiter
+
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        # Expected length of an answer, to estimate the tokens of a request
+        self.completion_tokens = completion_tokens
+
+        # Jitter of the backoff, separate from the random state of the simulation
+        self.jitter = random.Random()
+
+    def _estimate_tokens(self, messages: list[dict]) -> int:
+        return sum(len(message["content"]) for message in messages) // 4 + self.completion_tokens
+
+    def _backoff_time(self, attempt: int, error: Exception) -> float:
+        """
+        Seconds to wait before trying again.
+        """
+
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * self.jitter.uniform(0.5, 1.5)
+
+    def _used_tokens(self, response: LLMResponse) -> int:
+        return response.prompt_tokens + response.completion_tokens
+
+    def _call(self, request, messages: list[dict]) -> LLMResponse:
+
+        estimated_tokens = self._estimate_tokens(messages)
+
+        for attempt in range(self.max_retries + 1):
+
+            self.limiter.acquire(estimated_tokens)
+
+            try:
+                response = request()
+            except Exception as e:
+                self.limiter.release(estimated_tokens, throttled=is_retryable(e))
+
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+
+                self.limiter.retries += 1
+                time.sleep(self._backoff_time(attempt, e))
+                continue
+
+            self.limiter.release(estimated_tokens, used_tokens=self._used_tokens(response))
+            return response
+
+    async def _acall(self, request, messages: list[dict]) -> LLMResponse:
+
+        estimated_tokens = self._estimate_tokens(messages)
+
+        for attempt in range(self.max_retries + 1):
+
+            await self.limiter.aacquire(estimated_tokens)
+
+            try:
+                response = await request()
+            except Exception as e:
+                self.limiter.release(estimated_tokens, throttled=is_retryable(e))
+
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+
+                self.limiter.retries += 1
+                await asyncio.sleep(self._backoff_time(attempt, e))
+                continue
+
+            self.limiter.release(estimated_tokens, used_tokens=self._used_tokens(response))
+            return response
+
+    def parse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+        return self._call(lambda: self.backend.parse(model, messages, response_format), messages)
+
+    async def aparse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+        return await self._acall(lambda: self.backend.aparse(model, messages, response_format), messages)
+
+    def complete(self, model: str, messages: list[dict]) -> LLMResponse:
+        return self._call(lambda: self.backend.complete(model, messages), messages)
+
+    def cache_stats(self) -> dict | None:
+        return self.backend.cache_stats()
+
+    def close(self):
+        print(f"Rate limiter: {self.limiter.stats()}")
+        self.backend.close()
+
+    async def aclose(self):
+        await self.backend.aclose()
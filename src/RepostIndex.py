@@ -0,0 +1,55 @@
+from array import array
+
+import numpy as np
+
+
+class RepostIndex():
+    """
+    Which users reposted which posts, as a sparse users x posts bitmap: the set of (user_id, post_id) pairs
+    that are set, for O(1) membership checks, and the posts reposted by every user as an integer array,
+    for vectorized queries over many posts.
+
+    The ordered reposters of a post are kept by the post itself (Post.reposters).
+    """
+
+    def __init__(self):
+
+        # user_id << 32 | post_id for every repost
+        self.pairs: set[int] = set()
+
+        # user_id -> ids of the posts reposted by the user, in order
+        self.posts_by_user: dict[int, array] = {}
+
+    def add(self, user_id: int, post_id: int):
+        """
+        Register a repost of the post by the user.
+        """
+
+        self.pairs.add(user_id << 32 | post_id)
+        self.posts_by_user.setdefault(user_id, array('i')).append(post_id)
+
+    def reposted_by(self, user_id: int, post_id: int) -> bool:
+        """
+        Returns True if the user has reposted the post, else False.
+        """
+
+        return (user_id << 32 | post_id) in self.pairs
+
+    def posts_reposted_by(self, user_id: int) -> np.ndarray:
+        """
+        Returns the ids of the posts reposted by the user, in order.
+        """
+
+        # A copy, as the array can't grow while NumPy uses its buffer
+        posts = self.posts_by_user.get(user_id)
+        return np.frombuffer(posts, dtype=np.int32).copy() if posts else np.empty(0, dtype=np.int32)
+
+    def not_reposted_by(self, user_id: int, post_ids) -> np.ndarray:
+        """
+        Returns a boolean mask over post_ids, True for the posts the user has not reposted.
+        """
+
+        return ~np.isin(np.asarray(post_ids), self.posts_reposted_by(user_id))
+
+    def __len__(self):
+        return len(self.pairs)
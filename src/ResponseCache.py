@@ -0,0 +1,179 @@
+import json
+import sqlite3
+from collections import OrderedDict
+
+from LLMBackend import LLMBackend, LLMResponse, request_key
+
+
+class ResponseCache():
+    """
+    Stores LLM responses by request key (see LLMBackend.request_key), in two tiers:
+    - memory: the `max_entries` most recently used responses (LRU)
+    - disk: all responses in a SQLite database (optional), shared between runs
+
+    Runs of a sweep write to the same database, a write waits up to `timeout` seconds for the others.
+    """
+
+    def __init__(self, path: str | None = None, max_entries: int = 10000, timeout: float = 30.0):
+
+        self.max_entries = max_entries
+
+        # key -> response json, most recently used last
+        self.memory: OrderedDict[str, dict] = OrderedDict()
+
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout=timeout)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL)")
+            self.db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, response: dict):
+        """
+        Put a response in the memory tier, evicting the least recently used one if it is full.
+        """
+
+        self.memory[key] = response
+        self.memory.move_to_end(key)
+
+        if len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str) -> dict | None:
+        """
+        Returns the stored response json for the key, or None.
+        """
+
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return self.memory[key]
+
+        if self.db is not None:
+            row = self.db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+
+            if row is not None:
+                response = json.loads(row[0])
+                self._remember(key, response)
+                self.disk_hits += 1
+                return response
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: dict):
+        """
+        Store a response json in both tiers.
+        """
+
+        self._remember(key, response)
+
+        if self.db is not None:
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO responses (key, response) VALUES (?, ?)", (key, json.dumps(response)))
+
+    def stats(self) -> dict:
+        """
+        Hit and miss counts, for logging purposes.
+        """
+
+        lookups = self.memory_hits + self.disk_hits + self.misses
+
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups > 0 else 0.0
+        }
+
+    def close(self):
+
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+class CachingBackend(LLMBackend):
+    """
+    Serves repeated requests from a ResponseCache and passes the others to another backend.
+    A cached answer costs no tokens, so it is returned with token counts of 0.
+    Set `enabled` to False to send every request to the backend (e.g. when the variance of the answers matters).
+    """
+
+    def __init__(self, backend: LLMBackend, cache: ResponseCache, enabled: bool = True):
+
+        self.backend = backend
+        self.cache = cache
+        self.enabled = enabled
+
+    def _cached(self, key: str, response_format=None) -> LLMResponse | None:
+
+        if not self.enabled:
+            return None
+
+        response = self.cache.get(key)
+        if response is None:
+            return None
+
+        response = LLMResponse.from_json(response, response_format)
+        response.prompt_tokens = response.completion_tokens = response.cached_tokens = 0
+
+        return response
+
+    def _store(self, key: str, response: LLMResponse):
+
+        if not self.enabled:
+            return
+
+        # The answer is not lost if the database stays locked by other runs, it is only not cached
+        try:
+            self.cache.put(key, response.json())
+        except sqlite3.OperationalError as e:
+            print(f"Response not cached: {e}")
+
+    def parse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        key = request_key(model, messages, response_format)
+        response = self._cached(key, response_format)
+
+        if response is None:
+            response = self.backend.parse(model, messages, response_format)
+            self._store(key, response)
+
+        return response
+
+    async def aparse(self, model: str, messages: list[dict], response_format) -> LLMResponse:
+
+        key = request_key(model, messages, response_format)
+        response = self._cached(key, response_format)
+
+        if response is None:
+            response = await self.backend.aparse(model, messages, response_format)
+            self._store(key, response)
+
+        return response
+
+    def complete(self, model: str, messages: list[dict]) -> LLMResponse:
+
+        key = request_key(model, messages)
+        response = self._cached(key)
+
+        if response is None:
+            response = self.backend.complete(model, messages)
+            self._store(key, response)
+
+        return response
+
+    def cache_stats(self) -> dict | None:
+        return {"enabled": self.enabled, **self.cache.stats()}
+
+    def close(self):
+        self.cache.close()
+        self.backend.close()
+
+    async def aclose(self):
+        await self.backend.aclose()
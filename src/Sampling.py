@@ -0,0 +1,177 @@
+import random
+
+
+class FenwickTree():
+    """
+    Binary indexed tree over a growable list of non-negative weights.
+    Supports prefix sums, weight updates and appends in O(log n).
+    """
+
+    def __init__(self, weights: list | None = None):
+
+        self.weights = list(weights) if weights else []
+
+        # tree[i] holds the sum of weights[i - (i & -i) : i] (1-based, tree[0] is unused)
+        self.tree = [0] + self.weights
+        n = len(self.weights)
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                self.tree[j] += self.tree[i]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def append(self, weight) -> int:
+        """
+        Add a weight at the end, returns its index.
+        """
+
+        self.weights.append(weight)
+        i = len(self.weights)
+
+        # Sum the nodes covering weights[i - (i & -i) : i - 1]
+        value = weight
+        j = i - 1
+        low = i - (i & -i)
+        while j > low:
+            value += self.tree[j]
+            j -= j & -j
+
+        self.tree.append(value)
+        return i - 1
+
+    def update(self, index: int, weight):
+        """
+        Set the weight at the given index.
+        """
+
+        delta = weight - self.weights[index]
+        if delta == 0:
+            return
+
+        self.weights[index] = weight
+
+        i = index + 1
+        n = len(self.weights)
+        while i <= n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, end: int):
+        """
+        Returns the sum of weights[:end].
+        """
+
+        total = 0
+        i = end
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+
+        return total
+
+    def total(self):
+        """
+        Returns the sum of all weights.
+        """
+
+        return self.prefix_sum(len(self.weights))
+
+    def find(self, value) -> int:
+        """
+        Returns the smallest index i for which prefix_sum(i + 1) > value,
+        the same position bisect.bisect_right would return on the cumulative weights.
+        Returns len(self) if value is not smaller than the total.
+        """
+
+        n = len(self.weights)
+        pos = 0
+        acc = 0
+
+        step = 1 << n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= n and acc + self.tree[nxt] <= value:
+                pos = nxt
+                acc += self.tree[nxt]
+            step >>= 1
+
+        return pos
+
+
+class WeightedSampler():
+    """
+    Weighted random sampling without replacement on top of a Fenwick tree.
+    Every draw uses a single call to random.random() and picks the same index as
+    random.choices(population, weights) would on the remaining items (exact for integer weights,
+    float weights can differ in the last bits of the cumulative sums).
+    """
+
+    def __init__(self, weights: list | None = None):
+
+        self.tree = FenwickTree(weights)
+
+    def __len__(self):
+        return len(self.tree)
+
+    def append(self, weight) -> int:
+        """
+        Add an item with the given weight, returns its index.
+        """
+        return self.tree.append(weight)
+
+    def update(self, index: int, weight):
+        """
+        Change the weight of an item in O(log n). A weight of 0 removes the item from sampling.
+        """
+        self.tree.update(index, weight)
+
+    def weight(self, index: int):
+        """
+        Returns the current weight of an item.
+        """
+        return self.tree.weights[index]
+
+    def total(self):
+        """
+        Returns the sum of the weights of all items.
+        """
+        return self.tree.total()
+
+    def sample(self) -> int:
+        """
+        Draw the index of one item, with probability proportional to its weight.
+        """
+
+        total = self.tree.total()
+        if total <= 0:
+            raise ValueError("Total of weights must be greater than zero")
+
+        index = self.tree.find(random.random() * total)
+
+        # random.choices never goes past the last item, do the same for rounding at the upper end
+        if index >= len(self.tree):
+            index = len(self.tree) - 1
+            while self.tree.weights[index] <= 0:
+                index -= 1
+
+        return index
+
+    def sample_without_replacement(self, size: int) -> list[int]:
+        """
+        Draw up to `size` distinct indices. Drawn items get weight 0.
+        """
+
+        picked = []
+
+        for _ in range(size):
+
+            if self.tree.total() <= 0:
+                break
+
+            index = self.sample()
+            picked.append(index)
+            self.update(index, 0)
+
+        return picked
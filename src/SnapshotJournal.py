@@ -0,0 +1,234 @@
+import copy
+
+
+class SnapshotJournal():
+    """
+    Keeps track of the network after each simulation step for analysis, without copying the whole network every step.
+
+    For every step only the changes are recorded (new links, users whose followers or token counts changed,
+    new posts and changed repost counts). Every `keyframe_interval` steps a full snapshot is stored, so any
+    step can be reconstructed by applying at most `keyframe_interval` deltas to the previous keyframe.
+
+    Snapshots are returned in the format of the former Platform.network_snapshots:
+    {'users': [user.json(include_persona=False), ...], 'connections': [(from, to), ...], 'posts_reposts': {post_id: reposts}}
+
+    The deltas and keyframes are kept in a list and a dict, unless other containers are given (e.g. the views
+    of a SQLiteStore, which return them as JSON).
+    """
+
+    def __init__(self, keyframe_interval: int = 1000, deltas=None, keyframes=None):
+
+        if keyframe_interval < 1:
+            raise Exception("Keyframe interval should be at least 1")
+        self.keyframe_interval = keyframe_interval
+
+        # step -> full snapshot
+        self.keyframes: dict[int, dict] = keyframes if keyframes is not None else {}
+
+        # One delta per step, of the form
+        # {'links': [(from, to)], 'users': [user json], 'posts': [(post_id, reposts)], 'reposts': [(post_id, reposts)]}
+        self.deltas: list[dict] = deltas if deltas is not None else []
+
+        # Number of links and posts already recorded
+        self.n_links = 0
+        self.n_posts = 0
+
+        # Users and posts changed since the last step
+        self.changed_users: dict[int, object] = {}
+        self.changed_posts: dict[int, object] = {}
+
+        # Running state when the journal is rebuilt from deltas recorded elsewhere (see add_delta)
+        self.replay_state = None
+
+    def __len__(self):
+        return len(self.deltas)
+
+    def touch_user(self, user):
+        """
+        Mark a user as changed (followers or used tokens) in the current step.
+        """
+        self.changed_users[user.identifier] = user
+
+    def touch_post(self, post):
+        """
+        Mark a post as changed (reposts) in the current step.
+        """
+        self.changed_posts[post.post_id] = post
+
+    def record(self, users: list, user_links: list, raw_posts: list):
+        """
+        Record the changes of the current step, and a keyframe if the step is a multiple of the keyframe interval.
+        Returns the recorded delta.
+        """
+
+        step = len(self.deltas)
+        delta = {}
+
+        if len(user_links) > self.n_links:
+            delta['links'] = [tuple(link) for link in user_links[self.n_links:]]
+
+        if self.changed_users:
+            delta['users'] = [user.json(include_persona=False) for user in self.changed_users.values()]
+
+        new_posts = raw_posts[self.n_posts:]
+        if new_posts:
+            delta['posts'] = [(post.post_id, post.reposts) for post in new_posts]
+
+        new_post_ids = {post.post_id for post in new_posts}
+        reposts = [(post_id, post.reposts) for post_id, post in self.changed_posts.items() if post_id not in new_post_ids]
+        if reposts:
+            delta['reposts'] = reposts
+
+        self.deltas.append(delta)
+
+        self.n_links = len(user_links)
+        self.n_posts = len(raw_posts)
+        self.changed_users = {}
+        self.changed_posts = {}
+
+        if step % self.keyframe_interval == 0:
+            self.keyframes[step] = {'users': [user.json(include_persona=False) for user in users],
+                                    'connections': [tuple(link) for link in user_links],
+                                    'posts_reposts': {post.post_id: post.reposts for post in raw_posts}}
+
+        return delta
+
+    def add_delta(self, delta: dict):
+        """
+        Append the delta of a step recorded elsewhere (e.g. read from an event log), creating keyframes as needed.
+        """
+
+        step = len(self.deltas)
+
+        if step == 0:
+            self.replay_state = {'users': {}, 'connections': [], 'posts_reposts': {}}
+
+        self._apply(self.replay_state, delta)
+        self.deltas.append(delta)
+
+        if step % self.keyframe_interval == 0:
+            self.keyframes[step] = self._snapshot(self.replay_state)
+
+    def restore_step(self, delta: dict, user_links: list, raw_posts: list):
+        """
+        Append the delta of a step recorded before the simulation was resumed, as if record had been called
+        with the restored network (user_links and raw_posts after the step).
+        """
+
+        self.add_delta(delta)
+
+        self.n_links = len(user_links)
+        self.n_posts = len(raw_posts)
+        self.changed_users = {}
+        self.changed_posts = {}
+
+    def _apply(self, state: dict, delta: dict):
+        """
+        Apply a delta to a state of the form {'users': {identifier: json}, 'connections': [...], 'posts_reposts': {...}}.
+        """
+
+        state['connections'].extend(tuple(link) for link in delta.get('links', []))
+
+        for user in delta.get('users', []):
+            state['users'][user['identifier']] = user
+
+        for post_id, reposts in delta.get('posts', []):
+            state['posts_reposts'][post_id] = reposts
+
+        for post_id, reposts in delta.get('reposts', []):
+            state['posts_reposts'][post_id] = reposts
+
+    def _state_at_keyframe(self, step: int) -> dict:
+        """
+        Returns a modifiable copy of the keyframe at the given step.
+        """
+
+        # Keyframes read back from JSON have lists as links and strings as post ids
+        keyframe = self.keyframes[step]
+        return {'users': {user['identifier']: user for user in keyframe['users']},
+                'connections': [tuple(link) for link in keyframe['connections']],
+                'posts_reposts': {int(post_id): reposts for post_id, reposts in keyframe['posts_reposts'].items()}}
+
+    def _snapshot(self, state: dict) -> dict:
+        """
+        Convert a state to an independent snapshot in the Platform.network_snapshots format.
+        """
+
+        return {'users': copy.deepcopy(list(state['users'].values())),
+                'connections': list(state['connections']),
+                'posts_reposts': dict(state['posts_reposts'])}
+
+    def snapshot_at(self, step: int) -> dict:
+        """
+        Reconstruct the snapshot of the network after the given step (0-based, negative values count from the end).
+        """
+
+        if step < 0:
+            step += len(self.deltas)
+
+        if step < 0 or step >= len(self.deltas):
+            raise IndexError(f"No snapshot recorded for step {step}")
+
+        keyframe_step = step - step % self.keyframe_interval
+        state = self._state_at_keyframe(keyframe_step)
+
+        for delta in self.deltas[keyframe_step + 1:step + 1]:
+            self._apply(state, delta)
+
+        return self._snapshot(state)
+
+    def export(self):
+        """
+        Yield the snapshots of all steps in order, in the Platform.network_snapshots format.
+        """
+
+        state = None
+
+        for step, delta in enumerate(self.deltas):
+
+            if step in self.keyframes:
+                state = self._state_at_keyframe(step)
+            else:
+                self._apply(state, delta)
+
+            yield self._snapshot(state)
+
+    def json(self) -> dict:
+        """
+        Return the journal as a JSON object for logging purposes.
+        """
+
+        return {
+            "keyframe_interval": self.keyframe_interval,
+            "keyframes": dict(self.keyframes.items()),
+            "deltas": list(self.deltas)
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'SnapshotJournal':
+        """
+        Load a journal from its JSON object (as written in the log by Platform.generate_log).
+        """
+
+        journal = cls(keyframe_interval=data['keyframe_interval'])
+
+        for step, keyframe in data['keyframes'].items():
+            journal.keyframes[int(step)] = {'users': keyframe['users'],
+                                            'connections': [tuple(link) for link in keyframe['connections']],
+                                            'posts_reposts': {int(post_id): reposts for post_id, reposts in keyframe['posts_reposts'].items()}}
+
+        journal.deltas = data['deltas']
+
+        return journal
+
+
+def expand_network_snapshots(log: dict) -> list[dict]:
+    """
+    Returns the full list of network snapshots (the format used by the analysis notebooks)
+    from a log written by Platform.generate_log.
+    """
+
+    if 'network_snapshots' in log:
+        return log['network_snapshots']
+
+    return list(SnapshotJournal.from_json(log['snapshot_journal']).export())
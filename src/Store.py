@@ -0,0 +1,880 @@
+import json
+import sqlite3
+import weakref
+from array import array
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from Agent import Agent
+
+# Times of the entries are stored as microseconds since this (naive) datetime
+EPOCH = datetime(1970, 1, 1)
+
+
+class Entry():
+    """
+    A post or repost on the platform, built by the store when it is read. It has the keys of the dictionaries
+    used before, so entry["post_content"], entry["time"] etc. keep working. Changing it doesn't change the store.
+    """
+
+    __slots__ = ("post_id", "user_id", "post_content", "_time")
+
+    KEYS = ("post_id", "user_id", "time", "post_content")
+
+    def __init__(self, post_id: int, user_id: int, time: datetime | int, post_content):
+        self.post_id = post_id
+        self.user_id = user_id
+        self.post_content = post_content
+
+        # A datetime, or microseconds since EPOCH that are only converted when the time is used
+        self._time = time
+
+    @property
+    def time(self) -> datetime:
+
+        if isinstance(self._time, int):
+            self._time = EPOCH + timedelta(0, 0, self._time)
+
+        return self._time
+
+    def __getitem__(self, key: str):
+
+        # Only the keys of the dictionaries, not the other attributes of the entry
+        if key in Entry.KEYS:
+            return getattr(self, key)
+
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in Entry.KEYS else default
+
+    def keys(self):
+        return Entry.KEYS
+
+    def __eq__(self, other):
+        return isinstance(other, Entry) and all(self[key] == other[key] for key in Entry.KEYS)
+
+    def __hash__(self):
+        return hash(self.post_id)
+
+    def __getstate__(self):
+        return {key: self[key] for key in Entry.KEYS}
+
+    def __setstate__(self, state):
+        self.__init__(state["post_id"], state["user_id"], state["time"], state["post_content"])
+
+    def __repr__(self):
+        return f"Entry(post_id={self.post_id}, user_id={self.user_id}, time={self.time}, post_content={self.post_content!r})"
+
+
+class _Column():
+    """
+    Growable NumPy array, the capacity is doubled when it is full.
+    """
+
+    def __init__(self, dtype):
+        self.values = np.empty(1024, dtype=dtype)
+        self.size = 0
+
+    def append(self, value):
+
+        if self.size == len(self.values):
+            self.values = np.concatenate((self.values, np.empty(max(len(self.values), 1024), dtype=self.values.dtype)))
+
+        self.values[self.size] = value
+        self.size += 1
+
+    def view(self) -> np.ndarray:
+        """
+        The stored values (without copying).
+        """
+        return self.values[:self.size]
+
+    def __getstate__(self):
+
+        # Only the stored values, not the unused capacity
+        return {"values": self.view().copy(), "size": self.size}
+
+
+class _EntryList(Sequence):
+    """
+    List-like view of the posts and reposts of the MemoryStore, building the entries from the columns.
+    """
+
+    # Entries converted at once when iterating
+    CHUNK_SIZE = 256
+
+    def __init__(self, store: 'MemoryStore'):
+        self.store = store
+
+    def __len__(self):
+        return self.store.entry_users.size
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self.store.get_posts(range(1, len(self) + 1))[index]
+            return self.store.get_posts(range(start + 1, stop + 1)) if stop > start else []
+
+        if index < 0:
+            index += len(self)
+
+        if index < 0 or index >= len(self):
+            raise IndexError("posts index out of range")
+
+        return self.store.get_posts([index + 1])[0]
+
+    def __iter__(self):
+
+        for first in range(0, len(self), self.CHUNK_SIZE):
+            yield from self.store.get_posts(range(first + 1, min(first + self.CHUNK_SIZE, len(self)) + 1))
+
+    def __reversed__(self):
+
+        # Timelines often only need the last few entries, so the chunks start small
+        last, size = len(self), 64
+
+        while last > 0:
+            yield from reversed(self.store.get_posts(range(max(0, last - size) + 1, last + 1)))
+            last, size = last - size, min(size * 2, self.CHUNK_SIZE)
+
+
+class _MemoryEntriesByUser():
+    """
+    Dict-like view of the posts and reposts of the MemoryStore shared by a user, in order.
+    """
+
+    def __init__(self, store: 'MemoryStore'):
+        self.store = store
+
+    def get(self, user_id: int, default=None) -> list[Entry]:
+
+        entry_ids = self.store.entry_ids_by_user.get(user_id)
+        if entry_ids is None:
+            return default
+
+        return self.store.get_posts(entry_ids) if entry_ids else []
+
+
+class MemoryStore():
+    """
+    In-memory storage for the users, posts and follow graph of the platform.
+    Besides the lists (which keep the insertion order needed for timelines and logging),
+    it keeps dictionaries and adjacency sets so lookups don't have to scan the lists.
+
+    Posts and reposts are stored as columns of integers (user, post written by a user, time) and read back
+    as Entry objects through list- and dict-like views (self.posts, self.posts_by_id, self.posts_by_user).
+    Post ids have to be consecutive, starting at 1.
+    """
+
+    def __init__(self):
+
+        # All users on the platform, and the same users indexed by identifier
+        self.users: list[Agent] = []
+        self.users_by_id: dict[int, Agent] = {}
+
+        # Columns of all posts, including reposts (index is post_id - 1): user who shared it,
+        # index of the post in self.raw_posts and time in microseconds since EPOCH
+        self.entry_users = _Column(np.int32)
+        self.entry_posts = _Column(np.int32)
+        self.entry_times = _Column(np.int64)
+
+        # Post ids of all posts and reposts shared by a user, in order
+        self.entry_ids_by_user: dict[int, array] = {}
+
+        # Entries of the form {"user_id": int, "post_id": int, "time": datetime, "post_content": Post}
+        # All posts, including reposts, the same entries indexed by post_id and grouped by user
+        self.posts = _EntryList(self)
+        self.posts_by_id = _EntriesById(self)
+        self.posts_by_user = _MemoryEntriesByUser(self)
+
+        # Only posts written by users, and the same posts grouped by author
+        self.raw_posts: list = []
+        self.raw_posts_by_author: dict[int, list] = {}
+
+        # Of the form (user_id_link_from, user_id_link_to)
+        self.user_links: list[tuple[int, int]] = []
+
+        # Follow graph: user_id -> ids of the users they follow / ids of their followers
+        self.following: dict[int, set[int]] = {}
+        self.followers: dict[int, set[int]] = {}
+
+        # All actions on the platform
+        self.actions: list[dict] = []
+
+        # Deltas and keyframes of the snapshot journal, and the metrics series of the platform
+        self.snapshot_deltas: list[dict] = []
+        self.snapshot_keyframes: dict[int, dict] = {}
+        self.metrics_series: list[dict] = []
+
+    def add_user(self, agent: Agent):
+        """
+        Store a user. The identifier of the agent has to be set already.
+        """
+
+        self.users.append(agent)
+        self.users_by_id[agent.identifier] = agent
+
+        self.entry_ids_by_user[agent.identifier] = array('i')
+        self.raw_posts_by_author[agent.identifier] = []
+        self.following[agent.identifier] = set()
+        self.followers[agent.identifier] = set()
+
+    def get_user(self, user_id: int) -> Agent | None:
+        """
+        Returns the user with the given identifier, or None if the user is not found.
+        """
+
+        return self.users_by_id.get(user_id)
+
+    def get_posts(self, post_ids: list[int] | range) -> list[Entry]:
+        """
+        Returns the entries with the given post_ids (which have to exist), in the same order.
+        The entries are built from the columns.
+        """
+
+        if isinstance(post_ids, range):
+            indexes = slice(post_ids.start - 1, post_ids.stop - 1)
+        else:
+            indexes = np.array(post_ids, dtype=np.int64) - 1
+
+        users = self.entry_users.values[indexes].tolist()
+        posts = map(self.raw_posts.__getitem__, self.entry_posts.values[indexes].tolist())
+        times = self.entry_times.values[indexes].tolist()
+
+        # The entry of the post itself has the time of the post
+        return [Entry(post_id, user_id, post.timestamp if post.post_id == post_id else time, post)
+                for post_id, user_id, post, time in zip(post_ids, users, posts, times)]
+
+    def add_post(self, entry: Entry):
+        """
+        Store a post or a repost (an entry of the form used in self.posts).
+        The post itself has to be stored with add_raw_post first.
+        """
+
+        if entry["post_id"] != len(self.posts) + 1:
+            raise Exception(f"Post ids have to be consecutive, got {entry['post_id']} after {len(self.posts)}")
+
+        post = entry["post_content"]
+
+        if post.post_id == entry["post_id"]:
+            raw_index = len(self.raw_posts) - 1
+            if raw_index < 0 or self.raw_posts[raw_index] is not post:
+                raise Exception(f"Post {post.post_id} has to be stored with add_raw_post first")
+        else:
+            raw_index = int(self.entry_posts.values[post.post_id - 1])
+
+        self.entry_users.append(entry["user_id"])
+        self.entry_posts.append(raw_index)
+        self.entry_times.append((entry["time"] - EPOCH) // timedelta(0, 0, 1))
+        self.entry_ids_by_user.setdefault(entry["user_id"], array('i')).append(entry["post_id"])
+
+    def add_raw_post(self, post):
+        """
+        Store a post written by a user.
+        """
+
+        self.raw_posts.append(post)
+        self.raw_posts_by_author.setdefault(post.author.identifier, []).append(post)
+
+    def update_post(self, post):
+        """
+        Store the changes to a post written by a user (its reposts or bridging score).
+        The post itself is stored, so there is nothing to do.
+        """
+
+    def get_post(self, post_id: int) -> Entry | None:
+        """
+        Returns the entry (post or repost) with the given post_id, or None if it is not found.
+        """
+
+        return self.posts_by_id.get(post_id)
+
+    def get_posts_of_user(self, user_id: int) -> list[Entry]:
+        """
+        Returns all posts and reposts shared by the user, in order.
+        """
+
+        entry_ids = self.entry_ids_by_user.get(user_id)
+        return self.get_posts(entry_ids) if entry_ids else []
+
+    def get_entry_ids_of_user(self, user_id: int) -> array:
+        """
+        Returns the post_ids of all posts and reposts shared by the user, in order.
+        """
+
+        return self.entry_ids_by_user.get(user_id, array('i'))
+
+    def add_link(self, user_id_from: int, user_id_to: int):
+        """
+        Store a link (user_id_from follows user_id_to).
+        """
+
+        self.user_links.append((user_id_from, user_id_to))
+        self.following.setdefault(user_id_from, set()).add(user_id_to)
+        self.followers.setdefault(user_id_to, set()).add(user_id_from)
+
+    def has_link(self, user_id_from: int, user_id_to: int) -> bool:
+        """
+        Returns True if user_id_from follows user_id_to, else False.
+        """
+
+        return user_id_to in self.following.get(user_id_from, ())
+
+    def get_following(self, user_id: int) -> set[int]:
+        """
+        Returns the ids of the users followed by the user.
+        """
+
+        return self.following.get(user_id, set())
+
+    def get_followers(self, user_id: int) -> set[int]:
+        """
+        Returns the ids of the users following the user.
+        """
+
+        return self.followers.get(user_id, set())
+
+    def add_action(self, action: dict):
+        """
+        Store an action.
+        """
+
+        self.actions.append(action)
+
+    def close(self):
+        """
+        Nothing to write, everything is in memory.
+        """
+
+
+class _RowList(Sequence):
+    """
+    List-like view of a table of the SQLiteStore (rows with consecutive ids starting at 1), including
+    the rows that are not written yet.
+    """
+
+    def __init__(self, store: 'SQLiteStore', table: str):
+
+        self.store = store
+        self.table = table
+
+    def __len__(self):
+        return self.store.counts[self.table]
+
+    def _rows(self, first: int, last: int, descending: bool = False) -> list:
+        """
+        Returns the items with ids first..last (inclusive).
+        """
+
+        written = self.store.written[self.table]
+        pending = self.store.pending[self.table]
+
+        items = []
+        if first <= written:
+            items = self.store.from_rows(self.table, self.store.db.execute(
+                f"SELECT * FROM {self.table} WHERE {self.store.KEYS[self.table]} BETWEEN ? AND ? ORDER BY {self.store.KEYS[self.table]}",
+                (first, min(last, written))).fetchall())
+
+        items.extend(pending[max(first, written + 1) - written - 1:max(last - written, 0)])
+
+        if descending:
+            items.reverse()
+
+        return items
+
+    def __getitem__(self, index):
+
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return self._rows(1, len(self))[index]
+            return self._rows(start + 1, stop) if stop > start else []
+
+        if index < 0:
+            index += len(self)
+
+        if index < 0 or index >= len(self):
+            raise IndexError(f"{self.table} index out of range")
+
+        return self._rows(index + 1, index + 1)[0]
+
+    def __iter__(self):
+
+        for first in range(1, len(self) + 1, self.store.CHUNK_SIZE):
+            yield from self._rows(first, min(first + self.store.CHUNK_SIZE - 1, len(self)))
+
+    def __reversed__(self):
+
+        for last in range(len(self), 0, -self.store.CHUNK_SIZE):
+            yield from self._rows(max(1, last - self.store.CHUNK_SIZE + 1), last, descending=True)
+
+    def append(self, item):
+        """
+        Add a row (written with the next batch).
+        """
+        self.store._add(self.table, item)
+
+
+class _RawPostList(Sequence):
+    """
+    List-like view of the posts written by users in the SQLiteStore, read back from the database.
+    """
+
+    def __init__(self, store: 'SQLiteStore'):
+        self.store = store
+
+    def __len__(self):
+        return self.store.raw_post_ids.size
+
+    def __getitem__(self, index):
+
+        post_ids = self.store.raw_post_ids.view()
+
+        if isinstance(index, slice):
+            return self.store.get_raw_posts(post_ids[index].tolist())
+
+        if index < 0:
+            index += len(self)
+
+        if index < 0 or index >= len(self):
+            raise IndexError("raw_posts index out of range")
+
+        return self.store.get_raw_posts([int(post_ids[index])])[0]
+
+    def __iter__(self):
+
+        for first in range(0, len(self), self.store.CHUNK_SIZE):
+            yield from self[first:first + self.store.CHUNK_SIZE]
+
+    def __reversed__(self):
+
+        for last in range(len(self), 0, -self.store.CHUNK_SIZE):
+            yield from reversed(self[max(0, last - self.store.CHUNK_SIZE):last])
+
+
+class _KeyframeDict():
+    """
+    Dict-like view of the keyframes of the snapshot journal in the SQLiteStore (step -> keyframe),
+    written to the database right away.
+    """
+
+    def __init__(self, store: 'SQLiteStore'):
+
+        self.store = store
+
+        # Steps with a keyframe
+        self.steps: list[int] = []
+
+    def __setitem__(self, step: int, keyframe: dict):
+
+        with self.store.db:
+            self.store.db.execute("INSERT OR REPLACE INTO keyframes VALUES (?, ?)", (step, json.dumps(keyframe, default=str)))
+
+        if step not in self.steps:
+            self.steps.append(step)
+
+    def __getitem__(self, step: int) -> dict:
+
+        row = self.store.db.execute("SELECT keyframe FROM keyframes WHERE step = ?", (step,)).fetchone()
+        if row is None:
+            raise KeyError(step)
+
+        return json.loads(row[0])
+
+    def __contains__(self, step: int):
+        return step in self.steps
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(list(self.steps))
+
+    def keys(self):
+        return list(self.steps)
+
+    def items(self):
+        for step in list(self.steps):
+            yield step, self[step]
+
+
+class _EntriesById():
+    """
+    Dict-like view of the posts and reposts of a store by post_id.
+    """
+
+    def __init__(self, store: 'SQLiteStore'):
+        self.store = store
+
+    def __getitem__(self, post_id: int) -> Entry:
+
+        if post_id < 1 or post_id > len(self.store.posts):
+            raise KeyError(post_id)
+
+        return self.store.posts[post_id - 1]
+
+    def get(self, post_id: int, default=None):
+
+        try:
+            return self[post_id]
+        except KeyError:
+            return default
+
+
+class _EntriesByUser():
+    """
+    Dict-like view of the posts and reposts of the SQLiteStore shared by a user, in order.
+    """
+
+    def __init__(self, store: 'SQLiteStore'):
+        self.store = store
+
+    def get(self, user_id: int, default=None) -> list[Entry]:
+
+        if user_id not in self.store.users_by_id:
+            return default
+
+        store = self.store
+        entries = store.from_rows("entries", store.db.execute(
+            "SELECT * FROM entries WHERE user_id = ? ORDER BY post_id", (user_id,)).fetchall())
+        entries.extend(entry for entry in store.pending["entries"] if entry["user_id"] == user_id)
+
+        return entries
+
+
+class SQLiteStore():
+    """
+    Storage for the platform in a SQLite database (WAL mode), with the same interface as MemoryStore.
+    The database can be queried with SQL after the run.
+
+    Posts, reposts, links, actions (with their prompts), the deltas of the snapshot journal and the metrics series
+    are written in batches of `batch_size` rows and read back through list-like views (self.posts, self.raw_posts,
+    self.user_links, self.actions, ...), with indexes for the lookups of the timelines. Keyframes of the snapshot
+    journal are written right away.
+
+    Of the posts written by users only the ids, repost counts and bridging scores stay in memory (as columns).
+    A post is read back from the database (with its content and reposters) when it is used, and stays the same
+    object as long as it is referenced elsewhere, so changes to it are never lost; call update_post after changing
+    its reposts or bridging score. Memory still grows with the users, the follow graph and the candidate pools
+    of the timeline engine (ids of the entries in the inboxes), but not with the content of the posts.
+
+    A new store refuses to open a database that already has rows, unless `rebuild` is set to clear it
+    (when the platform is rebuilt from an event log into the same database).
+    """
+
+    # Primary key of every table read through a _RowList
+    KEYS = {"entries": "post_id", "links": "id", "actions": "id", "steps": "id", "metrics": "id"}
+
+    # Rows read at once when iterating over a view
+    CHUNK_SIZE = 64
+
+    # Ids bound to one query (SQLite allows at least 999 variables)
+    MAX_VARIABLES = 999
+
+    def __init__(self, path: str, batch_size: int = 1000, rebuild: bool = False, new_post=None):
+
+        self.path = path
+        self.batch_size = batch_size
+
+        # Creates a post read back from the database: new_post(post_id, author, timestamp, content)
+        self.new_post = new_post
+
+        self.users: list[Agent] = []
+        self.users_by_id: dict[int, Agent] = {}
+
+        # Columns of the posts written by users (in order of post_id): post_id, reposts and bridging score (NaN if None)
+        self.raw_post_ids = _Column(np.int32)
+        self.raw_post_reposts = _Column(np.int32)
+        self.raw_post_scores = _Column(np.float64)
+
+        # post_id -> post, for the posts that are referenced elsewhere
+        self.live_posts = weakref.WeakValueDictionary()
+
+        self.following: dict[int, set[int]] = {}
+        self.followers: dict[int, set[int]] = {}
+
+        # Rows not written to the database yet, and the number of rows per table (written and pending)
+        self.pending = {"entries": [], "links": [], "actions": [], "steps": [], "metrics": [], "raw_posts": [], "users": []}
+        self.written = {"entries": 0, "links": 0, "actions": 0, "steps": 0, "metrics": 0}
+        self.counts = {"entries": 0, "links": 0, "actions": 0, "steps": 0, "metrics": 0}
+
+        self._connect()
+
+        # A new store starts empty, only a rebuild from an event log may clear an existing database
+        tables = ("entries", "links", "actions", "raw_posts", "users", "steps", "keyframes", "metrics")
+        if rebuild:
+            with self.db:
+                for table in tables:
+                    self.db.execute(f"DELETE FROM {table}")
+        elif any(self.db.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table in tables):
+            self.db.close()
+            raise Exception(f"Database {path} is not empty")
+
+        self.posts = _RowList(self, "entries")
+        self.posts_by_id = _EntriesById(self)
+        self.posts_by_user = _EntriesByUser(self)
+        self.raw_posts = _RawPostList(self)
+        self.user_links = _RowList(self, "links")
+        self.actions = _RowList(self, "actions")
+
+        self.snapshot_deltas = _RowList(self, "steps")
+        self.snapshot_keyframes = _KeyframeDict(self)
+        self.metrics_series = _RowList(self, "metrics")
+
+    def _connect(self):
+
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS users (identifier INTEGER PRIMARY KEY, persona TEXT)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS raw_posts (post_id INTEGER PRIMARY KEY, author INTEGER NOT NULL, "
+                            "timestamp TEXT NOT NULL, content TEXT NOT NULL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS entries (post_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+                            "time TEXT NOT NULL, original_post_id INTEGER NOT NULL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS links (id INTEGER PRIMARY KEY, user_id_from INTEGER NOT NULL, "
+                            "user_id_to INTEGER NOT NULL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS actions (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+                            "action INTEGER, content TEXT, success INTEGER, prompt TEXT)")
+
+            # Snapshot journal (id of a delta is step + 1) and metrics series, as JSON
+            self.db.execute("CREATE TABLE IF NOT EXISTS steps (id INTEGER PRIMARY KEY, delta TEXT NOT NULL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS keyframes (step INTEGER PRIMARY KEY, keyframe TEXT NOT NULL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS metrics (id INTEGER PRIMARY KEY, metrics TEXT NOT NULL)")
+
+            # Posts shared by a user (inboxes of new followers), reposts of a post, followers of a user
+            self.db.execute("CREATE INDEX IF NOT EXISTS entries_user ON entries (user_id, post_id)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS entries_original ON entries (original_post_id)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS links_to ON links (user_id_to)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS actions_user ON actions (user_id)")
+
+    def from_rows(self, table: str, rows: list[tuple]) -> list:
+        """
+        Convert rows of the database to the items of the view.
+        """
+
+        if table == "entries":
+            posts = self.get_raw_posts([row[3] for row in rows])
+            return [Entry(post_id, user_id, datetime.fromisoformat(time), post)
+                    for (post_id, user_id, time, _), post in zip(rows, posts)]
+
+        if table == "links":
+            return [(row[1], row[2]) for row in rows]
+
+        if table in ("steps", "metrics"):
+            return [json.loads(row[1]) for row in rows]
+
+        return [{"user_id": row[1], "action": row[2], "content": row[3], "success": bool(row[4]), "prompt": row[5]}
+                for row in rows]
+
+    def _add(self, table: str, item):
+
+        self.pending[table].append(item)
+        self.counts[table] += 1
+
+        if sum(len(rows) for rows in self.pending.values()) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all pending rows to the database in one transaction.
+        """
+
+        with self.db:
+            self.db.executemany("INSERT INTO users VALUES (?, ?)", self.pending["users"])
+            self.db.executemany("INSERT INTO raw_posts VALUES (?, ?, ?, ?)",
+                                [(post.post_id, post.author.identifier, post.timestamp.isoformat(), post.content)
+                                 for post in self.pending["raw_posts"]])
+            self.db.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)",
+                                [(entry["post_id"], entry["user_id"], entry["time"].isoformat(), entry["post_content"].post_id)
+                                 for entry in self.pending["entries"]])
+            self.db.executemany("INSERT INTO links VALUES (?, ?, ?)",
+                                [(self.written["links"] + i + 1, *link) for i, link in enumerate(self.pending["links"])])
+            self.db.executemany("INSERT INTO actions VALUES (?, ?, ?, ?, ?, ?)",
+                                [(self.written["actions"] + i + 1, action["user_id"], action["action"], action["content"],
+                                  action["success"], action["prompt"]) for i, action in enumerate(self.pending["actions"])])
+            for table in ("steps", "metrics"):
+                self.db.executemany(f"INSERT INTO {table} VALUES (?, ?)",
+                                    [(self.written[table] + i + 1, json.dumps(item, default=str)) for i, item in enumerate(self.pending[table])])
+
+        for table in self.written:
+            self.written[table] = self.counts[table]
+
+        for rows in self.pending.values():
+            rows.clear()
+
+    def close(self):
+        """
+        Write the pending rows and close the database.
+        """
+
+        self.flush()
+        self.db.close()
+
+    def __getstate__(self):
+
+        self.flush()
+        state = self.__dict__.copy()
+        del state["db"]
+        del state["live_posts"]
+
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self.live_posts = weakref.WeakValueDictionary()
+        self._connect()
+
+    def add_user(self, agent: Agent):
+
+        self.users.append(agent)
+        self.users_by_id[agent.identifier] = agent
+
+        self.following[agent.identifier] = set()
+        self.followers[agent.identifier] = set()
+
+        self.pending["users"].append((agent.identifier, json.dumps(agent.persona)))
+
+    def get_user(self, user_id: int) -> Agent | None:
+        return self.users_by_id.get(user_id)
+
+    def add_post(self, entry: Entry):
+
+        if entry["post_id"] != self.counts["entries"] + 1:
+            raise Exception(f"Post ids have to be consecutive, got {entry['post_id']} after {self.counts['entries']}")
+
+        self._add("entries", entry)
+
+    def add_raw_post(self, post):
+
+        self.raw_post_ids.append(post.post_id)
+        self.raw_post_reposts.append(post.reposts)
+        self.raw_post_scores.append(np.nan if post.bridging_score is None else post.bridging_score)
+
+        # Pending posts are kept until they are written
+        self.live_posts[post.post_id] = post
+        self.pending["raw_posts"].append(post)
+
+    def update_post(self, post):
+        """
+        Write the reposts and bridging score of a post written by a user to its columns.
+        """
+
+        index = int(np.searchsorted(self.raw_post_ids.view(), post.post_id))
+
+        self.raw_post_reposts.values[index] = post.reposts
+        self.raw_post_scores.values[index] = np.nan if post.bridging_score is None else post.bridging_score
+
+    def get_raw_posts(self, post_ids: list[int]) -> list:
+        """
+        Returns the posts written by users with the given post_ids (which have to exist), in the same order.
+        Posts that are referenced elsewhere are returned as they are, the others are read from the database
+        (per MAX_VARIABLES ids) with their reposters from the entries.
+        """
+
+        posts = {}
+        missing = set()
+        for post_id in post_ids:
+            post = self.live_posts.get(post_id)
+            if post is None:
+                missing.add(post_id)
+            else:
+                posts[post_id] = post
+
+        missing = sorted(missing)
+
+        for first in range(0, len(missing), self.MAX_VARIABLES):
+            chunk = missing[first:first + self.MAX_VARIABLES]
+            variables = ', '.join('?' * len(chunk))
+
+            rows = {row[0]: row for row in self.db.execute(f"SELECT * FROM raw_posts WHERE post_id IN ({variables})", chunk)}
+
+            # All entries of a post that is not referenced are written (pending entries reference their post)
+            reposters = {}
+            for original_post_id, user_id in self.db.execute(
+                    f"SELECT original_post_id, user_id FROM entries WHERE original_post_id IN ({variables}) "
+                    "AND post_id != original_post_id ORDER BY post_id", chunk):
+                reposters.setdefault(original_post_id, []).append(user_id)
+
+            indexes = np.searchsorted(self.raw_post_ids.view(), chunk)
+
+            for post_id, index in zip(chunk, indexes.tolist()):
+
+                if post_id not in rows:
+                    raise KeyError(post_id)
+
+                _, author, timestamp, content = rows[post_id]
+                post = self.new_post(post_id, self.users_by_id[author], datetime.fromisoformat(timestamp), content)
+
+                post.reposters.extend(reposters.get(post_id, []))
+                post.reposts = int(self.raw_post_reposts.values[index])
+
+                score = float(self.raw_post_scores.values[index])
+                post.bridging_score = None if np.isnan(score) else score
+
+                self.live_posts[post_id] = post
+                posts[post_id] = post
+
+        return [posts[post_id] for post_id in post_ids]
+
+    def get_post(self, post_id: int) -> Entry | None:
+        return self.posts_by_id.get(post_id)
+
+    def get_posts(self, post_ids: list[int] | range) -> list[Entry]:
+        """
+        Returns the entries with the given post_ids (which have to exist), in the same order.
+        The written entries are read in one query (per MAX_VARIABLES ids).
+        """
+
+        written = self.written["entries"]
+        pending = self.pending["entries"]
+
+        for post_id in post_ids:
+            if post_id < 1 or post_id > self.counts["entries"]:
+                raise KeyError(post_id)
+
+        stored = sorted({post_id for post_id in post_ids if post_id <= written})
+
+        entries = {}
+        for first in range(0, len(stored), self.MAX_VARIABLES):
+            chunk = stored[first:first + self.MAX_VARIABLES]
+            rows = self.db.execute(f"SELECT * FROM entries WHERE post_id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            for entry in self.from_rows("entries", rows):
+                entries[entry.post_id] = entry
+
+        return [entries[post_id] if post_id <= written else pending[post_id - written - 1] for post_id in post_ids]
+
+    def get_posts_of_user(self, user_id: int) -> list[Entry]:
+        return self.posts_by_user.get(user_id, [])
+
+    def get_entry_ids_of_user(self, user_id: int) -> list[int]:
+
+        entry_ids = [row[0] for row in self.db.execute("SELECT post_id FROM entries WHERE user_id = ? ORDER BY post_id", (user_id,))]
+        entry_ids.extend(entry["post_id"] for entry in self.pending["entries"] if entry["user_id"] == user_id)
+
+        return entry_ids
+
+    def add_link(self, user_id_from: int, user_id_to: int):
+
+        self._add("links", (user_id_from, user_id_to))
+        self.following.setdefault(user_id_from, set()).add(user_id_to)
+        self.followers.setdefault(user_id_to, set()).add(user_id_from)
+
+    def has_link(self, user_id_from: int, user_id_to: int) -> bool:
+        return user_id_to in self.following.get(user_id_from, ())
+
+    def get_following(self, user_id: int) -> set[int]:
+        return self.following.get(user_id, set())
+
+    def get_followers(self, user_id: int) -> set[int]:
+        return self.followers.get(user_id, set())
+
+    def add_action(self, action: dict):
+        self._add("actions", action)
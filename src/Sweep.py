@@ -0,0 +1,100 @@
+import contextlib
+import itertools
+import multiprocessing
+import time
+
+import main
+
+# Semaphore shared by all runs in a worker process, set by _init_worker
+llm_semaphore = None
+
+
+def sweep_grid(user_link_strategies: list[str], timeline_select_strategies: list[str], show_info: list[bool],
+               run_nrs: list[int], **common) -> list[dict]:
+    """
+    Returns the arguments of run_simulation for every combination of strategies, show_info and run number.
+    The run number is also used as seed, so repeated sweeps select the same users and news.
+    Other arguments of run_simulation (e.g. simulation_size) are passed as keywords and shared by all runs.
+    """
+
+    return [
+        {**common, "user_link_strategy": user_link_strategy, "timeline_select_strategy": timeline_select_strategy,
+         "show_info": info, "run_nr": run_nr, "seed": common.get("seed", run_nr)}
+        for user_link_strategy, timeline_select_strategy, info, run_nr
+        in itertools.product(user_link_strategies, timeline_select_strategies, show_info, run_nrs)
+    ]
+
+
+def _init_worker(semaphore):
+    global llm_semaphore
+    llm_semaphore = semaphore
+
+
+def _run(run: dict) -> dict:
+    """
+    Run one simulation in a worker process, with its console output in {results file}.log.
+    """
+
+    filename = f"../results/{run['user_link_strategy']}_{run['timeline_select_strategy']}_{'info' if run['show_info'] else 'noinfo'}_{run['run_nr']}"
+
+    with open(filename + '.log', 'w') as output, contextlib.redirect_stdout(output):
+        try:
+            return {**main.run_simulation(**run, llm_semaphore=llm_semaphore), "error": None}
+        except Exception as e:
+            print(f"Error: {e}")
+            return {"filename": filename, "steps": 0, "seconds": 0.0, "steps_per_second": 0.0, "error": str(e)}
+
+
+def run_sweep(runs: list[dict], workers: int = 4, llm_concurrency: int = 16, requests_per_minute: float | None = None,
+              tokens_per_minute: float | None = None) -> list[dict]:
+    """
+    Run simulations (run_simulation arguments, see sweep_grid) in a pool of worker processes.
+    At most llm_concurrency LLM requests of all runs together are waiting for an answer at the same time.
+    The rate limits of the provider (requests_per_minute, tokens_per_minute) are split evenly over the workers.
+    Outputs use the naming scheme of run_simulation. Returns the summaries of the runs and prints a report.
+    """
+
+    # At most `workers` runs at the same time, each gets its share of the rate limits
+    parallel_runs = max(1, min(workers, len(runs)))
+    runs = [{**run,
+             "requests_per_minute": requests_per_minute / parallel_runs if requests_per_minute else run.get("requests_per_minute"),
+             "tokens_per_minute": tokens_per_minute / parallel_runs if tokens_per_minute else run.get("tokens_per_minute")}
+            for run in runs]
+
+    semaphore = multiprocessing.Semaphore(llm_concurrency)
+    reports = []
+
+    start_time = time.perf_counter()
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(semaphore,)) as pool:
+        for report in pool.imap_unordered(_run, runs):
+
+            reports.append(report)
+            status = f"failed: {report['error']}" if report['error'] else f"{report['steps']} steps in {report['seconds']:.1f}s"
+            print(f"[{len(reports)}/{len(runs)}] {report['filename']}: {status}")
+
+    elapsed = time.perf_counter() - start_time
+    total_steps = sum([report['steps'] for report in reports])
+    failed = [report for report in reports if report['error']]
+
+    print(f"Sweep finished: {len(reports) - len(failed)}/{len(runs)} runs, {total_steps} steps in {elapsed:.1f}s "
+          f"({total_steps / elapsed if elapsed > 0 else 0.0:.2f} steps/s, {workers} workers, LLM concurrency {llm_concurrency})")
+    print(f"Tokens: {sum([report.get('total_tokens_input', 0) for report in reports])} input, "
+          f"{sum([report.get('total_tokens_output', 0) for report in reports])} output")
+
+    for report in failed:
+        print(f"Failed: {report['filename']}: {report['error']}")
+
+    return reports
+
+
+if __name__ == "__main__":
+
+    # All strategies, five runs each
+    runs = sweep_grid(user_link_strategies=["on_repost", "on_repost_bio"],
+                      timeline_select_strategies=["random", "random_weighted", "other_partisan"],
+                      show_info=[True], run_nrs=range(1, 6),
+                      simulation_size=500, simulation_steps=10000)
+
+    # Rate limits of the OpenAI account for gpt-4o-mini
+    run_sweep(runs, workers=6, llm_concurrency=32, requests_per_minute=5000, tokens_per_minute=2000000)
@@ -0,0 +1,316 @@
+import bisect
+import random
+from array import array
+from collections import OrderedDict
+
+from Store import MemoryStore
+
+
+class TimelineEngine():
+    """
+    Keeps the candidate pools used to build timelines up to date while posts, reposts and links are added,
+    so building a timeline costs roughly the size of the timeline instead of the number of posts on the platform.
+
+    A post (and every repost of it) is hidden for a user if the user wrote or reposted it.
+    """
+
+    def __init__(self, store: MemoryStore, recent_window: int = 1000, track_excluded: bool = True):
+
+        self.store = store
+
+        # user_id -> post_ids of the entries (posts and reposts) shared by the users they follow, in order
+        self.inboxes: dict[int, array] = {}
+
+        # user_id -> ids of the original posts shared by the users they follow
+        self.following_posts: dict[int, set[int]] = {}
+
+        # user_id -> ids of the original posts written or reposted by the user
+        self.hidden_posts: dict[int, set[int]] = {}
+
+        # post_id of an original post -> post_ids of all its entries (the post and its reposts)
+        self.post_entries: dict[int, array] = {}
+
+        # post_id of the original post of every entry (index is post_id - 1)
+        self.entry_post_ids = array('i')
+
+        # user_id -> sorted post_ids of the entries that can't be recommended to the user (the entries of their
+        # hidden posts and of the posts shared by the users they follow), for uniform sampling over the others
+        # Only kept up to date with track_excluded, as every post and repost updates them (see sample_candidates)
+        self.track_excluded = track_excluded
+        self.excluded_entries: dict[int, array] = {}
+
+        # post_id of an original post -> ids of the users for whom its entries are in excluded_entries
+        self.excluded_by: dict[int, array] = {}
+
+        # The last `recent_window` distinct original posts that were shared, as post_id -> post_id of their latest
+        # entry, ordered by that entry (most recent last). Posts that are shared again move to the end.
+        self.recent_posts: OrderedDict[int, int] = OrderedDict()
+        self.recent_window = recent_window
+        self.recent_evicted = False
+
+    def add_user(self, user_id: int):
+        """
+        Create empty pools for a new user.
+        """
+
+        self.inboxes[user_id] = array('i')
+        self.following_posts[user_id] = set()
+        self.hidden_posts[user_id] = set()
+        self.excluded_entries[user_id] = array('i')
+
+    def hide_post(self, user_id: int, post_id: int):
+        """
+        Exclude an original post (and its reposts) from the timelines of the user.
+        Called when the user writes or reposts the post.
+        """
+
+        self._exclude_post(user_id, post_id)
+        self.hidden_posts.setdefault(user_id, set()).add(post_id)
+
+    def _exclude_post(self, user_id: int, post_id: int):
+        """
+        Add the entries of an original post to the excluded entries of the user, if they are not there yet.
+        Called before the post is added to the hidden or following posts of the user.
+        """
+
+        if not self.track_excluded:
+            return
+
+        if post_id in self.hidden_posts.get(user_id, ()) or post_id in self.following_posts.get(user_id, ()):
+            return
+
+        self.excluded_by.setdefault(post_id, array('i')).append(user_id)
+
+        excluded = self.excluded_entries.setdefault(user_id, array('i'))
+        for entry_id in self.post_entries.get(post_id, ()):
+            bisect.insort(excluded, entry_id)
+
+    def add_entry(self, entry: dict):
+        """
+        Push a new post or repost to the inboxes of the followers of the user who shared it.
+        """
+
+        post_id = entry["post_content"].post_id
+
+        self.post_entries.setdefault(post_id, array('i')).append(entry["post_id"])
+        self.entry_post_ids.append(post_id)
+
+        # The newest entry goes at the end of the excluded entries of the users who exclude the post
+        for user_id in self.excluded_by.get(post_id, ()):
+            self.excluded_entries[user_id].append(entry["post_id"])
+
+        self.recent_posts[post_id] = entry["post_id"]
+        self.recent_posts.move_to_end(post_id)
+        if len(self.recent_posts) > self.recent_window:
+            self.recent_posts.popitem(last=False)
+            self.recent_evicted = True
+
+        for follower_id in self.store.get_followers(entry["user_id"]):
+            self.inboxes.setdefault(follower_id, array('i')).append(entry["post_id"])
+            self._exclude_post(follower_id, post_id)
+            self.following_posts.setdefault(follower_id, set()).add(post_id)
+
+    def add_link(self, user_id_from: int, user_id_to: int):
+        """
+        Merge everything shared so far by the followed user into the inbox of the follower.
+        """
+
+        # Only the ids are needed, the entries are not read from the store
+        shared = self.store.get_entry_ids_of_user(user_id_to)
+
+        # Insert the few new ids into the sorted inbox instead of rebuilding it, the cost is
+        # about the number of posts of the followed user
+        inbox = self.inboxes.setdefault(user_id_from, array('i'))
+        following = self.following_posts.setdefault(user_id_from, set())
+        for entry_id in shared:
+            post_id = self.entry_post_ids[entry_id - 1]
+            bisect.insort(inbox, entry_id)
+            self._exclude_post(user_id_from, post_id)
+            following.add(post_id)
+
+    def following_part(self, user_id: int, size: int) -> list[dict]:
+        """
+        Returns the last `size` entries shared by the users the user follows, excluding hidden posts, in order.
+        """
+
+        hidden = self.hidden_posts.get(user_id, set())
+        entry_ids = []
+
+        for entry_id in reversed(self.inboxes.get(user_id, ())):
+
+            if len(entry_ids) == size:
+                break
+
+            if self.entry_post_ids[entry_id - 1] not in hidden:
+                entry_ids.append(entry_id)
+
+        entry_ids.reverse()
+        return self.store.get_posts(entry_ids)
+
+    def _is_candidate(self, user_id: int, entry: dict) -> bool:
+        """
+        Returns True if the entry can be recommended to the user: it is not hidden for the user
+        and the post is not already shared by one of the users they follow.
+        """
+
+        post_id = entry["post_content"].post_id
+        return post_id not in self.hidden_posts.get(user_id, ()) and post_id not in self.following_posts.get(user_id, ())
+
+    def recent_candidates(self, user_id: int, size: int, max_scan: int | None = None) -> list[dict]:
+        """
+        Returns the last `size` entries that can be recommended to the user, in order.
+        With max_scan, only the last max_scan entries are visited (the result can then be shorter).
+        """
+
+        hidden = self.hidden_posts.get(user_id, ())
+        following = self.following_posts.get(user_id, ())
+        entry_ids = []
+
+        first_entry_id = max(len(self.entry_post_ids) - max_scan, 0) if max_scan is not None else 0
+
+        # Only the entries in the result are read from the store
+        for entry_id in range(len(self.entry_post_ids), first_entry_id, -1):
+
+            if len(entry_ids) == size:
+                break
+
+            post_id = self.entry_post_ids[entry_id - 1]
+            if post_id not in hidden and post_id not in following:
+                entry_ids.append(entry_id)
+
+        entry_ids.reverse()
+        return self.store.get_posts(entry_ids)
+
+    def recent_distinct_candidates(self, user_id: int, size: int, max_scan: int | None = None) -> list[dict]:
+        """
+        Returns the distinct posts among the last `size` entries that can be recommended to the user, each as its
+        oldest entry among these, in order. Same as recent_candidates with duplicate posts removed, but only the
+        window of recent posts is visited, so the cost doesn't grow with the number of posts on the platform.
+
+        If the window has fewer than `size` posts for the user and older posts have left it, the entries are
+        searched as in recent_candidates. Set max_scan to only search the last max_scan entries then, which
+        bounds the cost but can give a shorter result.
+        """
+
+        if size <= 0:
+            return []
+
+        hidden = self.hidden_posts.get(user_id, ())
+        following = self.following_posts.get(user_id, ())
+
+        # The last `size` posts that can be recommended, by their latest entry (most recent first)
+        posts = []
+        for post_id in reversed(self.recent_posts):
+            if post_id not in hidden and post_id not in following:
+                posts.append(post_id)
+                if len(posts) == size:
+                    break
+
+        # Older posts that can be recommended have left the window
+        if len(posts) < size and self.recent_evicted:
+            return self._distinct(self.recent_candidates(user_id, size, max_scan=max_scan))
+
+        # The last `size` entries of these posts are all at least as recent as the latest entry of the last post,
+        # and the posts that were last shared before it have no entries that are more recent
+        lowest = self.recent_posts[posts[-1]] if len(posts) == size else 0
+
+        entry_ids = []
+        for post_id in posts:
+            entries = self.post_entries[post_id]
+            entry_ids.extend(entries[bisect.bisect_left(entries, lowest):])
+
+        entry_ids.sort(reverse=True)
+
+        # Keep the oldest entry of every post
+        oldest = {}
+        for entry_id in reversed(entry_ids[:size]):
+            oldest.setdefault(self.entry_post_ids[entry_id - 1], entry_id)
+
+        return self.store.get_posts(list(oldest.values()))
+
+    def _distinct(self, entries: list[dict]) -> list[dict]:
+        """
+        Only keep the first entry of every post.
+        """
+
+        seen = set()
+        result = []
+        for entry in entries:
+            if entry["post_content"].post_id not in seen:
+                seen.add(entry["post_content"].post_id)
+                result.append(entry)
+
+        return result
+
+    def sample_candidates(self, user_id: int, size: int) -> list[dict]:
+        """
+        Pick up to `size` distinct posts from all candidates of the user, each entry having weight 1.
+        Same result as Platform.pick_posts over all candidate entries with equal weights (the same random draws),
+        but the candidates are found by their rank among the entries that are not excluded for the user,
+        so the cost doesn't grow with the number of hidden and followed posts.
+        """
+
+        if not self.track_excluded:
+            raise Exception("sample_candidates needs a TimelineEngine with track_excluded")
+
+        excluded = self.excluded_entries.get(user_id, array('i'))
+        candidates = len(self.entry_post_ids) - len(excluded)
+
+        # Ranks (among the candidates) of the entries of the posts picked so far, sorted
+        picked_ranks = []
+        entry_ids = []
+
+        for _ in range(size):
+
+            remaining = candidates - len(picked_ranks)
+            if remaining <= 0:
+                break
+
+            # Same draw as WeightedSampler.sample on the remaining candidates
+            rank = min(int(random.random() * remaining), remaining - 1)
+
+            # Skip the entries of the posts that were picked already
+            for picked_rank in picked_ranks:
+                if picked_rank > rank:
+                    break
+                rank += 1
+
+            entry_id = self._candidate_entry(excluded, rank)
+            entry_ids.append(entry_id)
+
+            # Remove the post and all its reposts
+            for other_entry_id in self.post_entries[self.entry_post_ids[entry_id - 1]]:
+                bisect.insort(picked_ranks, other_entry_id - 1 - bisect.bisect_left(excluded, other_entry_id))
+
+        return self.store.get_posts(entry_ids)
+
+    def _candidate_entry(self, excluded: array, rank: int) -> int:
+        """
+        Returns the post_id of the entry with the given rank (from 0) among the entries that are not excluded.
+        """
+
+        # The number of excluded entries before it: excluded[i] - 1 - i is the number of candidates before excluded[i]
+        before = bisect.bisect_right(range(len(excluded)), rank, key=lambda i: excluded[i] - 1 - i)
+
+        return rank + before + 1
+
+    def latest_candidate_posts(self, user_id: int, size: int) -> list[dict]:
+        """
+        Returns the entries of the most recent original posts that can be recommended to the user, in order.
+        Posts sharing a timestamp with the oldest selected post are all included, so sorting the result by time
+        gives the same order as sorting all candidates.
+        """
+
+        result = []
+
+        for post in reversed(self.store.raw_posts):
+
+            if len(result) >= size and post.timestamp != result[-1]["time"]:
+                break
+
+            entry = self.store.posts_by_id[post.post_id]
+            if self._is_candidate(user_id, entry):
+                result.append(entry)
+
+        result.reverse()
+        return result
@@ -1,14 +1,27 @@
+import asyncio
 import dotenv
 import os
 import json
 import pickle
 import random
+import time
 
-from openai import OpenAI
+from openai import DEFAULT_MAX_RETRIES
+
+from ClientProvider import ClientProvider
+from LLMBackend import OpenAIBackend, BoundedBackend, RecordingBackend, ReplayBackend, SyntheticBackend
+from ResponseCache import ResponseCache, CachingBackend
+from RateLimiter import RateLimiter, RateLimitedBackend
 
 from Agent import Agent
-from Platform import Platform
+from Platform import Platform, Post
 from NewsFeed import NewsFeed
+from EventLog import EventLog
+from ColumnarLog import save_columns
+from AsyncSimulation import AsyncSimulation
+from Checkpoint import write_checkpoint, restore_checkpoint
+from BridgingScorer import BridgingScorer
+from Instrumentation import InstrumentedBackend, span, start_profiler, start_step, stop_profiler
 
 dotenv.load_dotenv()
 
@@ -55,81 +68,306 @@ def select_users(persona_path, n):
 
     return democrat_sample + republican_sample + non_partisan_sample
 
+def create_backend(llm_mode, filename, concurrency = 1, seed = 0, cache_responses = False, llm_semaphore = None,
+                   requests_per_minute = None, tokens_per_minute = None, run_seed = None, resume = False):
+    """
+    Create the LLM backend for a simulation.
+    - live: the OpenAI API
+    - record: the OpenAI API, storing all responses in {filename}_llm.jsonl with the seed of the run (run_seed),
+      a resumed run (resume) continues the recording
+    - replay: the responses stored by a recorded run, without network, for a run with the same seed
+    - synthetic: persona-driven stub responses (seeded with seed), without network
+    With cache_responses, identical requests are answered from a response cache shared by all runs
+    (../results/response_cache.sqlite) instead of asking the LLM again.
+    With llm_semaphore (shared by the runs of a sweep), requests wait for the semaphore before asking the LLM.
+    With requests_per_minute or tokens_per_minute, requests are kept under these limits, the number of requests
+    in flight adapts to throttling by the provider and throttled requests are retried.
+    """
+
+    rate_limited = requests_per_minute is not None or tokens_per_minute is not None
+
+    backend = _create_backend(llm_mode, filename, concurrency=concurrency, seed=seed, run_seed=run_seed, resume=resume,
+                              rate_limited=rate_limited)
+
+    if llm_semaphore is not None:
+        backend = BoundedBackend(backend, llm_semaphore)
+
+    if rate_limited:
+        limiter = RateLimiter(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+                              max_concurrency=concurrency)
+        backend = RateLimitedBackend(backend, limiter)
+
+    if cache_responses:
+        cache = ResponseCache(os.path.join(os.path.dirname(filename), 'response_cache.sqlite'))
+        backend = CachingBackend(backend, cache)
+
+    return backend
+
+def _create_backend(llm_mode, filename, concurrency = 1, seed = 0, run_seed = None, resume = False, rate_limited = False):
+    """
+    Create the backend for the LLM mode, without response cache.
+    """
+
+    store_path = filename + '_llm.jsonl'
+
+    # One connection pool shared by all agents, large enough for all requests in flight
+    # Requests that are rate limited are retried by RateLimitedBackend only, not by the OpenAI clients as well
+    provider = ClientProvider(max_connections=max(concurrency, 4), max_retries=0 if rate_limited else DEFAULT_MAX_RETRIES)
+
+    if llm_mode == "live":
+        return OpenAIBackend(provider=provider)
+    elif llm_mode == "record":
+        return RecordingBackend(OpenAIBackend(provider=provider), store_path, seed=run_seed, append=resume)
+    elif llm_mode == "replay":
+        return ReplayBackend(store_path, seed=run_seed)
+    elif llm_mode == "synthetic":
+        return SyntheticBackend(seed=seed)
+    else:
+        raise Exception(f"Unknown LLM mode {llm_mode}")
+
 def run_simulation(simulation_size = 500, simulation_steps = 10000, 
                    user_link_strategy = "on_repost_bio", 
                    timeline_select_strategy = "random_weighted",
-                   show_info = True, run_nr = 1):
+                   show_info = True, run_nr = 1, concurrency = 1, llm_mode = "live",
+                   checkpoint_interval = 100, cache_responses = False, seed = None, llm_semaphore = None,
+                   requests_per_minute = None, tokens_per_minute = None, metrics_interval = 100, export_columns = False,
+                   storage = "memory", profile_steps = None, profile_memory = False):
+    """
+    Run a simulation. With concurrency > 1, up to that many agent actions wait for the LLM at the same time.
+    See create_backend for the LLM modes, the response cache, the LLM semaphore and the rate limits.
+    A checkpoint is written to the event log every checkpoint_interval steps, see resume_simulation.
+    The network metrics (see OnlineMetrics) are logged every metrics_interval steps (0 to not log them).
+    Set export_columns to also store the results as typed arrays in a .npz file (see ColumnarLog).
+    Set storage to "sqlite" to keep posts, reposts, links and actions in a SQLite database ({results file}.sqlite)
+    instead of in memory (see SQLiteStore for what stays in memory).
+    The time of the phases of every step and the latency of the LLM calls are written to {results file}_profile.json,
+    set profile_steps (first, last) to also profile these steps with cProfile (and tracemalloc with profile_memory).
+    Set seed to make the selection of users, the steps and the news reproducible.
+    Returns a summary of the run.
+    """
 
+    if seed is not None:
+        random.seed(seed)
 
     # Define the path to the persona file
     persona_path = os.path.join(os.getcwd(), 'personas.json')
-    news_feed = NewsFeed('News_Category_Dataset_v3.json')
+    news_feed = NewsFeed('News_Category_Dataset_v3.json', seed=seed)
 
     filename = f"../results/{user_link_strategy}_{timeline_select_strategy}_{'info' if show_info else 'noinfo'}_{run_nr}"
 
-    platform = Platform(user_link_strategy=user_link_strategy, timeline_select_strategy=timeline_select_strategy, show_info=show_info)
+    # A new run replaces the results of an earlier run with the same settings, including its database
+    database = filename + '.sqlite' if storage == "sqlite" else None
+    if database is not None:
+        for path in (database, database + '-wal', database + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    platform = Platform(user_link_strategy=user_link_strategy, timeline_select_strategy=timeline_select_strategy, show_info=show_info,
+                        metrics_interval=metrics_interval, database=database)
+
+    # Score posts with the Perspective API in the background
+    if timeline_select_strategy == "bridging_attributes":
+        platform.set_bridging_scorer(BridgingScorer())
+
+    # Stream all events to a JSON Lines file while the simulation runs
+    # Use EventLog.read_event_log to get the log in the format of Platform.generate_log
+    event_log = EventLog(filename + '.jsonl')
+    platform.set_event_log(event_log)
     
     # Ensure the right fraction of Democrats, Republicans, and non-partisans
     selected_users = select_users(persona_path, n=simulation_size)
 
     # Set client for platform to OpenAI gpt-4o-mini
     model = "gpt-4o-mini"
-    client = OpenAI()
+    client = InstrumentedBackend(create_backend(llm_mode, filename, concurrency=concurrency, seed=run_nr,
+                                                cache_responses=cache_responses, llm_semaphore=llm_semaphore,
+                                                requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+                                                run_seed=seed))
 
     # Register users
     [platform.register_user(Agent(model, user)) for user in selected_users]
     platform.set_client(client)
 
+    write_checkpoint(platform, news_feed, 0)
+
+    start_profiler(profile_steps=profile_steps, profile_memory=profile_memory)
+    Post.reset_render_stats()
+
+    start_time = time.perf_counter()
+    steps = run_steps(platform, news_feed, client, 0, simulation_steps, concurrency, checkpoint_interval)
+    report = simulation_report(platform, filename, steps, time.perf_counter() - start_time)
+
+    finish_simulation(platform, event_log, client, filename, export_columns)
+
+    return report
+
+def resume_simulation(checkpoint, simulation_steps = 10000, run_nr = 1, concurrency = 1, llm_mode = "live",
+                      checkpoint_interval = 100, cache_responses = False, llm_semaphore = None,
+                      requests_per_minute = None, tokens_per_minute = None, model = "gpt-4o-mini",
+                      export_columns = False, profile_steps = None, profile_memory = False, seed = None):
+    """
+    Continue a simulation from the last checkpoint in its event log (the .jsonl file written by run_simulation),
+    up to simulation_steps steps in total. The platform is rebuilt from the logged events, so no LLM calls
+    are repeated. Use the same run_nr (seed of the synthetic LLM mode) and concurrency as the original run
+    to continue it exactly, and its seed to continue its recording or replay it.
+    Returns a summary of the resumed part of the run.
+    """
+
+    news_feed = NewsFeed('News_Category_Dataset_v3.json')
+
+    filename = os.path.splitext(checkpoint)[0]
+
+    platform, last_checkpoint = restore_checkpoint(checkpoint, model, news_feed)
+    print(f"Resuming simulation {filename} after step {last_checkpoint['step']}")
+
+    # Continue the event log after the checkpoint
+    event_log = EventLog(checkpoint, append=True)
+    platform.set_event_log(event_log, write_header=False)
+
+    client = InstrumentedBackend(create_backend(llm_mode, filename, concurrency=concurrency, seed=run_nr,
+                                                cache_responses=cache_responses, llm_semaphore=llm_semaphore,
+                                                requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute,
+                                                run_seed=seed, resume=True))
+    platform.set_client(client)
+
+    if platform.timeline_select_strategy == "bridging_attributes":
+        platform.set_bridging_scorer(BridgingScorer())
+
+    start_profiler(profile_steps=profile_steps, profile_memory=profile_memory)
+    Post.reset_render_stats()
+
+    start_time = time.perf_counter()
+    steps = run_steps(platform, news_feed, client, last_checkpoint['step'], simulation_steps, concurrency, checkpoint_interval)
+    report = simulation_report(platform, filename, steps, time.perf_counter() - start_time)
+
+    finish_simulation(platform, event_log, client, filename, export_columns)
+
+    return report
+
+def run_steps(platform, news_feed, client, first_step, simulation_steps, concurrency, checkpoint_interval):
+    """
+    Run the simulation steps from first_step up to simulation_steps, returns the number of steps done.
+    Checkpoints are only written when steps are run one by one, as concurrent steps overlap.
+    """
+
+    if concurrency > 1:
+        return run_concurrent_steps(platform, news_feed, simulation_steps - first_step, concurrency, client, first_step=first_step)
+
+    steps_done = 0
+
     try:
-        for i in range(simulation_steps):
+        for i in range(first_step, simulation_steps):
 
             print(f"Simulation step {i + 1}")
+            start_step(i)
 
             # Select a random user
             user = platform.sample_user()
 
+            with span("news"):
+                news = news_feed.get_random_news(10)
+            with span("timeline"):
+                timeline = platform.get_timeline(user.identifier, 10)
+
             # Perform an action
-            action, prompt = user.perform_action(news_feed.get_random_news(10), platform.get_timeline(user.identifier, 10))
-            platform.parse_and_do_action(user.identifier, action, prompt)
+            action, prompt = user.perform_action(news, timeline)
+
+            with span("apply_action"):
+                platform.parse_and_do_action(user.identifier, action, prompt)
 
             print(log_action(user, action))
 
             # Add snapshot of the platform for analysis
-            platform.add_snapshot()
+            with span("snapshot"):
+                platform.add_snapshot()
+            steps_done += 1
 
-            # Refresh client every 1000 steps
-            if i % 1000 == 0 and i != 0:
-                
-                new_client = OpenAI()
-                platform.set_client(new_client)
-                client.close()
+            if (i + 1) % checkpoint_interval == 0:
+                with span("checkpoint"):
+                    write_checkpoint(platform, news_feed, i + 1)
+    except Exception as e:
+        # All events up to the error are already in the event log, continue with resume_simulation
+        print(f"Error: {e}")
 
-                client = new_clientsource .venv/bin/activate
-    except:
-        json.dump(platform.generate_log(), open(filename + '.json', 'w'), indent=4, default=str)
+    return steps_done
 
-        # Set reuse of platform
-        platform.set_client(None)
-        client.close()
+def simulation_report(platform, filename, steps, seconds):
+    """
+    Summary of a run: steps done, time and tokens used.
+    """
+
+    return {
+        "filename": filename,
+        "steps": steps,
+        "seconds": seconds,
+        "steps_per_second": steps / seconds if seconds > 0 else 0.0,
+        "total_tokens_input": sum([user.used_tokens_input for user in platform.users]),
+        "total_tokens_output": sum([user.used_tokens_output for user in platform.users]),
+        "total_tokens_cached": sum([user.used_tokens_cached for user in platform.users]),
+        "post_render_cache": Post.render_stats()
+    }
+
+def finish_simulation(platform, event_log, client, filename, export_columns = False):
+    """
+    Close the event log, the client, the bridging scorer and the store, and store the platform
+    (and its columns in a .npz file if export_columns is set) and the profile of the run.
+    """
 
-        pickle.dump(platform, open(filename + '.pkl', 'wb'))
+    profiler = stop_profiler()
+    if profiler is not None:
+        profiler.write(filename + '_profile.json')
 
-    json.dump(platform.generate_log(), open(filename + '.json', 'w'), indent=4, default=str)
+    platform.close_bridging_scorer()
+
+    cache_stats = client.cache_stats()
+    if cache_stats is not None:
+        platform.log_event("llm_cache", **cache_stats)
+
+    event_log.close()
 
     # Set reuse of platform
+    platform.set_event_log(None)
     platform.set_client(None)
     client.close()
 
     pickle.dump(platform, open(filename + '.pkl', 'wb'))
 
+    if export_columns:
+        save_columns(platform.generate_log(), filename + '.npz')
+
+    # Write the last rows of a SQLite store
+    platform.store.close()
+
+def run_concurrent_steps(platform, news_feed, simulation_steps, concurrency, client, first_step = 0):
+    """
+    Run the simulation steps concurrently, keeping up to `concurrency` actions in flight.
+    Returns the number of steps done.
+    """
+
+    simulation = AsyncSimulation(platform, news_feed, concurrency=concurrency,
+                                 on_step=lambda step, user, action: print(log_action(user, action)))
+
+    async def run():
+
+        try:
+            await simulation.run(simulation_steps, first_step=first_step)
+        except Exception as e:
+            # All events up to the error are already in the event log
+            print(f"Error: {e}")
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+
+    return simulation.steps_done
+
 if __name__ == "__main__":
 
-    # Run five simulations
-    for i in range(1, 6):
+    from Sweep import run_sweep, sweep_grid
 
-        print(f"Running simulation {i}...")
+    # Run five simulations one after the other, set workers to run them in parallel processes
+    runs = sweep_grid(user_link_strategies=["on_repost_bio"], timeline_select_strategies=["other_partisan"],
+                      show_info=[True], run_nrs=range(1, 6),
+                      simulation_size=500, simulation_steps=10000)
 
-        run_simulation(simulation_size=500, simulation_steps=10000, 
-                       user_link_strategy="on_repost_bio", 
-                       timeline_select_strategy="other_partisan",
-                       show_info=True, run_nr=i)
+    run_sweep(runs, workers=1)
@@ -0,0 +1,54 @@
+import json
+import os
+import random
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+from Agent import Agent
+from Platform import Platform
+
+PERSONAS = json.load(open(os.path.join(SRC, 'personas.json'), encoding='utf-8'))
+
+
+def simulate(platform: Platform, steps: int, seed: int = 0, snapshots: bool = False):
+    """
+    Seeded posts, reposts and links on the platform, without an LLM (reposts link the users as with on_repost).
+    """
+
+    rng = random.Random(seed)
+
+    for step in range(steps):
+        user = rng.choice(platform.users)
+        choice = rng.random()
+
+        if choice < 0.4 or not platform.raw_posts:
+            platform.post(user, f"Post {step} by {user.identifier}")
+        elif choice < 0.9:
+            post = rng.choice(platform.raw_posts)
+            if post.author.identifier != user.identifier and not platform.reposts.reposted_by(user.identifier, post.post_id):
+                platform.repost(user, post.post_id)
+        else:
+            platform.link_users(user, rng.choice(platform.users))
+
+        if snapshots:
+            platform.add_snapshot()
+
+
+@pytest.fixture
+def new_platform():
+    """
+    Factory for a platform with registered users (on_repost link strategy unless given).
+    """
+
+    def create(users: int = 20, **kwargs) -> Platform:
+        kwargs.setdefault("user_link_strategy", "on_repost")
+        platform = Platform(**kwargs)
+        for persona in PERSONAS[:users]:
+            platform.register_user(Agent("gpt-4o-mini", dict(persona)))
+        return platform
+
+    return create
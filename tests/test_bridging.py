@@ -0,0 +1,52 @@
+from BridgingScorer import BRIDGING_ATTRIBUTES, BridgingScorer
+from EventLog import EventLog, read_events
+from PerspectiveStub import PerspectiveStub
+from conftest import simulate
+
+
+def _run(new_platform, path, latency: float, workers: int, steps: int = 60):
+    """
+    Seeded steps with a timeline per step, scored by a stub that adds latency and fails some requests.
+    Returns the platform, the timelines, the bridging_score events and the score of the stub for each post.
+    """
+
+    platform = new_platform(timeline_select_strategy="bridging_attributes")
+    platform.set_event_log(EventLog(path))
+
+    with PerspectiveStub(latency=latency, failure_rate=0.2) as stub:
+        platform.set_bridging_scorer(BridgingScorer(url=stub.url, workers=workers, max_retries=10, backoff=0.001))
+
+        timelines = []
+        for step in range(steps):
+            timeline = platform.get_timeline(platform.users[step % len(platform.users)].identifier, 10)
+            timelines.append([(entry["post_id"], entry["user_id"]) for entry in timeline])
+            simulate(platform, 1, seed=step, snapshots=True)
+
+        platform.close_bridging_scorer()
+
+        expected = {}
+        for post in platform.raw_posts:
+            attributes = stub.analyze(post.content)["attributeScores"]
+            expected[post.post_id] = sum(attributes[attribute]["summaryScore"]["value"] for attribute in BRIDGING_ATTRIBUTES) / len(BRIDGING_ATTRIBUTES)
+
+    platform.event_log.close()
+    events = [event for event in read_events(path) if event["event"] == "bridging_score"]
+    return platform, timelines, events, expected
+
+
+def test_scores_are_applied_at_fixed_steps(new_platform, tmp_path):
+    platform, timelines, events, expected = _run(new_platform, str(tmp_path / "slow.jsonl"), latency=0.01, workers=1)
+    _, other_timelines, other_events, _ = _run(new_platform, str(tmp_path / "fast.jsonl"), latency=0.0, workers=4)
+
+    # The timelines and the steps the scores are set in don't depend on when the responses arrive
+    assert timelines == other_timelines
+    assert [(event["post_id"], event["step"]) for event in events] == [(event["post_id"], event["step"]) for event in other_events]
+
+    # Scores are set in post id order, delay_steps after the step of the post (or when the scorer is closed)
+    assert [event["post_id"] for event in events] == sorted(event["post_id"] for event in events)
+    post_steps = {post_id: step for step, delta in enumerate(platform.snapshots.deltas) for post_id, _ in delta.get("posts", [])}
+    for event in events:
+        assert event["step"] == min(post_steps[event["post_id"]] + 5, len(platform.snapshots))
+
+    # Retried failures still get the score of the stub
+    assert {post.post_id: post.bridging_score for post in platform.raw_posts} == expected
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+httpx = pytest.importorskip("httpx")
+
+from openai import APIConnectionError, APIStatusError
+
+from ClientProvider import ClientProvider
+
+
+def _connection_error():
+    return APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+def test_clients_are_recycled_after_consecutive_connection_errors(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    provider = ClientProvider(max_consecutive_errors=5)
+    client = provider.client
+
+    # A success in between and other errors don't count
+    for _ in range(4):
+        provider.report_error(_connection_error())
+    provider.report_success()
+
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    provider.report_error(APIStatusError("Bad request", response=httpx.Response(400, request=request), body=None))
+
+    for _ in range(4):
+        provider.report_error(_connection_error())
+
+    assert provider.recycled == 0
+    assert provider.client is client
+
+    provider.report_error(_connection_error())
+
+    assert provider.recycled == 1
+    assert provider.consecutive_errors == 0
+    assert provider.client is not client
+
+    provider.close()
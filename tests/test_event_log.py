@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+import main
+from EventLog import read_event_log
+
+
+def _setup_run_dir(tmp_path, monkeypatch):
+    """
+    Working directory laid out like src/, with the personas, a small news dataset and a results folder next to it.
+    """
+
+    run_dir = tmp_path / 'src'
+    run_dir.mkdir()
+    (tmp_path / 'results').mkdir()
+
+    shutil.copy(os.path.join(SRC, 'personas.json'), run_dir / 'personas.json')
+    news = [{"link": f"l{i}", "headline": f"Headline {i}", "category": ["POLITICS", "SPORTS", "WORLD NEWS"][i % 3],
+             "short_description": f"Description {i}", "authors": "", "date": "2022-09-23"} for i in range(200)]
+    (run_dir / 'News_Category_Dataset_v3.json').write_text(json.dumps(news))
+
+    monkeypatch.chdir(run_dir)
+
+    return tmp_path / 'results' / 'on_repost_bio_random_weighted_info_1.jsonl'
+
+
+def _events(path):
+    return [json.loads(line) for line in open(path, encoding='utf-8')]
+
+
+def test_new_run_replaces_event_log(tmp_path, monkeypatch):
+    log_path = _setup_run_dir(tmp_path, monkeypatch)
+
+    main.run_simulation(simulation_size=10, simulation_steps=30, llm_mode="synthetic", seed=3, checkpoint_interval=10)
+    first_run = _events(log_path)
+
+    main.run_simulation(simulation_size=10, simulation_steps=30, llm_mode="synthetic", seed=3, checkpoint_interval=10)
+    second_run = _events(log_path)
+
+    # The second run starts a new log instead of appending to the first one
+    assert [event["event"] for event in second_run].count("platform") == 1
+    assert len(second_run) == len(first_run)
+
+    post_ids = [event["post_id"] for event in second_run if event["event"] in ("post", "repost")]
+    assert post_ids == list(range(post_ids[0], post_ids[0] + len(post_ids)))
+
+    log = read_event_log(str(log_path))
+    assert len(log["posts"]) == len(post_ids)
+
+
+def test_resumed_run_appends_to_event_log(tmp_path, monkeypatch):
+    log_path = _setup_run_dir(tmp_path, monkeypatch)
+
+    main.run_simulation(simulation_size=10, simulation_steps=20, llm_mode="synthetic", seed=3, checkpoint_interval=10)
+    first_part = _events(log_path)
+
+    main.resume_simulation(str(log_path), simulation_steps=30, llm_mode="synthetic", checkpoint_interval=10)
+    resumed = _events(log_path)
+
+    # The resumed run continues the log of the run it was resumed from
+    assert resumed[:len(first_part)] == first_part
+    assert [event["event"] for event in resumed].count("platform") == 1
+    assert [event["step"] for event in resumed if event["event"] == "checkpoint"][-1] == 30
@@ -0,0 +1,33 @@
+import json
+
+import numpy as np
+
+from NewsFeed import NewsFeed
+
+
+def test_news_items_match_the_dataset(tmp_path):
+    categories = ["POLITICS", "SPORTS", "WELLNESS", "CRÈME"]
+    news_items = [{"link": f"l{i}", "headline": f"Héadline {i} ✓", "category": categories[i % 4],
+                   "short_description": "" if i % 5 == 0 else f"Description {i}", "authors": "a", "date": "2022-09-23"}
+                  for i in range(500)]
+    for news_item in news_items[::7]:
+        del news_item["authors"]
+
+    path = tmp_path / "news.json"
+    path.write_text(json.dumps(news_items), encoding="utf-8")
+    news_feed = NewsFeed(str(path), seed=1)
+
+    # The fields of a news item, None for fields it doesn't have
+    keys = ["link", "headline", "category", "short_description", "authors", "date"]
+    for index in news_feed.sample_indices(50):
+        news_item = news_feed._news_item(index)
+        assert news_item.pop("prompt_fragment").startswith(f"Title: {news_items[index]['headline']}\n")
+        assert news_item == {key: news_items[index].get(key) for key in keys}
+
+    # Categories are stored as codes, sampled items stay in the given categories
+    assert len(news_feed.columns["category"].categories) == len(categories)
+    for news_item in news_feed.get_random_news(20, categories=["SPORTS", "CRÈME"]):
+        assert news_item["category"] in ("SPORTS", "CRÈME")
+
+    # The same seed samples the same news items
+    assert np.array_equal(NewsFeed(str(path), seed=1).sample_indices(10), NewsFeed(str(path), seed=1).sample_indices(10))
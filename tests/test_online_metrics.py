@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'analysis'))
+
+from metrics import EI_index, correlations, gini_coefficient
+from conftest import simulate
+
+
+def _top_share(values: list, fraction: float = 0.1) -> float:
+    """
+    Share of the total held by the top int(n * fraction) values, as in analysis/analyse_multiple.py.
+    """
+
+    top = sorted(values, reverse=True)[:int(len(values) * fraction)]
+    return sum(top) / sum(values)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_online_metrics_match_analysis(new_platform, seed):
+    platform = new_platform(users=40)
+    simulate(platform, 400, seed=seed)
+
+    log = platform.generate_log()
+    followers = [user['followers'] for user in log['users']]
+    reposts = [post['reposts'] for post in log['raw_posts']]
+
+    metrics = platform.metrics.json()
+
+    assert metrics["users"] == len(log['users'])
+    assert metrics["posts"] == len(log['raw_posts'])
+    assert metrics["links"] == len(log['user_links'])
+
+    assert metrics["gini_coefficient_followers"] == pytest.approx(gini_coefficient(followers))
+    assert metrics["gini_coefficient_reposts"] == pytest.approx(gini_coefficient(reposts))
+    assert metrics["top_10_percent_followers_percentage"] == pytest.approx(_top_share(followers))
+    assert metrics["top_10_percent_reposts_percentage"] == pytest.approx(_top_share(reposts))
+    assert metrics["EI_index"] == pytest.approx(EI_index(log))
+
+    expected = correlations(log)
+    assert metrics["correlation_followers"] == pytest.approx(expected["correlation_followers"])
+    assert metrics["correlation_retweets"] == pytest.approx(expected["correlation_retweets"])
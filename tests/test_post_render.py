@@ -0,0 +1,29 @@
+import pytest
+
+from Platform import Post
+from conftest import simulate
+
+
+def _fresh_render(post: Post) -> str:
+    """
+    The text of the post rendered without the cache.
+    """
+
+    fresh = Post(post.post_id, post.author, post.timestamp, post.content, show_info=post.show_info)
+    fresh.reposts = post.reposts
+    return str(fresh)
+
+
+@pytest.mark.parametrize("show_info", [True, False])
+def test_cached_render_matches_fresh_render(new_platform, show_info):
+    platform = new_platform(show_info=show_info)
+    Post.reset_render_stats()
+
+    # Render every post after each step, while reposts and followers change
+    for step in range(150):
+        simulate(platform, 1, seed=step)
+        for post in platform.raw_posts:
+            assert str(post).encode() == _fresh_render(post).encode()
+
+    stats = Post.render_stats()
+    assert stats["hits"] > 0 and stats["renders"] > 0
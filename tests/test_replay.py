@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+from Agent import Agent, Action
+from LLMBackend import RecordingBackend, ReplayBackend, ReplayMissError, SyntheticBackend
+from Platform import Platform
+
+
+def _news():
+    return [{"headline": f"Headline {i}", "category": "POLITICS", "short_description": f"Description {i}"} for i in range(3)]
+
+
+def _agent(backend):
+    persona = json.load(open(os.path.join(SRC, 'personas.json')))[0]
+    agent = Agent("gpt-4o-mini", persona)
+    agent.set_client(backend)
+    return agent
+
+
+def test_replay_serves_the_recorded_answers(tmp_path):
+    path = str(tmp_path / 'run_llm.jsonl')
+
+    recording = RecordingBackend(SyntheticBackend(seed=1), path, seed=3)
+    recorded, _ = _agent(recording).perform_action(_news(), [])
+    recording.close()
+
+    replayed, _ = _agent(ReplayBackend(path, seed=3)).perform_action(_news(), [])
+    assert replayed == recorded
+
+
+def test_replay_refuses_other_or_missing_seed(tmp_path):
+    path = str(tmp_path / 'run_llm.jsonl')
+
+    RecordingBackend(SyntheticBackend(seed=1), path, seed=3).close()
+    with pytest.raises(Exception, match="seed 3"):
+        ReplayBackend(path, seed=4)
+
+    RecordingBackend(SyntheticBackend(seed=1), path).close()
+    with pytest.raises(Exception, match="no seed"):
+        ReplayBackend(path)
+
+
+def test_replay_miss_stops_the_run(tmp_path):
+    path = str(tmp_path / 'run_llm.jsonl')
+    RecordingBackend(SyntheticBackend(seed=1), path, seed=3).close()
+
+    # Not turned into an action of -1
+    with pytest.raises(ReplayMissError):
+        _agent(ReplayBackend(path, seed=3)).perform_action(_news(), [])
+
+    # Not turned into a failed repost when asking to follow the author
+    personas = json.load(open(os.path.join(SRC, 'personas.json')))[:2]
+    platform = Platform(user_link_strategy="on_repost_bio")
+    for persona in personas:
+        platform.register_user(Agent("gpt-4o-mini", persona))
+    platform.set_client(ReplayBackend(path, seed=3))
+
+    platform.post(platform.users[0], "A post")
+    with pytest.raises(ReplayMissError):
+        platform.parse_and_do_action(platform.users[1].identifier, Action(option=1, content="1", explanation=""), "")
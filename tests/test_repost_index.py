@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from conftest import simulate
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_repost_index_matches_reposters(new_platform, seed):
+    platform = new_platform()
+    simulate(platform, 400, seed=seed)
+
+    index = platform.reposts
+    post_ids = np.array([post.post_id for post in platform.raw_posts])
+
+    assert len(index) == sum(len(post.reposters) for post in platform.raw_posts) > 0
+
+    for user in platform.users:
+        reposted = [user.identifier in post.reposters for post in platform.raw_posts]
+
+        assert [index.reposted_by(user.identifier, post.post_id) for post in platform.raw_posts] == reposted
+        assert list(index.not_reposted_by(user.identifier, post_ids)) == [not value for value in reposted]
+        assert sorted(index.posts_reposted_by(user.identifier)) == [post.post_id for post in platform.raw_posts if user.identifier in post.reposters]
+
+    # Posts and users without reposts
+    assert not index.reposted_by(len(platform.users) + 1, platform.raw_posts[0].post_id)
+    assert not index.reposted_by(platform.users[0].identifier, len(platform.raw_posts) + 1)
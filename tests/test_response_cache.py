@@ -0,0 +1,38 @@
+import os
+import sqlite3
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+from LLMBackend import SyntheticBackend, request_key
+from ResponseCache import CachingBackend, ResponseCache
+
+MESSAGES = [{"role": "system", "content": "You are a person."}, {"role": "user", "content": "Who are you?"}]
+
+
+def test_locked_database_skips_caching(tmp_path):
+    path = str(tmp_path / 'response_cache.sqlite')
+    backend = CachingBackend(SyntheticBackend(seed=1), ResponseCache(path, timeout=0.1))
+
+    # Another run holds the write lock of the shared database
+    other = sqlite3.connect(path)
+    other.execute("BEGIN EXCLUSIVE")
+
+    response = backend.complete("gpt-4o-mini", MESSAGES)
+    assert response.content == SyntheticBackend(seed=1).complete("gpt-4o-mini", MESSAGES).content
+
+    other.rollback()
+    other.close()
+
+    # Only the disk write was skipped
+    assert backend.cache.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+
+    # Once the lock is released, responses are written again
+    messages = [*MESSAGES, {"role": "user", "content": "And now?"}]
+    backend.complete("gpt-4o-mini", messages)
+    backend.close()
+
+    cache = ResponseCache(path)
+    assert cache.get(request_key("gpt-4o-mini", messages)) is not None
+    cache.close()
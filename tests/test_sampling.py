@@ -0,0 +1,79 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from Sampling import FenwickTree, WeightedSampler
+
+
+def _pick_posts_with_choices(posts, weights, size):
+    """
+    Platform.pick_posts before the Fenwick tree: random.choices on the remaining posts.
+    """
+
+    picked_posts = []
+    posts_left = posts
+    weights = list(weights)
+
+    for _ in range(size):
+
+        if len(posts_left) == 0:
+            break
+
+        post = random.choices(posts_left, weights=weights)[0]
+        picked_posts.append(post)
+
+        for i in range(len(posts_left) - 1, -1, -1):
+            if posts_left[i]['post_content'].post_id == post['post_content'].post_id:
+                del weights[i]
+
+        posts_left = [p for p in posts_left if p['post_content'].post_id != post['post_content'].post_id]
+
+    return picked_posts
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_sample_matches_random_choices(seed):
+    rng = random.Random(seed)
+    weights = [rng.randint(0, 20) for _ in range(rng.randint(1, 300))]
+    weights[rng.randrange(len(weights))] += 1
+
+    sampler = WeightedSampler(weights)
+
+    random.seed(seed)
+    sampled = [sampler.sample() for _ in range(100)]
+
+    random.seed(seed)
+    assert sampled == [random.choices(range(len(weights)), weights=weights)[0] for _ in range(100)]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_pick_posts_matches_random_choices(new_platform, seed):
+    platform = new_platform(users=2)
+    rng = random.Random(seed)
+
+    # Entries of 40 posts, some of them reposted several times
+    posts = [{'post_content': SimpleNamespace(post_id=rng.randint(1, 40))} for _ in range(rng.randint(1, 120))]
+    weights = [rng.randint(1, 30) for _ in posts]
+
+    random.seed(seed)
+    picked = platform.pick_posts(posts, list(weights), 10)
+
+    random.seed(seed)
+    assert picked == _pick_posts_with_choices(posts, weights, 10)
+
+
+def test_fenwick_tree_prefix_sums_after_updates():
+    rng = random.Random(0)
+    weights = [rng.randint(0, 9) for _ in range(50)]
+    tree = FenwickTree(weights[:20])
+
+    for weight in weights[20:]:
+        tree.append(weight)
+
+    for _ in range(100):
+        index = rng.randrange(len(weights))
+        weights[index] = rng.randint(0, 9)
+        tree.update(index, weights[index])
+
+    assert [tree.prefix_sum(end) for end in range(len(weights) + 1)] == [sum(weights[:end]) for end in range(len(weights) + 1)]
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from SnapshotJournal import SnapshotJournal, expand_network_snapshots
+from conftest import simulate
+
+
+def _full_snapshot(platform) -> dict:
+    """
+    The snapshot Platform.add_snapshot stored for every step before the journal.
+    """
+
+    return {'users': [user.json(include_persona=False) for user in platform.users],
+            'connections': [link for link in platform.user_links],
+            'posts_reposts': {post.post_id: post.reposts for post in platform.raw_posts}}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_journal_expands_to_full_snapshots(new_platform, seed):
+    platform = new_platform(snapshot_keyframe_interval=7)
+
+    full = []
+    for step in range(60):
+        simulate(platform, 1, seed=seed * 1000 + step, snapshots=True)
+        full.append(_full_snapshot(platform))
+
+    assert platform.network_snapshots == full
+    assert [platform.snapshots.snapshot_at(step) for step in (0, 6, 7, 8, 34, -1)] == [full[step] for step in (0, 6, 7, 8, 34, -1)]
+
+    # From the log written as JSON, and from the deltas alone (as when the platform is rebuilt from the event log)
+    log = json.loads(json.dumps(platform.generate_log(), default=str))
+    assert expand_network_snapshots(log) == full
+
+    rebuilt = SnapshotJournal(keyframe_interval=7)
+    for delta in platform.snapshots.deltas:
+        rebuilt.add_delta(delta)
+    assert list(rebuilt.export()) == full
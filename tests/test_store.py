@@ -0,0 +1,154 @@
+import gc
+import json
+import os
+import pickle
+import sys
+import tracemalloc
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+from datetime import datetime
+
+from Agent import Agent
+from Platform import Platform, Post
+from Store import Entry, SQLiteStore
+from conftest import simulate
+
+
+def test_sqlite_store_refuses_non_empty_database(tmp_path):
+    path = tmp_path / 'run.sqlite'
+
+    store = SQLiteStore(str(path))
+    store.add_link(1, 2)
+    store.close()
+
+    with pytest.raises(Exception, match="not empty"):
+        SQLiteStore(str(path))
+
+    # A rebuild starts from an empty database
+    store = SQLiteStore(str(path), rebuild=True)
+    assert len(store.user_links) == 0
+    store.close()
+
+
+def test_sqlite_store_get_posts_matches_single_lookups(tmp_path):
+    personas = json.load(open(os.path.join(SRC, 'personas.json')))[:4]
+
+    platform = Platform(database=str(tmp_path / 'run.sqlite'))
+    platform.store.batch_size = 7
+    for persona in personas:
+        platform.register_user(Agent("gpt-4o-mini", persona))
+
+    for i in range(20):
+        platform.post(platform.users[i % 4], f"Post {i}")
+    for i in range(1, 10):
+        platform.repost(platform.users[i % 4], i)
+
+    # Both written and pending entries, in any order
+    store = platform.store
+    assert 0 < store.written["entries"] < store.counts["entries"]
+
+    post_ids = [store.counts["entries"], 1, 5, 5, store.written["entries"], store.written["entries"] + 1]
+    assert store.get_posts(post_ids) == [store.get_post(post_id) for post_id in post_ids]
+
+
+def _without_times(post: dict) -> dict:
+    return {key: value for key, value in post.items() if key != "timestamp"}
+
+
+def test_sqlite_platform_matches_memory_platform(new_platform, tmp_path):
+    memory = new_platform(metrics_interval=5)
+    sqlite = new_platform(metrics_interval=5, database=str(tmp_path / 'run.sqlite'), snapshot_keyframe_interval=50)
+    sqlite.store.batch_size = 7
+
+    simulate(memory, 300, seed=1, snapshots=True)
+    simulate(sqlite, 300, seed=1, snapshots=True)
+
+    # Posts that are not referenced anymore are read back from the database with their reposts and reposters
+    gc.collect()
+    assert len(sqlite.store.live_posts) < len(sqlite.raw_posts)
+
+    assert [_without_times(post.json()) for post in sqlite.raw_posts] == [_without_times(post.json()) for post in memory.raw_posts]
+    assert [(entry["post_id"], entry["user_id"], entry["post_content"].post_id) for entry in sqlite.posts] == \
+        [(entry["post_id"], entry["user_id"], entry["post_content"].post_id) for entry in memory.posts]
+    assert sqlite.network_snapshots == memory.network_snapshots
+    assert list(sqlite.metrics_series) == list(memory.metrics_series)
+
+
+def test_sqlite_platform_keeps_content_out_of_memory(new_platform, tmp_path):
+    platform = new_platform(database=str(tmp_path / 'run.sqlite'), metrics_interval=1)
+    platform.store.batch_size = 50
+
+    def run(steps: int):
+        for i in range(steps):
+            platform.post(platform.users[i % len(platform.users)], f"Post {i} " + "x" * 10000)
+            platform.add_snapshot()
+        gc.collect()
+
+    run(50)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    run(200)
+    growth = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    # 2 MB of content was posted, only the ids, columns, timeline pools and pending rows stay in memory
+    assert growth < 500000
+    assert len(platform.store.live_posts) <= platform.store.batch_size
+    assert len(platform.snapshots.deltas) == 250 and len(platform.metrics_series) == 250
+
+
+@pytest.mark.parametrize("sqlite", [False, True])
+def test_store_indexes_match_linear_scans(new_platform, tmp_path, sqlite):
+    platform = new_platform(database=str(tmp_path / 'run.sqlite') if sqlite else None)
+    simulate(platform, 400, seed=2)
+    store = platform.store
+
+    posts = list(platform.posts)
+    links = list(platform.user_links)
+
+    for user in platform.users:
+        assert store.get_user(user.identifier) is user
+        assert store.get_posts_of_user(user.identifier) == [post for post in posts if post["user_id"] == user.identifier]
+        assert store.get_following(user.identifier) == {to for frm, to in links if frm == user.identifier}
+        assert store.get_followers(user.identifier) == {frm for frm, to in links if to == user.identifier}
+
+    for post in posts:
+        assert store.get_post(post["post_id"]) == next(other for other in posts if other["post_id"] == post["post_id"])
+
+    assert store.get_user(len(platform.users) + 1) is None
+    assert store.get_post(len(posts) + 1) is None
+    assert all(store.has_link(frm, to) for frm, to in links)
+    assert not store.has_link(1, 1)
+
+
+@pytest.mark.parametrize("sqlite", [False, True])
+def test_entries_work_like_the_dicts_used_before(new_platform, tmp_path, sqlite):
+    platform = new_platform(database=str(tmp_path / 'run.sqlite') if sqlite else None)
+    simulate(platform, 200, seed=3)
+
+    for entry in platform.posts:
+        as_dict = dict(entry)
+        assert list(as_dict) == ["post_id", "user_id", "time", "post_content"]
+        assert all(entry[key] == as_dict[key] and entry.get(key) == as_dict[key] for key in entry.keys())
+        assert entry.get("reposts") is None and entry.get("reposts", 0) == 0
+        for key in ("reposts", "_time", "keys", "__class__"):
+            with pytest.raises(KeyError):
+                entry[key]
+
+        # A post, or a repost by one of the reposters of its original post
+        assert isinstance(entry["time"], datetime) and isinstance(entry["post_content"], Post)
+        if entry["post_content"].post_id == entry["post_id"]:
+            assert entry["user_id"] == entry["post_content"].author.identifier
+        else:
+            assert entry["user_id"] in entry["post_content"].reposters
+
+        # Pickled with a copy of its post
+        copy = pickle.loads(pickle.dumps(entry))
+        assert isinstance(copy, Entry)
+        assert [copy[key] for key in ("post_id", "user_id", "time")] == [entry[key] for key in ("post_id", "user_id", "time")]
+        assert str(copy["post_content"]) == str(entry["post_content"])
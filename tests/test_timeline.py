@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from conftest import simulate
+
+
+@pytest.mark.parametrize("recent_window", [1, 5, 40])
+def test_recent_distinct_candidates_match_full_scan_after_eviction(new_platform, recent_window):
+    platform = new_platform(users=15)
+    timeline = platform.timeline
+    timeline.recent_window = recent_window
+
+    simulate(platform, 600, seed=recent_window)
+    assert timeline.recent_evicted
+
+    fallbacks = 0
+    for user in platform.users:
+        excluded = timeline.hidden_posts[user.identifier] | timeline.following_posts[user.identifier]
+        in_window = len([post_id for post_id in timeline.recent_posts if post_id not in excluded])
+
+        for size in (5, 50):
+            # The result of the full scan over all entries
+            expected = timeline._distinct(timeline.recent_candidates(user.identifier, size))
+            assert timeline.recent_distinct_candidates(user.identifier, size) == expected
+
+            fallbacks += in_window < size
+
+    # The window alone was not enough for some users
+    assert fallbacks > 0
+
+
+def test_recent_distinct_candidates_bounded_scan_is_opt_in(new_platform):
+    platform = new_platform(users=15)
+    timeline = platform.timeline
+    timeline.recent_window = 5
+
+    simulate(platform, 600, seed=1)
+
+    for user in platform.users:
+        bounded = timeline.recent_distinct_candidates(user.identifier, 50, max_scan=20)
+        assert all(entry["post_id"] > len(platform.posts) - 20 for entry in bounded)
+
+
+def test_sample_candidates_match_pick_posts(new_platform):
+    platform = new_platform(users=15)
+    timeline = platform.timeline
+
+    simulate(platform, 600, seed=2)
+
+    for user in platform.users:
+        candidates = [entry for entry in platform.posts if timeline._is_candidate(user.identifier, entry)]
+
+        for seed in range(5):
+            random.seed(seed)
+            expected = platform.pick_posts(candidates, [1] * len(candidates), min(5, len(candidates)))
+            random.seed(seed)
+            assert timeline.sample_candidates(user.identifier, 5) == expected
+
+        # The excluded entries kept up to date while posting, reposting and linking
+        excluded = timeline.hidden_posts[user.identifier] | timeline.following_posts[user.identifier]
+        assert list(timeline.excluded_entries[user.identifier]) == sorted(
+            entry_id for post_id in excluded for entry_id in timeline.post_entries.get(post_id, []))
+
+
+def test_excluded_entries_only_kept_for_random_strategy(new_platform):
+    platform = new_platform(users=15, timeline_select_strategy="random_weighted")
+    simulate(platform, 200, seed=2)
+
+    assert not platform.timeline.excluded_by and not any(platform.timeline.excluded_entries.values())
+    with pytest.raises(Exception, match="track_excluded"):
+        platform.timeline.sample_candidates(platform.users[0].identifier, 5)